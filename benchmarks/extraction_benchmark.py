@@ -0,0 +1,170 @@
+"""
+Benchmark of the article text extractors on a captured HTML corpus.
+
+The corpus is read from the pages captured by the pipeline: an `HtmlCache` directory, an `HttpCassette` directory
+(pages recorded with `HttpTape`), and/or a directory of .html files. In that directory a page can come with its
+reference text in a .txt file of the same name.
+
+Every registered extraction engine parses every page. The benchmark reports, per engine:
+    - the throughput (pages/s and MB/s of HTML) and the p50/p99 time per page,
+    - the text quality, as the token F1 against the reference text of the page when there is one, and otherwise
+      against the text of the reference engine (newspaper by default).
+
+It also reports the same figures per domain. With --domain-engines it writes the engine to use for each domain
+where the fast engine reaches --min-f1 on at least --min-pages pages. That file can be given to
+`ParsePool(domain_engines=...)`.
+
+Usage, from this directory:
+    python extraction_benchmark.py --html-cache ../exemples/html_cache --domain-engines domain_engines.json
+"""
+import sys
+sys.path.append("../src/utils")
+sys.path.append("../src/scraping")
+
+import os
+import re
+import json
+import glob
+import time
+import argparse
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from extraction import EXTRACTORS
+from htmlcache import HtmlCache
+from httptape import HttpCassette
+
+CANONICAL = re.compile(r'<link[^>]+rel=["\']canonical["\'][^>]*href=["\']([^"\']+)', re.IGNORECASE)
+
+
+def load_corpus(args: argparse.Namespace) -> list[dict]:
+    """Returns the pages of the corpus, each with its 'url', 'domain', 'html' and optional 'reference' text."""
+    pages = []
+    if args.html_cache:
+        cache = HtmlCache(args.html_cache)
+        pages += [{'url': url, 'html': html, 'reference': None} for url, html in cache.pages()]
+        cache.close()
+    if args.cassette:
+        for interaction in HttpCassette(args.cassette).interactions():
+            content_type = {name.lower(): value for name, value in interaction['headers'].items()}.get('content-type', '')
+            if interaction['status'] == 200 and 'html' in content_type:
+                pages.append({'url': interaction['final_url'], 'html': interaction['content'], 'reference': None})
+    if args.html_dir:
+        for path in sorted(glob.glob(os.path.join(args.html_dir, '*.html'))):
+            with open(path, 'rb') as file:
+                html = file.read()
+            reference = None
+            if os.path.exists(path[:-len('.html')] + '.txt'):
+                with open(path[:-len('.html')] + '.txt', 'r', encoding='utf-8') as file:
+                    reference = file.read()
+            match = CANONICAL.search(html[:200_000].decode('utf-8', errors='replace'))
+            pages.append({'url': match.group(1) if match else '', 'html': html, 'reference': reference})
+    for page in pages:
+        page['domain'] = urlsplit(page['url']).netloc.lower().removeprefix('www.') or 'unknown'
+    return pages
+
+
+def token_f1(text: str, reference: str) -> float:
+    """Returns the F1 score of the tokens of a text against those of a reference text."""
+    tokens, expected = Counter(text.lower().split()), Counter(reference.lower().split())
+    if not tokens and not expected:
+        return 1.0
+    common = sum((tokens & expected).values())
+    if common == 0:
+        return 0.0
+    precision, recall = common / sum(tokens.values()), common / sum(expected.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def run_engines(pages: list[dict], engines: list[str]) -> dict:
+    """Extracts every page with every engine and returns, per engine, the texts and the time per page."""
+    results = {}
+    for engine in engines:
+        texts, seconds = [], []
+        for page in pages:
+            start = time.perf_counter()
+            try:
+                text = EXTRACTORS[engine].extract(page['html'])
+            except Exception:
+                text = ''
+            seconds.append(time.perf_counter() - start)
+            texts.append(text or '')
+        results[engine] = {'texts': texts, 'seconds': np.array(seconds)}
+    return results
+
+
+def summarize(pages: list[dict], results: dict, reference_engine: str) -> dict:
+    """Returns the throughput and quality of every engine, overall and per domain."""
+    size_mb = sum(len(page['html']) for page in pages) / 1024 ** 2
+    references = [page['reference'] if page['reference'] is not None else results[reference_engine]['texts'][i]
+                  for i, page in enumerate(pages)]
+    domains = defaultdict(list)
+    for i, page in enumerate(pages):
+        domains[page['domain']].append(i)
+
+    summary = {'pages': len(pages), 'html_mb': round(size_mb, 2), 'engines': {}, 'domains': {}}
+    for engine, result in results.items():
+        scores = np.array([token_f1(text, reference) for text, reference in zip(result['texts'], references)])
+        result['f1'] = scores
+        total = result['seconds'].sum()
+        summary['engines'][engine] = {
+            'pages_per_second': round(len(pages) / total, 1), 'mb_per_second': round(size_mb / total, 2),
+            'p50_ms': round(1000 * np.percentile(result['seconds'], 50), 2),
+            'p99_ms': round(1000 * np.percentile(result['seconds'], 99), 2),
+            'mean_f1': round(float(scores.mean()), 3), 'empty': int(sum(text == '' for text in result['texts']))}
+    for domain, rows in sorted(domains.items(), key=lambda item: -len(item[1])):
+        summary['domains'][domain] = {
+            engine: {'pages': len(rows), 'mean_f1': round(float(result['f1'][rows].mean()), 3),
+                     'mean_ms': round(1000 * float(result['seconds'][rows].mean()), 2)}
+            for engine, result in results.items()}
+    return summary
+
+
+def domain_engines(summary: dict, engine: str, min_f1: float, min_pages: int) -> dict:
+    """Returns the domains where `engine` is good enough to replace the reference engine."""
+    return {domain: engine for domain, engines in summary['domains'].items()
+            if domain != 'unknown' and engines[engine]['pages'] >= min_pages and engines[engine]['mean_f1'] >= min_f1}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--html-cache', type=str, default=None, help='HtmlCache directory.')
+    parser.add_argument('--cassette', type=str, default=None, help='HttpCassette directory.')
+    parser.add_argument('--html-dir', type=str, default=None, help='Directory of .html pages (and .txt references).')
+    parser.add_argument('--engines', type=str, nargs='+', default=list(EXTRACTORS), help='Engines to compare.')
+    parser.add_argument('--reference', type=str, default='newspaper', help='Engine used when a page has no reference text.')
+    parser.add_argument('--fast-engine', type=str, default='lxml', help='Engine proposed per domain.')
+    parser.add_argument('--min-f1', type=float, default=0.9, help='F1 the fast engine must reach on a domain.')
+    parser.add_argument('--min-pages', type=int, default=5, help='Pages needed to decide for a domain.')
+    parser.add_argument('--domain-engines', type=str, default=None, help='JSON file where the domain engines are written.')
+    parser.add_argument('--output', type=str, default=None, help='JSON file where the summary is written.')
+    args = parser.parse_args()
+
+    pages = load_corpus(args)
+    if not pages:
+        parser.error('the corpus is empty, give --html-cache, --cassette or --html-dir')
+    engines = list(dict.fromkeys([args.reference] + args.engines))
+    summary = summarize(pages, run_engines(pages, engines), args.reference)
+
+    print(f"{summary['pages']} pages, {summary['html_mb']} MB of HTML, quality against "
+          f"{sum(page['reference'] is not None for page in pages)} reference texts and {args.reference} otherwise")
+    for engine, measures in summary['engines'].items():
+        print(f"    {engine:<10} {measures['pages_per_second']:>8} pages/s {measures['mb_per_second']:>7} MB/s "
+              f"p50={measures['p50_ms']} ms p99={measures['p99_ms']} ms  F1={measures['mean_f1']}  empty={measures['empty']}")
+    for domain, measures in list(summary['domains'].items())[:20]:
+        print(f"    {domain:<40} " + '  '.join(f"{engine}: F1={m['mean_f1']} {m['mean_ms']} ms" for engine, m in measures.items()))
+
+    if args.domain_engines is not None:
+        selected = domain_engines(summary, args.fast_engine, args.min_f1, args.min_pages)
+        with open(args.domain_engines, 'w') as file:
+            json.dump(selected, file, indent=4)
+        print(f"{len(selected)} domains switched to {args.fast_engine}, written to {args.domain_engines}")
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(summary, file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Microbenchmark of the Google News RSS parsing.
+
+Synthetic Google News feeds (search and top stories feeds, whose entries list their related articles in an HTML
+summary) are parsed by:
+    - feedparser : `feedparser.parse` then a BeautifulSoup tree per summary for the sub-articles, as pygooglenews
+      used to do (needs feedparser and beautifulsoup4),
+    - lxml : the streaming `parse_feed` of pygooglenews, parsing the entries and sub-articles in a single pass.
+
+For every feed size the benchmark checks that both parsers give the same feed and entries, and reports the entries parsed
+per second, the time per feed and the peak memory allocated while parsing.
+
+Usage, from this directory:
+    python rss_benchmark.py --sizes 100 1000 10000 --repeat 5
+"""
+import sys
+sys.path.append("../src/pygooglenews")
+
+import time
+import random
+import argparse
+import tracemalloc
+from email.utils import formatdate
+from xml.sax.saxutils import escape
+
+from pygooglenews import parse_feed
+
+
+def build_feed(size: int, sub_articles: int, seed: int) -> str:
+    """Returns a Google News RSS feed of `size` entries, each listing `sub_articles` related articles."""
+    rng = random.Random(seed)
+    words = [''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(2, 9))) for _ in range(2000)]
+    items = []
+    for i in range(size):
+        title = ' '.join(rng.choices(words, k=rng.randint(6, 12))).capitalize()
+        publisher = rng.choice(words).capitalize() + ' News'
+        related = [(f'https://news.google.com/rss/articles/CBMi{i}x{j}?oc=5',
+                    ' '.join(rng.choices(words, k=8)).capitalize() + ' &amp; more', rng.choice(words).capitalize())
+                   for j in range(sub_articles)]
+        if related:
+            summary = '<ol>' + ''.join(f'<li><a href="{url}" target="_blank">{text}</a>&nbsp;&nbsp;'
+                                       f'<font color="#6f6f6f">{name}</font></li>' for url, text, name in related) + '</ol>'
+        else:
+            summary = f'<a href="https://news.google.com/rss/articles/CBMi{i}?oc=5" target="_blank">{title}</a>' \
+                      f'&nbsp;&nbsp;<font color="#6f6f6f">{publisher}</font>'
+        items.append(f'<item><title>{escape(title)} - {publisher}</title>'
+                     f'<link>https://news.google.com/rss/articles/CBMi{i}?oc=5</link>'
+                     f'<guid isPermaLink="false">CBMi{i}</guid>'
+                     f'<pubDate>{formatdate(1700000000 - 60 * i, usegmt=True)}</pubDate>'
+                     f'<description>{escape(summary)}</description>'
+                     f'<source url="https://www.{publisher.split()[0].lower()}.example">{publisher}</source></item>')
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?><rss version="2.0" '
+            'xmlns:media="http://search.yahoo.com/mrss/"><channel><generator>NFE/5.0</generator>'
+            '<title>"strike" - Google News</title><link>https://news.google.com/search?q=strike</link>'
+            '<language>en-US</language><webMaster>news-webmaster@google.com</webMaster>'
+            f'<copyright>2024 Google Inc.</copyright><lastBuildDate>{formatdate(1700000000, usegmt=True)}</lastBuildDate>'
+            '<description>Google News</description>' + ''.join(items) + '</channel></rss>')
+
+
+def parse_feedparser(text: str) -> dict:
+    """Parses a feed like pygooglenews used to: feedparser, then BeautifulSoup for the sub-articles."""
+    import feedparser
+    from bs4 import BeautifulSoup
+
+    d = feedparser.parse(text)
+    entries = d['entries']
+    for entry in entries:
+        sub_articles = []
+        for li in BeautifulSoup(entry['summary'], 'html.parser').find_all('li'):
+            try:
+                sub_articles.append({'url': li.a['href'], 'title': li.a.text, 'publisher': li.font.text})
+            except Exception:
+                pass
+        entry['sub_articles'] = sub_articles
+    return {'feed': d['feed'], 'entries': entries}
+
+
+def same_entries(expected: dict, result: dict) -> bool:
+    """Tells whether two parsings give the same feed fields and entries, on the fields the scrapers read."""
+    feed_keys = ('title', 'link', 'language', 'subtitle', 'updated', 'updated_parsed')
+    if any(expected['feed'].get(key) != result['feed'].get(key) for key in feed_keys):
+        return False
+    keys = ('title', 'link', 'id', 'published', 'published_parsed', 'summary', 'sub_articles')
+    if len(expected['entries']) != len(result['entries']):
+        return False
+    for left, right in zip(expected['entries'], result['entries']):
+        if any(left.get(key) != right.get(key) for key in keys) or dict(left['source']) != right['source']:
+            return False
+    return True
+
+
+def measure(parser: callable, text: str, repeat: int) -> dict:
+    """Returns the best time of `repeat` parsings of a feed and the peak memory allocated by one parsing."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser(text)
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    parser(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(seconds), 'peak_mb': peak / 1024 ** 2}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='Numbers of feed entries.')
+    parser.add_argument('--sub-articles', type=int, default=5, help='Related articles listed per entry, 0 for a search feed.')
+    parser.add_argument('--repeat', type=int, default=5, help='Parsings per measure, the best one is kept.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic feeds.')
+    args = parser.parse_args()
+
+    parsers = {'lxml': parse_feed}
+    try:
+        import feedparser, bs4
+        parsers = {'feedparser': parse_feedparser, **parsers}
+    except ImportError:
+        print('feedparser or beautifulsoup4 is not installed, only the lxml parser is measured')
+
+    for size in args.sizes:
+        text = build_feed(size, args.sub_articles, args.seed)
+        if 'feedparser' in parsers and not same_entries(parse_feedparser(text), parse_feed(text)):
+            print(f'{size} entries: the parsers disagree')
+        results = {name: measure(function, text, args.repeat) for name, function in parsers.items()}
+        print(f"\n{size} entries, {len(text.encode('utf-8')) / 1024 ** 2:.2f} MB")
+        for name, result in results.items():
+            print(f"    {name:<11} {size / result['seconds']:>10.0f} entries/s  {1000 * result['seconds']:>9.1f} ms  "
+                  f"peak {result['peak_mb']:>7.1f} MB")
+        if 'feedparser' in results:
+            print(f"    speedup    {results['feedparser']['seconds'] / results['lxml']['seconds']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
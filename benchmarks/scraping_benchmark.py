@@ -0,0 +1,250 @@
+"""
+Offline throughput benchmark of the news collection.
+
+A synthetic NewsAPI corpus (search pages and publisher article pages) is written to a cassette and replayed by a
+local `ReplayServer`, with the configured latency and failure injection, so the whole `NewsCollector` pipeline
+(pagination, downloads, parsing, filtering) runs without touching the network. Each size runs in its own
+process, so that the reported peak memory belongs to that size only.
+
+For every size the benchmark reports the articles collected per second, the p50 and p99 duration of each stage
+and the peak resident memory of the collector and of the parse workers:
+    - newsapi : one NewsAPI search page request,
+    - download : one article page download,
+    - parse : one article page, from its submission to the parse pool to its text,
+    - unit : one (country, lang, query) work unit.
+
+Usage, from this directory:
+    python scraping_benchmark.py --sizes 100 1000 10000 --latency 0.05 --jitter 0.1 --failure-rate 0.01
+"""
+import sys
+sys.path.append("../src/utils")
+sys.path.append("../src/scraping")
+
+import os
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from newscollector import *
+from httptape import HttpCassette, HttpTape, ReplayServer
+from seenstore import SeenUrlStore
+from extraction import ParsePool
+
+QUERIES = ['strike', 'factory fire', 'plant explosion', 'walkout', 'industrial accident', 'flood', 'protest', 'blockade']
+STAGES = ['newsapi', 'download', 'parse', 'unit']
+
+
+class StageTimer:
+    """Collects the durations of the stages of a run, from any thread."""
+
+    def __init__(self):
+        self._samples = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        """Records one duration of a stage."""
+        with self._lock:
+            self._samples[stage].append(seconds)
+
+    def report(self) -> dict:
+        """Returns the number of samples and the p50 and p99 durations of every stage, in milliseconds."""
+        report = {}
+        for stage, samples in self._samples.items():
+            if samples:
+                p50, p99 = np.percentile(samples, [50, 99])
+                report[stage] = {'count': len(samples), 'p50_ms': round(1000 * p50, 1), 'p99_ms': round(1000 * p99, 1)}
+        return report
+
+
+class TimedDownloader(AsyncDownloader):
+    """An AsyncDownloader recording the duration of every successful download."""
+
+    def __init__(self, timer: StageTimer, **kwargs):
+        super().__init__(**kwargs)
+        self.timer = timer
+
+    def download(self, urls: list[str], on_result: callable = None) -> list[dict]:
+        def timed(index, result):
+            if result is not None:
+                self.timer.add('download', result['elapsed'])
+            if on_result is not None:
+                on_result(index, result)
+        return super().download(urls, on_result=timed)
+
+
+class TimedParsePool(ParsePool):
+    """A ParsePool recording the time from the submission of every page to its text."""
+
+    def __init__(self, timer: StageTimer, **kwargs):
+        super().__init__(**kwargs)
+        self.timer = timer
+
+    def submit(self, html: str, url: str = None):
+        start = time.perf_counter()
+        future = super().submit(html, url)
+        future.add_done_callback(lambda _: self.timer.add('parse', time.perf_counter() - start))
+        return future
+
+
+def article_page(rng: random.Random, vocabulary: list[str], title: str) -> bytes:
+    """Returns the HTML of a synthetic article page, with navigation and footer boilerplate."""
+    paragraphs = []
+    for _ in range(rng.randint(6, 14)):
+        words = rng.choices(vocabulary, k=rng.randint(40, 90))
+        paragraphs.append('<p>' + ' '.join(words).capitalize() + '.</p>')
+    html = ('<!DOCTYPE html><html><head><meta charset="utf-8"><title>{title}</title></head><body>'
+            '<nav><ul><li><a href="/">Home</a></li><li><a href="/world">World</a></li>'
+            '<li><a href="/business">Business</a></li></ul></nav>'
+            '<article><h1>{title}</h1>{paragraphs}</article>'
+            '<footer><p>All rights reserved. Subscribe to our newsletter.</p></footer></body></html>')
+    return html.format(title=title, paragraphs=''.join(paragraphs)).encode('utf-8')
+
+
+def build_corpus(cassette: HttpCassette, size: int, nb_units: int, page_size: int, start_date: str,
+                 end_date: str, seed: int) -> tuple[list[dict], set[str]]:
+    """
+    Records a synthetic corpus of `size` articles, spread over `nb_units` work units, into a cassette.
+
+    Returns:
+        tuple[list[dict], set[str]]: The `country_lang` configuration of the corpus and the publisher hosts.
+    """
+    rng = random.Random(seed)
+    vocabulary = [''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(2, 10))) for _ in range(5000)]
+    queries = [QUERIES[i % len(QUERIES)] + (f' {i // len(QUERIES)}' if i >= len(QUERIES) else '') for i in range(nb_units)]
+    config = [{'country': 'US', 'lang': 'en', 'queries': queries}]
+    hosts = {f'www.publisher{i}.example' for i in range(50)}
+
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    window = (end - datetime.strptime(start_date, '%Y-%m-%d')).total_seconds()
+    scraper = NewsApiScraper(api_key='benchmark', country='US', lang='en', start_date=start_date,
+                             end_date=end_date, page_size=page_size)
+    for unit, query in enumerate(queries):
+        scraper.query = query
+        url = scraper.search_url()
+        nb_articles = size // nb_units + (1 if unit < size % nb_units else 0)
+        articles = []
+        for i in range(nb_articles):
+            title = ' '.join(rng.choices(vocabulary, k=rng.randint(6, 12))).capitalize()
+            link = f'https://www.publisher{rng.randrange(50)}.example/news/{unit}/{i}-{title[:20].replace(" ", "-")}'
+            published = end - timedelta(seconds=window * i / max(1, nb_articles))
+            articles.append({'source': {'id': None, 'name': urlsplit(link).netloc}, 'title': title,
+                             'description': title, 'url': link,
+                             'publishedAt': published.strftime('%Y-%m-%dT%H:%M:%SZ')})
+            cassette.record('GET', link, None, 200, {'Content-Type': 'text/html; charset=utf-8'},
+                            article_page(rng, vocabulary, title))
+        for page in range(1, max(1, math.ceil(nb_articles / page_size)) + 1):
+            content = {'status': 'ok', 'totalResults': nb_articles,
+                       'articles': articles[(page - 1) * page_size:page * page_size]}
+            cassette.record('GET', url + f'&page={page}', None, 200, {'Content-Type': 'application/json'},
+                            json.dumps(content).encode('utf-8'))
+    cassette.save()
+    return config, hosts
+
+
+def run_size(size: int, args: argparse.Namespace) -> dict:
+    """Collects a synthetic corpus of `size` articles from a replay server and returns the measures."""
+    directory = tempfile.mkdtemp(prefix='scraping_benchmark_')
+    try:
+        end_date = datetime.today().strftime('%Y-%m-%d')
+        start_date = (datetime.today() - timedelta(days=1)).strftime('%Y-%m-%d')
+        cassette = HttpCassette(directory)
+        config, hosts = build_corpus(cassette, size, args.units, args.page_size, start_date, end_date, args.seed)
+
+        timer = StageTimer()
+        server = ReplayServer(cassette, latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                              failure_hosts=hosts, seed=args.seed)
+        with HttpTape(cassette, mode='replay', server=server) as tape:
+            NewsApiScraper.quota = RequestQuota(daily_limit=10 ** 9)
+            tape.attach(NewsApiScraper)
+            NewsApiScraper.session.hooks['response'].append(
+                lambda response, *_, **__: timer.add('newsapi', response.elapsed.total_seconds()))
+            Scraper.seen_urls = SeenUrlStore()
+            Scraper.parse_pool = TimedParsePool(timer, processes=args.processes)
+            downloader = TimedDownloader(timer, max_concurrency=args.concurrency, tape=tape)
+            scraper = NewsApiScraper(api_key='benchmark', start_date=start_date, end_date=end_date,
+                                     page_size=args.page_size, downloader=downloader)
+            collector = NewsCollector(scraper, config, max_workers=args.workers)
+
+            start = time.perf_counter()
+            data = collector.collect_news()
+            elapsed = time.perf_counter() - start
+            replay = server.report()
+
+        for timing in collector.timings:
+            timer.add('unit', timing['seconds'])
+        collected = 0 if data is None else len(data)
+        return {'size': size, 'collected': collected, 'seconds': round(elapsed, 3),
+                'articles_per_second': round(collected / elapsed, 1), 'stages': timer.report(),
+                'downloads': downloader.report(), 'replay': replay,
+                'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                'peak_worker_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def print_report(results: list[dict]) -> None:
+    """Prints one line per size and one per stage."""
+    for result in results:
+        print(f"\n{result['size']} articles: {result['collected']} collected in {result['seconds']}s, "
+              f"{result['articles_per_second']} articles/s, peak RSS {result['peak_rss_mb']} MB "
+              f"(parse workers {result['peak_worker_rss_mb']} MB)")
+        for stage in STAGES:
+            if stage in result['stages']:
+                measures = result['stages'][stage]
+                print(f"    {stage:<10} n={measures['count']:<7} p50={measures['p50_ms']:>9} ms   p99={measures['p99_ms']:>9} ms")
+        print(f"    downloads {result['downloads']}")
+        print(f"    replay    {result['replay']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='Numbers of articles.')
+    parser.add_argument('--units', type=int, default=4, help='Number of work units the articles are spread over.')
+    parser.add_argument('--page-size', type=int, default=100, help='Articles per NewsAPI page.')
+    parser.add_argument('--workers', type=int, default=1, help='max_workers of the NewsCollector.')
+    parser.add_argument('--processes', type=int, default=None, help='Parse pool processes, 0 to parse inline.')
+    parser.add_argument('--concurrency', type=int, default=32, help='Downloads in flight.')
+    parser.add_argument('--latency', type=float, default=0.05, help='Minimum answer delay of the replay server (s).')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Random delay added to the latency (s).')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of article downloads failing.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the corpus and of the replay server.')
+    parser.add_argument('--output', type=str, default=None, help='JSON file where the results are written.')
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        # Child process: a single size, results written to --output
+        with open(args.output, 'w') as file:
+            json.dump(run_size(args.sizes[0], args), file)
+        return
+
+    results = []
+    for size in args.sizes:
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as file:
+            path = file.name
+        # The last --sizes and --output given win
+        command = [sys.executable, os.path.abspath(__file__), *sys.argv[1:], '--single', '--sizes', str(size), '--output', path]
+        subprocess.run(command, check=True)
+        with open(path, 'r') as file:
+            results.append(json.load(file))
+        os.remove(path)
+
+    print_report(results)
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
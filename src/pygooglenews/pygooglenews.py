@@ -1,50 +1,209 @@
-import feedparser
-from bs4 import BeautifulSoup
+import io
+import re
+import html
+import calendar
+import email.utils
+from lxml import etree
 import urllib
 # from dateparser import parse as parse_date
 import requests
+from requests.adapters import HTTPAdapter
+import threading
+import time
 from datetime import datetime # New import 
 
 # The function above is a new one added to the original file, if not 'from dateparser import parse as parse_date' in line 4 does not work
 def parse_date(date_string : str): 
     return datetime.strptime(date_string, '%Y-%m-%d')
 
+MONTHS = {month: i for i, month in enumerate(('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1)}
+SUB_ARTICLE = re.compile(r'<li>.*?<a [^>]*?href="([^"]*)"[^>]*>(.*?)</a>.*?<font[^>]*>(.*?)</font>.*?</li>', re.DOTALL)
+TAG = re.compile(r'<[^>]+>')
+
+
+def parse_pub_date(value : str):
+    """Return the UTC struct_time of an RFC 822 date, fast for the 'Mon, 01 Jan 2024 10:00:00 GMT' of Google News"""
+    try:
+        if len(value) == 29 and value.endswith(' GMT'):
+            hour, minute, second = value[17:25].split(':')
+            timestamp = calendar.timegm((int(value[12:16]), MONTHS[value[8:11]], int(value[5:7]),
+                                         int(hour), int(minute), int(second)))
+        else:
+            timestamp = email.utils.mktime_tz(email.utils.parsedate_tz(value))
+        return time.gmtime(timestamp)
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def parse_sub_articles(summary : str):
+    """Return the url, title and publisher of the articles listed in the summary of an entry"""
+    return [{'url': html.unescape(url), 'title': html.unescape(TAG.sub('', title)), 'publisher': html.unescape(TAG.sub('', publisher))}
+            for url, title, publisher in SUB_ARTICLE.findall(summary)]
+
+
+def parse_feed(content):
+    """Parse an RSS feed in a single streaming pass.
+
+    Return a dict with the 'feed' fields and the 'entries', in the shape feedparser gives them (title, link, id,
+    published, published_parsed, summary, source with its href and title) plus the 'sub_articles' listed in the
+    summary of each entry. Every item is dropped from the tree once it is read, so memory does not grow with
+    the size of the feed; the fields of the channel are read as soon as they end, before the items following
+    them drop them.
+    """
+    encoding = None
+    if isinstance(content, str):
+        # A decoded feed is re-encoded in utf-8, whatever its XML declaration says; raw bytes are decoded by lxml
+        # from their XML declaration
+        content, encoding = content.encode('utf-8'), 'utf-8'
+    feed, entries = {}, []
+    for _, element in etree.iterparse(io.BytesIO(content), events=('end',), encoding=encoding, recover=True,
+                                      remove_comments=True, resolve_entities=False):
+        tag = element.tag
+        if tag == 'item':
+            entry = {}
+            for child in element:
+                name, text = child.tag, (child.text or '').strip()
+                if name == 'title' or name == 'link':
+                    entry[name] = text
+                elif name == 'guid':
+                    entry['id'] = text
+                elif name == 'pubDate':
+                    entry['published'] = text
+                    entry['published_parsed'] = parse_pub_date(text)
+                elif name == 'description':
+                    entry['summary'] = text
+                elif name == 'source':
+                    entry['source'] = {'href': child.get('url'), 'title': text}
+            entry['sub_articles'] = parse_sub_articles(entry['summary']) if 'summary' in entry else None
+            entries.append(entry)
+            element.clear()
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+        else:
+            parent = element.getparent()
+            if parent is None or parent.tag != 'channel':
+                continue
+            text = (element.text or '').strip()
+            if tag in ('title', 'link', 'language'):
+                feed[tag] = text
+            elif tag == 'description':
+                feed['subtitle'] = text
+            elif tag == 'lastBuildDate':
+                feed['updated'] = text
+                feed['updated_parsed'] = parse_pub_date(text)
+    return {'feed': feed, 'entries': entries}
+
+
+class FeedClient:
+    """Fetch RSS feeds over a shared keep-alive session, once per feed.
+
+    Responses are cached for `ttl` seconds, keyed on the full feed URL, so repeated or
+    overlapping searches within a run are served from memory. Once an entry is stale it is
+    revalidated with If-None-Match / If-Modified-Since and reused on a 304. Concurrent
+    requests for the same URL wait for the first one instead of fetching it again.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, ttl = 900, timeout = 10, pool_size = 10):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.__cache = {}  # url -> {'fetched_at', 'etag', 'last_modified', 'text', 'content', 'url'}
+        self.__locks = {}
+        self.__lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+        self.revalidated = 0
+
+    @classmethod
+    def shared(cls):
+        """Return the client shared by every GoogleNews instance of the process"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def __url_lock(self, url):
+        with self.__lock:
+            return self.__locks.setdefault(url, threading.Lock())
+
+    def __fetch(self, url, proxies=None):
+        """Return the cache entry of a feed, fetched or revalidated when stale, or None and the response when the
+        feed was not served"""
+        with self.__url_lock(url):
+            entry = self.__cache.get(url)
+            if entry is not None and time.monotonic() - entry['fetched_at'] < self.ttl:
+                self.hits += 1
+                return entry, None
+
+            headers = {}
+            if entry is not None and entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry is not None and entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+            r = self.session.get(url, proxies=proxies, headers=headers, timeout=self.timeout)
+            self.requests += 1
+
+            if r.status_code == 304 and entry is not None:
+                self.revalidated += 1
+                entry['fetched_at'] = time.monotonic()
+                return entry, None
+
+            if r.status_code == 200:
+                entry = {'fetched_at': time.monotonic(),
+                         'etag': r.headers.get('ETag'),
+                         'last_modified': r.headers.get('Last-Modified'),
+                         'text': r.text,
+                         'content': r.content,
+                         'url': r.url}
+                self.__cache[url] = entry
+                return entry, None
+            return None, r
+
+    def get(self, url, proxies=None):
+        """Return the text of a feed and the URL it was served from"""
+        entry, r = self.__fetch(url, proxies)
+        if entry is None:
+            return r.text, r.url
+        return entry['text'], entry['url']
+
+    def get_content(self, url, proxies=None):
+        """Return the raw bytes of a feed, left for the XML parser to decode, and the URL it was served from.
+        Raise requests.HTTPError when the feed is not served (the error page is neither cached nor returned)"""
+        entry, r = self.__fetch(url, proxies)
+        if entry is None:
+            raise requests.HTTPError(f"{r.status_code} error for {url}", response=r)
+        return entry['content'], entry['url']
+
+    def clear(self):
+        """Drop every cached feed"""
+        with self.__lock:
+            self.__cache = {}
+
+    def report(self):
+        """Return the number of network requests, cache hits and 304 revalidations"""
+        return {'requests': self.requests, 'hits': self.hits, 'revalidated': self.revalidated}
+
+
 class GoogleNews:
-    def __init__(self, lang = 'en', country = 'US'):
+    def __init__(self, lang = 'en', country = 'US', feed_client = None):
         self.lang = lang.lower()
         self.country = country.upper()
         self.BASE_URL = 'https://news.google.com/rss'
-
-    def __top_news_parser(self, text):
-        """Return subarticles from the main and topic feeds"""
-        try:
-            bs4_html = BeautifulSoup(text, "html.parser")
-            # find all li tags
-            lis = bs4_html.find_all('li')
-            sub_articles = []
-            for li in lis:
-                try:
-                    sub_articles.append({"url": li.a['href'],
-                                         "title": li.a.text,
-                                         "publisher": li.font.text})
-                except:
-                    pass
-            return sub_articles
-        except:
-            return text
+        self.feed_client = feed_client if feed_client is not None else FeedClient.shared()
 
     def __ceid(self):
         """Compile correct country-lang parameters for Google News RSS URL"""
         return '?ceid={}:{}&hl={}&gl={}'.format(self.country,self.lang,self.lang,self.country)
 
-    def __add_sub_articles(self, entries):
-        for i, val in enumerate(entries):
-            if 'summary' in entries[i].keys():
-                entries[i]['sub_articles'] = self.__top_news_parser(entries[i]['summary'])
-            else:
-                entries[i]['sub_articles'] = None
-        return entries
-
     def __scaping_bee_request(self, api_key, url):
         response = requests.get(
             url="https://app.scrapingbee.com/api/v1/",
@@ -64,26 +223,17 @@ class GoogleNews:
         if scraping_bee and proxies:
             raise Exception("Pick either ScrapingBee or proxies. Not both!")
 
-        if proxies:
-            r = requests.get(feed_url, proxies = proxies)
-        else:
-            r = requests.get(feed_url)
-
         if scraping_bee:
             r = self.__scaping_bee_request(url = feed_url, api_key = scraping_bee)
+            text, url = r.text, r.url
         else:
-            r = requests.get(feed_url)
+            text, url = self.feed_client.get(feed_url, proxies = proxies)
 
-
-        if 'https://news.google.com/rss/unsupported' in r.url:
+        if 'https://news.google.com/rss/unsupported' in url:
             raise Exception('This feed is not available')
 
-        d = feedparser.parse(r.text)
-
-        if not scraping_bee and not proxies and len(d['entries']) == 0:
-            d = feedparser.parse(feed_url)
-
-        return dict((k, d[k]) for k in ('feed', 'entries'))
+        # Entries come with their sub_articles, parsed in the same pass
+        return parse_feed(text)
 
     def __search_helper(self, query):
         return urllib.parse.quote_plus(query)
@@ -101,7 +251,6 @@ class GoogleNews:
         """Return a list of all articles from the main page of Google News
         given a country and a language"""
         d = self.__parse_feed(self.BASE_URL + self.__ceid(), proxies=proxies, scraping_bee=scraping_bee)
-        d['entries'] = self.__add_sub_articles(d['entries'])
         return d
 
     def topic_headlines(self, topic: str, proxies=None, scraping_bee=None):
@@ -114,7 +263,6 @@ class GoogleNews:
         else:
             d = self.__parse_feed(self.BASE_URL + '/topics/{}'.format(topic) + self.__ceid(), proxies = proxies, scraping_bee=scraping_bee)
 
-        d['entries'] = self.__add_sub_articles(d['entries'])
         if len(d['entries']) > 0:
             return d
         else:
@@ -125,7 +273,6 @@ class GoogleNews:
         given a country and a language"""
         d = self.__parse_feed(self.BASE_URL + '/headlines/section/geo/{}'.format(geo) + self.__ceid(), proxies = proxies, scraping_bee=scraping_bee)
 
-        d['entries'] = self.__add_sub_articles(d['entries'])
         return d
 
     def search(self, query: str, helper = True, when = None, from_ = None, to_ = None, proxies=None, scraping_bee=None):
@@ -156,5 +303,4 @@ class GoogleNews:
 
         d = self.__parse_feed(self.BASE_URL + '/search?q={}'.format(query) + search_ceid, proxies = proxies, scraping_bee=scraping_bee)
 
-        d['entries'] = self.__add_sub_articles(d['entries'])
         return d
\ No newline at end of file
@@ -0,0 +1,297 @@
+import sys
+sys.path.append("../src/utils")
+
+import re
+import json
+import math
+import threading
+import unicodedata
+from collections import Counter
+from urllib.parse import urlsplit
+
+from utils import create_logger
+
+logger = create_logger(__name__, 'admission.log')
+
+
+class TitleScorer:
+    """
+    A lightweight n-gram model scoring how relevant an article title is, without downloading the article.
+
+    The score of a title is `bias` plus the sum of the weights of the word n-grams it contains. Titles are
+    lower-cased and stripped of their accents, so 'Grève' and 'greve' match. Weights are either given by
+    keyword lists (`from_keywords`, e.g. a negative weight for 'hunger strike') or learned from titles
+    labelled by a previous run (`fit`, naive Bayes log-count ratios).
+
+    Attributes
+    ----------
+        weights (dict[str, float]) : Weight of each n-gram.
+        bias (float) : Score of a title containing no known n-gram.
+        max_n (int) : Length of the longest n-grams.
+
+    Methods
+    -------
+        ngrams(title: str) -> set[str]:
+            Returns the n-grams of a title.
+        score(title: str) -> float:
+            Returns the relevance score of a title.
+        from_keywords(positive: list[str], negative: list[str], weight: float = 1.0) -> TitleScorer:
+            Builds a scorer from keyword lists.
+        fit(titles: list[str], labels: list[bool], alpha: float = 1.0, min_count: int = 2) -> TitleScorer:
+            Learns a scorer from labelled titles.
+        save(path: str) -> None:
+            Writes the scorer to a JSON file.
+        load(path: str) -> TitleScorer:
+            Reads a scorer from a JSON file.
+    """
+
+    def __init__(self, weights: dict = None, bias: float = 0.0, max_n: int = 2):
+        """
+        Initializes the scorer.
+
+        Args:
+            weights (dict[str, float], optional): Weight of each n-gram, written as normalized words joined by spaces.
+            bias (float): Score of a title containing no known n-gram. Defaults to 0.
+            max_n (int): Length of the longest n-grams. Defaults to 2.
+        """
+        self.weights = dict(weights) if weights is not None else {}
+        self.bias = bias
+        self.max_n = max(max_n, max((key.count(' ') + 1 for key in self.weights), default=1))
+
+    @staticmethod
+    def normalize(text: str) -> list[str]:
+        """Returns the lower-cased words of a text, without accents."""
+        text = unicodedata.normalize('NFKD', text.lower())
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+        return re.findall(r'\w+', text)
+
+    def ngrams(self, title: str) -> set[str]:
+        """
+        Returns the n-grams of a title, from single words to `max_n` words.
+
+        Args:
+            title (str): The title.
+
+        Returns:
+            set[str]: The n-grams, written as normalized words joined by spaces.
+        """
+        words = self.normalize(title) if isinstance(title, str) else []
+        return {' '.join(words[i:i + n]) for n in range(1, self.max_n + 1) for i in range(len(words) - n + 1)}
+
+    def score(self, title: str) -> float:
+        """
+        Returns the relevance score of a title.
+
+        Args:
+            title (str): The title.
+
+        Returns:
+            float: `bias` plus the weights of the n-grams of the title.
+        """
+        return self.bias + sum(self.weights.get(ngram, 0.0) for ngram in self.ngrams(title))
+
+    @classmethod
+    def from_keywords(cls, positive: list[str] = (), negative: list[str] = (), weight: float = 1.0) -> "TitleScorer":
+        """
+        Builds a scorer from keyword lists, e.g. the translated queries and the known sources of noise.
+
+        Args:
+            positive (list[str]): Keywords (of one or several words) making a title relevant.
+            negative (list[str]): Keywords making a title irrelevant, e.g. 'hunger strike' or 'football'.
+            weight (float): Weight of a keyword. Negative keywords weigh twice as much, so that
+                'hunger strike' outweighs 'strike'. Defaults to 1.
+
+        Returns:
+            TitleScorer: The scorer.
+        """
+        weights = {}
+        for keyword in positive:
+            weights[' '.join(cls.normalize(keyword))] = weight
+        for keyword in negative:
+            weights[' '.join(cls.normalize(keyword))] = -2 * weight
+        weights.pop('', None)
+        return cls(weights=weights)
+
+    @classmethod
+    def fit(cls, titles: list[str], labels: list[bool], alpha: float = 1.0, min_count: int = 2,
+            max_n: int = 2) -> "TitleScorer":
+        """
+        Learns a scorer from titles labelled relevant or not, e.g. by the RAG step of a previous run.
+
+        The weight of an n-gram is its naive Bayes log-count ratio between the relevant and irrelevant titles,
+        and the bias is the log ratio of the two classes, so a positive score means "more likely relevant".
+
+        Args:
+            titles (list[str]): The titles.
+            labels (list[bool]): Whether each title is relevant.
+            alpha (float): Additive smoothing of the counts. Defaults to 1.
+            min_count (int): N-grams seen in fewer titles are ignored. Defaults to 2.
+            max_n (int): Length of the longest n-grams. Defaults to 2.
+
+        Returns:
+            TitleScorer: The scorer.
+
+        Raises:
+            ValueError: If the titles and labels have different lengths or a class is empty.
+        """
+        if len(titles) != len(labels):
+            raise ValueError("titles and labels must have the same length")
+        scorer = cls(max_n=max_n)
+        counts = {True: Counter(), False: Counter()}
+        for title, label in zip(titles, labels):
+            counts[bool(label)].update(scorer.ngrams(title))
+        nb_relevant, nb_irrelevant = sum(map(bool, labels)), len(labels) - sum(map(bool, labels))
+        if nb_relevant == 0 or nb_irrelevant == 0:
+            raise ValueError("Both relevant and irrelevant titles are needed")
+
+        total_relevant = sum(counts[True].values()) + alpha
+        total_irrelevant = sum(counts[False].values()) + alpha
+        for ngram in set(counts[True]) | set(counts[False]):
+            if counts[True][ngram] + counts[False][ngram] < min_count:
+                continue
+            scorer.weights[ngram] = (math.log((counts[True][ngram] + alpha) / total_relevant)
+                                     - math.log((counts[False][ngram] + alpha) / total_irrelevant))
+        scorer.bias = math.log(nb_relevant / nb_irrelevant)
+        logger.info(f"Title scorer fitted on {len(titles)} titles with {len(scorer.weights)} n-grams")
+        return scorer
+
+    def save(self, path: str) -> None:
+        """
+        Writes the scorer to a JSON file.
+
+        Args:
+            path (str): The file path.
+        """
+        with open(path, 'w') as file:
+            json.dump({'weights': self.weights, 'bias': self.bias, 'max_n': self.max_n}, file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "TitleScorer":
+        """
+        Reads a scorer from a JSON file written by `save`.
+
+        Args:
+            path (str): The file path.
+
+        Returns:
+            TitleScorer: The scorer.
+        """
+        with open(path, 'r') as file:
+            data = json.load(file)
+        return cls(weights=data['weights'], bias=data['bias'], max_n=data['max_n'])
+
+
+class AdmissionFilter:
+    """
+    Decides, from the feed or API metadata of an article, whether it is worth downloading.
+
+    An article is rejected when it was published outside the scraper's `start_date`/`end_date` window, when
+    its publisher domain (or one of its parent domains) is blocklisted, or when the `TitleScorer` of its
+    language scores its title below `min_score`. Scrapers call `admit` before recording an article, so
+    the browser or the downloader only fetch the plausible candidates. A filter can be shared by several
+    scrapers: its counters are thread-safe.
+
+    Attributes
+    ----------
+        blocked_domains (set[str]) : Domains whose articles are rejected.
+        scorers (dict[str, TitleScorer]) : Title scorer of each language, '*' being used for the other ones.
+        min_score (float) : Score under which a title is rejected.
+        check_dates (bool) : Whether the articles outside the date window are rejected.
+
+    Methods
+    -------
+        admit(link: str, title: str, published: str, start_date: str, end_date: str, lang: str = None) -> bool:
+            Tells whether an article should be downloaded.
+        report() -> dict:
+            Returns the number of articles admitted and rejected for each reason.
+    """
+
+    def __init__(self, blocked_domains: list[str] = (), scorers: dict = None, min_score: float = 0.0,
+                 check_dates: bool = True):
+        """
+        Initializes the filter.
+
+        Args:
+            blocked_domains (list[str]): Domains whose articles are rejected, e.g. ['sport24.lefigaro.fr', 'espn.com'].
+            scorers (dict[str, TitleScorer], optional): Title scorer of each language, '*' being used for the other
+                ones. Titles are not scored when None.
+            min_score (float): Score under which a title is rejected. Defaults to 0.
+            check_dates (bool): Whether the articles outside the date window are rejected. Defaults to True.
+        """
+        self.blocked_domains = {domain.lower().removeprefix('www.') for domain in blocked_domains}
+        self.scorers = scorers if scorers is not None else {}
+        self.min_score = min_score
+        self.check_dates = check_dates
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    @staticmethod
+    def in_window(published: str, start_date: str, end_date: str) -> bool:
+        """
+        Tells whether a publication date is within a window.
+
+        Args:
+            published (str): The publication date (format 'YYYY-MM-DDTHH:MM:SSZ').
+            start_date (str, optional): The start of the window, a day ('YYYY-MM-DD') or a time in the same format.
+            end_date (str, optional): The end of the window, included.
+
+        Returns:
+            bool: False if the date is outside the window, True otherwise (or if it is unknown).
+        """
+        if not published:
+            return True
+        # Bounds given as days are compared to the day of publication, times to the time
+        if start_date and published[:len(start_date)] < start_date:
+            return False
+        if end_date and published[:len(end_date)] > end_date:
+            return False
+        return True
+
+    def _blocked(self, link: str) -> bool:
+        """Tells whether the domain of an URL, or one of its parent domains, is blocklisted."""
+        if not self.blocked_domains or not link:
+            return False
+        host = urlsplit(link).netloc.lower().split(':')[0]
+        labels = host.split('.')
+        return any('.'.join(labels[i:]) in self.blocked_domains for i in range(len(labels) - 1))
+
+    def admit(self, link: str, title: str, published: str, start_date: str = None, end_date: str = None,
+              lang: str = None) -> bool:
+        """
+        Tells whether an article should be downloaded.
+
+        Args:
+            link (str): The URL identifying the publisher of the article (the article URL, or for Google News the
+                publisher URL given by the feed).
+            title (str): The title of the article.
+            published (str): The publication date (format 'YYYY-MM-DDTHH:MM:SSZ').
+            start_date (str, optional): The start of the date window.
+            end_date (str, optional): The end of the date window, included.
+            lang (str, optional): The language of the title, selecting its scorer.
+
+        Returns:
+            bool: True if the article should be downloaded.
+        """
+        reason = None
+        if self.check_dates and not self.in_window(published, start_date, end_date):
+            reason = 'out_of_window'
+        elif self._blocked(link):
+            reason = 'blocked_domain'
+        else:
+            scorer = self.scorers.get(lang, self.scorers.get('*'))
+            if scorer is not None and scorer.score(title) < self.min_score:
+                reason = 'low_score'
+        with self._lock:
+            self._counts[reason or 'admitted'] += 1
+        return reason is None
+
+    def report(self) -> dict:
+        """
+        Returns the counters of the filter.
+
+        Returns:
+            dict: The number of articles admitted, and rejected for being out of the date window, from a blocked
+            domain or with a low title score.
+        """
+        with self._lock:
+            return {key: self._counts[key] for key in ('admitted', 'out_of_window', 'blocked_domain', 'low_score')}
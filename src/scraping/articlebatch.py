@@ -0,0 +1,249 @@
+import numpy as np
+import pandas as pd
+
+
+class ArticleBatch:
+    """
+    An append-only, columnar store of collected articles.
+
+    Scrapers append one article at a time; every column is a NumPy object array grown by doubling, so
+    appending is amortised O(1) and there are no parallel Python lists to keep aligned by hand. Rows are
+    dropped with a single `take`, batches are merged with a single allocation (`concat`), and the articles
+    are only turned into a DataFrame once, at the very end of a collection (`to_dataframe`).
+
+    Attributes
+    ----------
+        columns (list[str]) : Names of the columns, in insertion order.
+
+    Methods
+    -------
+        append(**values) -> None:
+            Appends an article. Missing columns are set to ''.
+        column(name: str) -> np.ndarray:
+            Returns a read-only view of a column.
+        set_column(name: str, values) -> None:
+            Sets (or adds) a whole column.
+        fill(name: str, value) -> None:
+            Sets every row of a column to the same value.
+        drop_column(name: str) -> None:
+            Removes a column.
+        take(rows) -> None:
+            Keeps only the given rows (indices or boolean mask), in place.
+        drop_duplicates(name: str) -> None:
+            Keeps the first row of every value of a column, in place.
+        concat(batches: list[ArticleBatch]) -> ArticleBatch:
+            Merges several batches into a new one.
+        from_dataframe(dataframe: pd.DataFrame) -> ArticleBatch:
+            Builds a batch from a DataFrame.
+        to_dict() -> dict:
+            Returns the articles as a dict of lists.
+        to_dataframe() -> pd.DataFrame:
+            Returns the articles as a DataFrame.
+    """
+
+    def __init__(self, columns: tuple = ('dates', 'titles', 'links'), capacity: int = 64):
+        """
+        Initializes an empty batch.
+
+        Args:
+            columns (tuple): Names of the columns. Defaults to ('dates', 'titles', 'links').
+            capacity (int): Number of rows allocated upfront. Defaults to 64.
+        """
+        self._capacity = max(1, capacity)
+        self._size = 0
+        self._data = {name: np.empty(self._capacity, dtype=object) for name in columns}
+
+    def __len__(self) -> int:
+        """Returns the number of articles."""
+        return self._size
+
+    @property
+    def columns(self) -> list[str]:
+        """
+        Gets the names of the columns.
+
+        Returns:
+            list[str]: The column names, in insertion order.
+        """
+        return list(self._data.keys())
+
+    def _reserve(self, size: int) -> None:
+        """Makes room for `size` rows, doubling the capacity as needed."""
+        if size <= self._capacity:
+            return
+        capacity = max(size, 2 * self._capacity)
+        for name, values in self._data.items():
+            grown = np.empty(capacity, dtype=object)
+            grown[:self._size] = values[:self._size]
+            self._data[name] = grown
+        self._capacity = capacity
+
+    def append(self, **values) -> None:
+        """
+        Appends an article.
+
+        Args:
+            **values: The value of each column. Missing columns are set to ''.
+
+        Raises:
+            ValueError: If a value is given for an unknown column.
+        """
+        unknown = set(values) - set(self._data)
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        self._reserve(self._size + 1)
+        for name, column in self._data.items():
+            column[self._size] = values.get(name, '')
+        self._size += 1
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns a read-only view of a column.
+
+        Args:
+            name (str): The column name.
+
+        Returns:
+            np.ndarray: The values of the column.
+        """
+        view = self._data[name][:self._size]
+        view.flags.writeable = False
+        return view
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Returns a read-only view of a column."""
+        return self.column(name)
+
+    def __contains__(self, name: str) -> bool:
+        """Tells whether the batch has a column."""
+        return name in self._data
+
+    def set_column(self, name: str, values) -> None:
+        """
+        Sets (or adds) a whole column.
+
+        Args:
+            name (str): The column name.
+            values: One value per article.
+
+        Raises:
+            ValueError: If the number of values does not match the number of articles.
+        """
+        if len(values) != self._size:
+            raise ValueError(f"Column '{name}' has {len(values)} values for {self._size} articles")
+        column = np.empty(self._capacity, dtype=object)
+        column[:self._size] = values
+        self._data[name] = column
+
+    def fill(self, name: str, value) -> None:
+        """
+        Sets every row of a column (added if needed) to the same value.
+
+        Args:
+            name (str): The column name.
+            value: The value.
+        """
+        column = self._data.get(name)
+        if column is None:
+            column = self._data[name] = np.empty(self._capacity, dtype=object)
+        column[:self._size] = value
+
+    def drop_column(self, name: str) -> None:
+        """
+        Removes a column.
+
+        Args:
+            name (str): The column name.
+        """
+        del self._data[name]
+
+    def take(self, rows) -> None:
+        """
+        Keeps only the given rows, in place.
+
+        Args:
+            rows: Indices of the rows to keep, or a boolean mask with one entry per article.
+        """
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        else:
+            # An empty list of rows comes out as a float array
+            rows = rows.astype(np.intp)
+        for name, values in self._data.items():
+            kept = np.empty(self._capacity, dtype=object)
+            kept[:len(rows)] = values[:self._size][rows]
+            self._data[name] = kept
+        self._size = len(rows)
+
+    def drop_duplicates(self, name: str) -> None:
+        """
+        Keeps the first row of every value of a column, in place.
+
+        Args:
+            name (str): The column name.
+        """
+        duplicated = pd.Index(self._data[name][:self._size]).duplicated(keep='first')
+        if duplicated.any():
+            self.take(~duplicated)
+
+    @classmethod
+    def concat(cls, batches: list["ArticleBatch"]) -> "ArticleBatch":
+        """
+        Merges several batches into a new one with a single allocation per column.
+
+        Columns missing from a batch are filled with ''.
+
+        Args:
+            batches (list[ArticleBatch]): The batches, in the order of their rows in the result.
+
+        Returns:
+            ArticleBatch: The merged batch.
+        """
+        columns = []
+        for batch in batches:
+            columns += [name for name in batch.columns if name not in columns]
+        result = cls(columns=tuple(columns), capacity=sum(len(batch) for batch in batches))
+        start = 0
+        for batch in batches:
+            end = start + len(batch)
+            for name in columns:
+                result._data[name][start:end] = batch._data[name][:len(batch)] if name in batch._data else ''
+            start = end
+        result._size = start
+        return result
+
+    @classmethod
+    def from_dataframe(cls, dataframe: pd.DataFrame) -> "ArticleBatch":
+        """
+        Builds a batch from a DataFrame.
+
+        Args:
+            dataframe (pd.DataFrame): The articles.
+
+        Returns:
+            ArticleBatch: The batch.
+        """
+        batch = cls(columns=(), capacity=len(dataframe))
+        batch._size = len(dataframe)
+        for name in dataframe.columns:
+            batch.set_column(name, dataframe[name].to_numpy(dtype=object))
+        return batch
+
+    def to_dict(self) -> dict:
+        """
+        Returns the articles as a dict of lists, one per column.
+
+        Returns:
+            dict: The articles.
+        """
+        return {name: values[:self._size].tolist() for name, values in self._data.items()}
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Returns the articles as a DataFrame.
+
+        Returns:
+            pd.DataFrame: One row per article, one column per batch column.
+        """
+        return pd.DataFrame({name: values[:self._size] for name, values in self._data.items()}, columns=self.columns)
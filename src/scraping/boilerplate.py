@@ -0,0 +1,290 @@
+import sys
+sys.path.append("../src/utils")
+
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+from utils import create_logger
+
+logger = create_logger(__name__, 'boilerplate.log')
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?。！？])\s+')
+
+
+class BoilerplateLearner:
+    """
+    Learns, per publisher domain, the lines and sentences repeated across its articles (cookie banners, newsletter
+    prompts, "read also" blocks, signatures...) and strips them from the texts before they are translated,
+    embedded and sent to the RAG.
+
+    Every line of a text, and every sentence of a line made of several sentences, is reduced to a 64-bit
+    fingerprint of its normalized form (lower-cased, digits and whitespace folded). For each domain the learner
+    counts the articles seen and, for each fingerprint, the articles containing it. Once a domain has
+    `min_articles` articles, a fingerprint found in at least `min_share` of them (and `min_count` articles) is
+    boilerplate. The counts are kept in an SQLite file across runs, and loaded for a domain the first time it is
+    seen by a run. Every `prune_every` articles of a domain, the fingerprints found in a single article so far are
+    forgotten, so the statistics keep the repeated lines instead of growing with every article collected. When a
+    domain exceeds `max_articles` its counts are halved, so the statistics follow the changes of the publisher's
+    templates. Saving only writes the counts that changed.
+
+    Attributes
+    ----------
+        path (str) : SQLite file of the statistics. ':memory:' keeps them for the process only.
+        min_articles (int) : Number of articles of a domain under which nothing is stripped from it.
+        min_share (float) : Share of the articles of a domain a fingerprint must appear in to be boilerplate.
+        min_count (int) : Number of articles a fingerprint must appear in to be boilerplate.
+        max_articles (int) : Number of articles of a domain above which its counts are halved.
+        prune_every (int) : Number of articles of a domain after which its one-off fingerprints are forgotten.
+
+    Methods
+    -------
+        learn(link: str, text: str) -> None:
+            Counts the fingerprints of an article.
+        strip(link: str, text: str) -> str:
+            Returns the text of an article without its boilerplate.
+        clean(links, texts) -> list[str]:
+            Learns from a batch of articles, then strips them.
+        report() -> dict:
+            Returns the number of characters before and after stripping.
+        savings_report() -> pd.DataFrame:
+            Returns the characters saved per domain.
+        save() -> None:
+            Writes the statistics to disk.
+        close() -> None:
+            Saves and closes the learner.
+    """
+
+    def __init__(self, path: str = ':memory:', min_articles: int = 20, min_share: float = 0.3, min_count: int = 5,
+                 max_articles: int = 2000, prune_every: int = 100):
+        """
+        Opens (or creates) the statistics of the learner.
+
+        Args:
+            path (str): SQLite file of the statistics. Defaults to ':memory:'.
+            min_articles (int): Number of articles of a domain under which nothing is stripped. Defaults to 20.
+            min_share (float): Share of the articles of a domain a fingerprint must appear in. Defaults to 0.3.
+            min_count (int): Number of articles a fingerprint must appear in. Defaults to 5.
+            max_articles (int): Number of articles of a domain above which its counts are halved. Defaults to 2000.
+            prune_every (int): Number of articles of a domain after which the fingerprints found in a single
+                article are forgotten. Defaults to 100.
+
+        Raises:
+            ValueError: If `min_share` is not between 0 and 1, or `prune_every` is not a positive integer.
+        """
+        if not 0 < min_share <= 1:
+            raise ValueError("min_share must be between 0 and 1")
+        if not isinstance(prune_every, int) or prune_every < 1:
+            raise ValueError("prune_every must be a positive integer")
+        self.path = path
+        self.min_articles = min_articles
+        self.min_share = min_share
+        self.min_count = min_count
+        self.max_articles = max_articles
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS domains (domain TEXT PRIMARY KEY, articles INTEGER NOT NULL, "
+                         "updated_at REAL NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS fingerprints (domain TEXT NOT NULL, fingerprint INTEGER NOT NULL, "
+                         "articles INTEGER NOT NULL, PRIMARY KEY (domain, fingerprint))")
+        self._db.commit()
+
+        self._articles = dict(self._db.execute("SELECT domain, articles FROM domains"))
+        # Fingerprint counts of the domains loaded so far, and the fingerprints changed or removed since the last save
+        self._counts = {}
+        self._changed = {}
+        self._removed = {}
+        self._savings = {}
+        logger.info(f"Boilerplate statistics opened from {path} with {len(self._articles)} domains")
+
+    @staticmethod
+    def domain(link: str) -> str:
+        """Returns the domain of an URL, without 'www.'."""
+        return urlsplit(link).netloc.lower().split(':')[0].removeprefix('www.') if isinstance(link, str) else ''
+
+    @staticmethod
+    def _fingerprint(unit: str) -> int:
+        """Returns the signed 64-bit fingerprint of a normalized line or sentence."""
+        unit = re.sub(r'\d+', '0', ' '.join(unit.lower().split()))
+        return int.from_bytes(hashlib.blake2b(unit.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+    def _domain_counts(self, domain: str) -> dict:
+        """Returns the fingerprint counts of a domain, loading them on first use. The caller holds the lock."""
+        counts = self._counts.get(domain)
+        if counts is None:
+            counts = self._counts[domain] = dict(self._db.execute(
+                "SELECT fingerprint, articles FROM fingerprints WHERE domain = ?", (domain,)))
+        return counts
+
+    def _drop(self, domain: str, keep) -> None:
+        """Forgets the fingerprints of a domain whose count fails `keep`. The caller holds the lock."""
+        counts = self._counts[domain]
+        dropped = [key for key, count in counts.items() if not keep(count)]
+        for key in dropped:
+            del counts[key]
+        self._changed.setdefault(domain, set()).difference_update(dropped)
+        self._removed.setdefault(domain, set()).update(dropped)
+
+    def _units(self, line: str) -> tuple[int, list[tuple[str, int]]]:
+        """Returns the fingerprint of a line, and its sentences with their fingerprints if it has several."""
+        sentences = SENTENCE_SPLIT.split(line.strip())
+        if len(sentences) < 2:
+            return self._fingerprint(line), []
+        return self._fingerprint(line), [(sentence, self._fingerprint(sentence)) for sentence in sentences]
+
+    def learn(self, link: str, text: str) -> None:
+        """
+        Counts the fingerprints of an article, once each.
+
+        Args:
+            link (str): The URL of the article, giving its domain.
+            text (str): The text of the article.
+        """
+        domain = self.domain(link)
+        if not domain or not isinstance(text, str) or not text.strip():
+            return
+        fingerprints = set()
+        for line in text.split('\n'):
+            if line.strip():
+                key, sentences = self._units(line)
+                fingerprints.add(key)
+                fingerprints.update(fingerprint for _, fingerprint in sentences)
+
+        with self._lock:
+            counts = self._domain_counts(domain)
+            for fingerprint in fingerprints:
+                counts[fingerprint] = counts.get(fingerprint, 0) + 1
+            changed = self._changed.setdefault(domain, set())
+            changed.update(fingerprints)
+            self._articles[domain] = self._articles.get(domain, 0) + 1
+            if self._articles[domain] > self.max_articles:
+                self._articles[domain] //= 2
+                self._drop(domain, lambda count: count > 1)
+                for key in counts:
+                    counts[key] //= 2
+                changed.update(counts)
+            elif self._articles[domain] % self.prune_every == 0:
+                self._drop(domain, lambda count: count > 1)
+
+    def _threshold(self, domain: str) -> float:
+        """Returns the number of articles a fingerprint of a domain must appear in, or None if the domain is too new."""
+        articles = self._articles.get(domain, 0)
+        if articles < self.min_articles:
+            return None
+        return max(self.min_count, self.min_share * articles)
+
+    def strip(self, link: str, text: str) -> str:
+        """
+        Returns the text of an article without its boilerplate lines and sentences.
+
+        Args:
+            link (str): The URL of the article, giving its domain.
+            text (str): The text of the article.
+
+        Returns:
+            str: The stripped text. The text is returned unchanged if its domain has too few articles yet, or if
+            all of it looks like boilerplate (e.g. a paywall notice), so that no article is emptied.
+        """
+        domain = self.domain(link)
+        if not isinstance(text, str):
+            return text
+        with self._lock:
+            threshold = self._threshold(domain)
+            counts = self._domain_counts(domain) if threshold is not None else {}
+        stripped = text
+        if threshold is not None:
+            lines = []
+            for line in text.split('\n'):
+                if not line.strip():
+                    lines.append(line)
+                    continue
+                key, sentences = self._units(line)
+                if counts.get(key, 0) >= threshold:
+                    continue
+                if any(counts.get(fingerprint, 0) >= threshold for _, fingerprint in sentences):
+                    line = ' '.join(sentence for sentence, fingerprint in sentences if counts.get(fingerprint, 0) < threshold)
+                lines.append(line)
+            stripped = re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+            if not stripped:
+                stripped = text
+
+        with self._lock:
+            savings = self._savings.setdefault(domain, [0, 0, 0])
+            savings[0] += 1
+            savings[1] += len(text)
+            savings[2] += len(stripped)
+        return stripped
+
+    def clean(self, links, texts) -> list[str]:
+        """
+        Learns from a batch of articles, then strips them, so that the boilerplate of the domains first seen in
+        this batch is stripped too.
+
+        Args:
+            links: The URLs of the articles.
+            texts: The texts of the articles, in the same order.
+
+        Returns:
+            list[str]: The stripped texts.
+        """
+        for link, text in zip(links, texts):
+            self.learn(link, text)
+        return [self.strip(link, text) for link, text in zip(links, texts)]
+
+    def report(self) -> dict:
+        """
+        Returns the characters stripped since the learner was opened.
+
+        Returns:
+            dict: The number of articles stripped, of characters before and after stripping, and the share of the
+            characters saved.
+        """
+        with self._lock:
+            articles = sum(savings[0] for savings in self._savings.values())
+            chars_in = sum(savings[1] for savings in self._savings.values())
+            chars_out = sum(savings[2] for savings in self._savings.values())
+        return {'articles': articles, 'chars_in': chars_in, 'chars_out': chars_out,
+                'saved_share': round(1 - chars_out / chars_in, 4) if chars_in else 0.0}
+
+    def savings_report(self) -> pd.DataFrame:
+        """
+        Returns the characters saved per domain since the learner was opened, i.e. the text no longer translated,
+        embedded and sent to the RAG.
+
+        Returns:
+            pd.DataFrame: One row per domain with its number of articles, characters before and after stripping,
+            characters saved and share saved, the largest savings first.
+        """
+        with self._lock:
+            rows = [(domain, *savings) for domain, savings in self._savings.items()]
+        report = pd.DataFrame(rows, columns=['domain', 'articles', 'chars_in', 'chars_out'])
+        report['chars_saved'] = report['chars_in'] - report['chars_out']
+        report['saved_share'] = (report['chars_saved'] / report['chars_in'].clip(lower=1)).round(4)
+        return report.sort_values('chars_saved', ascending=False, ignore_index=True)
+
+    def save(self) -> None:
+        """Writes the counts changed since the last save to disk, and deletes the fingerprints forgotten."""
+        with self._lock:
+            now = time.time()
+            for domain in set(self._changed) | set(self._removed):
+                self._db.execute("INSERT OR REPLACE INTO domains (domain, articles, updated_at) VALUES (?, ?, ?)",
+                                 (domain, self._articles[domain], now))
+                counts = self._counts[domain]
+                self._db.executemany("DELETE FROM fingerprints WHERE domain = ? AND fingerprint = ?",
+                                     ((domain, key) for key in self._removed.get(domain, ())))
+                self._db.executemany("INSERT OR REPLACE INTO fingerprints (domain, fingerprint, articles) VALUES (?, ?, ?)",
+                                     ((domain, key, counts[key]) for key in self._changed.get(domain, ())))
+            self._db.commit()
+            self._changed = {}
+            self._removed = {}
+
+    def close(self) -> None:
+        """Saves the statistics and closes the SQLite connection."""
+        self.save()
+        self._db.close()
@@ -0,0 +1,135 @@
+import sys
+sys.path.append("../src/utils")
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+import pandas as pd
+
+from utils import create_logger
+
+logger = create_logger(__name__, 'checkpoint.log')
+
+
+class CollectionCheckpoint:
+    """
+    Stores the result of every completed work unit of a `NewsCollector` run so that a failed run can resume.
+
+    Each completed (country, lang, query) unit is written to its own CSV file as soon as it is done, and
+    recorded in a JSON manifest. The manifest carries a run identifier (the scraper type and date window):
+    a checkpoint left by a different run is discarded instead of being resumed.
+
+    Attributes
+    ----------
+        directory (str) : Directory holding the manifest and the unit files.
+        run_id (str) : Identifier of the run the checkpoint belongs to.
+
+    Methods
+    -------
+        is_done(unit: tuple) -> bool:
+            Tells whether a work unit was completed by this run.
+        save(unit: tuple, dataframe: pd.DataFrame) -> None:
+            Records a completed work unit and its articles.
+        load(unit: tuple) -> pd.DataFrame:
+            Returns the articles of a completed work unit, or None if it had none.
+        clear() -> None:
+            Removes the checkpoint, once the run is over.
+    """
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, directory: str, run_id: str):
+        """
+        Opens the checkpoint of `directory`, discarding it if it belongs to another run.
+
+        Args:
+            directory (str): Directory holding the manifest and the unit files.
+            run_id (str): Identifier of the current run.
+        """
+        self.directory = directory
+        self.run_id = run_id
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._units = {}
+
+        path = os.path.join(directory, self.MANIFEST)
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                manifest = json.load(file)
+            if manifest.get('run_id') == run_id:
+                self._units = manifest.get('units', {})
+                logger.info(f"Resuming run {run_id}: {len(self._units)} work units already completed")
+            else:
+                logger.warning(f"Discarding the checkpoint of run {manifest.get('run_id')}, current run is {run_id}")
+                self.clear()
+                os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _key(unit: tuple) -> str:
+        """Returns the file-name-safe key of a work unit."""
+        country, lang, query = unit
+        digest = hashlib.sha1(query.encode('utf-8')).hexdigest()[:12]
+        return f"{country}_{lang}_{digest}"
+
+    def _write_manifest(self) -> None:
+        """Atomically rewrites the manifest. The caller holds the lock."""
+        path = os.path.join(self.directory, self.MANIFEST)
+        with open(path + '.tmp', 'w') as file:
+            json.dump({'run_id': self.run_id, 'units': self._units}, file, indent=4)
+        os.replace(path + '.tmp', path)
+
+    def is_done(self, unit: tuple) -> bool:
+        """
+        Tells whether a work unit was completed by this run.
+
+        Args:
+            unit (tuple): The (country, lang, query) work unit.
+
+        Returns:
+            bool: True if the unit is recorded in the checkpoint.
+        """
+        return self._key(unit) in self._units
+
+    def save(self, unit: tuple, dataframe: pd.DataFrame) -> None:
+        """
+        Records a completed work unit and its articles.
+
+        The unit file is written before the manifest, so a crash in between only loses this unit.
+
+        Args:
+            unit (tuple): The (country, lang, query) work unit.
+            dataframe (pd.DataFrame): The articles of the unit, or None if it had none.
+        """
+        key = self._key(unit)
+        file_name = None
+        if dataframe is not None and len(dataframe) != 0:
+            file_name = key + '.csv'
+            dataframe.to_csv(os.path.join(self.directory, file_name), index=False)
+        with self._lock:
+            self._units[key] = {'unit': list(unit), 'file': file_name,
+                                'articles': 0 if file_name is None else len(dataframe)}
+            self._write_manifest()
+
+    def load(self, unit: tuple) -> pd.DataFrame:
+        """
+        Returns the articles of a completed work unit.
+
+        Args:
+            unit (tuple): The (country, lang, query) work unit.
+
+        Returns:
+            pd.DataFrame: The articles, or None if the unit had none.
+        """
+        file_name = self._units[self._key(unit)]['file']
+        if file_name is None:
+            return None
+        return pd.read_csv(os.path.join(self.directory, file_name), keep_default_na=False)
+
+    def clear(self) -> None:
+        """Removes the checkpoint, once the run is over."""
+        with self._lock:
+            self._units = {}
+            shutil.rmtree(self.directory, ignore_errors=True)
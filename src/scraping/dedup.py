@@ -0,0 +1,235 @@
+import sys
+sys.path.append("../src/utils")
+
+import re
+import zlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, unquote
+
+import numpy as np
+import pandas as pd
+
+from utils import create_logger
+
+logger = create_logger(__name__, 'dedup.log')
+
+
+TRACKING_PREFIXES = ('utm_', 'mc_', 'ns_', 'at_', 'pk_', 'hsa_')
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'igshid', 'ocid', 'cmpid', 'icid', 'ito', 'xtor', 'smid',
+                   'ref', 'ref_src', 'src', 'share', 'amp', 'outputtype', '__twitter_impression'}
+MOBILE_PREFIXES = ('m.', 'mobile.', 'amp.', 'www.')
+AMP_SUFFIXES = ('/amp', '.amp', '/amp.html', '.amp.html', '/amphtml')
+
+
+def canonical_url(url: str) -> str:
+    """
+    Returns the canonical form of an article URL, shared by its tracking, mobile and AMP variants.
+
+    The scheme is dropped (http and https collapse), the host is lower-cased and stripped of its 'www.',
+    mobile and AMP subdomains, Google and Cloudflare AMP cache URLs are unwrapped, AMP path suffixes and
+    tracking parameters are removed, the other parameters are sorted and the fragment and trailing slash
+    are dropped.
+
+    Args:
+        url (str): The URL of an article.
+
+    Returns:
+        str: The canonical URL, e.g. 'lemonde.fr/article' for 'https://m.lemonde.fr/article/amp?utm_source=x'.
+    """
+    parts = urlsplit(url.strip())
+    host, path = parts.netloc.lower(), parts.path
+
+    # AMP caches serve the publisher page under their own host: https://www.google.com/amp/s/publisher/path
+    if host.endswith('cdn.ampproject.org') or (host.startswith(('google.', 'www.google.')) and path.startswith('/amp/')):
+        inner = re.sub(r'^/(?:amp/|c/|v/)*(?:s/)?', '', path)
+        if inner:
+            return canonical_url('https://' + unquote(inner) + ('?' + parts.query if parts.query else ''))
+
+    host = host.split('@')[-1]
+    if host.endswith(':80') or host.endswith(':443'):
+        host = host.rsplit(':', 1)[0]
+    while host.startswith(MOBILE_PREFIXES) and host.count('.') > 1:
+        host = host.split('.', 1)[1]
+
+    lowered = path.lower()
+    for suffix in AMP_SUFFIXES:
+        if lowered.endswith(suffix) or lowered.endswith(suffix + '/'):
+            path = path[:len(path.rstrip('/')) - len(suffix)]
+            break
+    path = re.sub(r'/amp/', '/', path, flags=re.IGNORECASE).rstrip('/')
+
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES))
+    return urlunsplit(('', host, path, urlencode(query), '')).lstrip('/')
+
+
+class ArticleDeduplicator:
+    """
+    Drops duplicate articles in one streaming pass, before they are translated, embedded or sent to RAG.
+
+    An article is a duplicate when its canonical URL (see `canonical_url`) was already seen, or when its text
+    is a near duplicate of an article already seen: a syndicated copy, or the same article with a different
+    boilerplate. Near duplicates are found with MinHash signatures of the character shingles of the texts
+    (which works the same for every language, including those written without spaces) and a banded LSH
+    index; candidates sharing a band are confirmed by the share of their signatures that agree, which
+    estimates the Jaccard similarity of their shingles. The first article of a group is kept.
+
+    Attributes
+    ----------
+        threshold (float) : Estimated Jaccard similarity above which two texts are near duplicates.
+        shingle_size (int) : Number of characters of a shingle.
+        num_perm (int) : Number of hash functions of a MinHash signature.
+        bands (int) : Number of LSH bands, each made of `num_perm / bands` signature rows.
+        url_duplicates (int) : Number of articles dropped for their URL.
+        near_duplicates (int) : Number of articles dropped for their text.
+
+    Methods
+    -------
+        signature(text: str) -> np.ndarray:
+            Returns the MinHash signature of a text.
+        add(link: str, text: str) -> bool:
+            Records an article and tells whether it is new.
+        keep_mask(links, texts) -> np.ndarray:
+            Records the articles in order and returns the mask of those to keep.
+        deduplicate(dataframe: pd.DataFrame, link_column: str = 'links', text_column: str = 'texts') -> pd.DataFrame:
+            Returns the rows of a DataFrame that are not duplicates.
+        report() -> dict:
+            Returns the number of articles seen and dropped.
+    """
+
+    def __init__(self, threshold: float = 0.8, shingle_size: int = 5, num_perm: int = 128, bands: int = 16,
+                 seed: int = 1):
+        """
+        Initializes an empty deduplicator.
+
+        Args:
+            threshold (float): Estimated Jaccard similarity above which two texts are near duplicates. Defaults to 0.8.
+            shingle_size (int): Number of characters of a shingle. Defaults to 5.
+            num_perm (int): Number of hash functions of a MinHash signature. Defaults to 128.
+            bands (int): Number of LSH bands. Defaults to 16, which makes texts above ~0.7 similarity candidates.
+            seed (int): Seed of the hash functions. Defaults to 1.
+
+        Raises:
+            ValueError: If `threshold` is not between 0 and 1 or `num_perm` is not a multiple of `bands`.
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be between 0 and 1")
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.num_perm = num_perm
+        self.bands = bands
+        self._rows = num_perm // bands
+        generator = np.random.default_rng(seed)
+        # Multiply-shift hash functions: odd multipliers, arithmetic modulo 2**64
+        self._a = generator.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = generator.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+        self._lock = threading.Lock()
+        self._urls = set()
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = []
+        self.seen = 0
+        self.url_duplicates = 0
+        self.near_duplicates = 0
+
+    def _shingles(self, text: str) -> np.ndarray:
+        """Returns the distinct 32-bit hashes of the character shingles of a normalized text."""
+        text = re.sub(r'\s+', ' ', text.lower()).strip()
+        k = self.shingle_size
+        hashes = {zlib.crc32(text[i:i + k].encode('utf-8')) for i in range(len(text) - k + 1)}
+        return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Returns the MinHash signature of a text.
+
+        Args:
+            text (str): The text of an article.
+
+        Returns:
+            np.ndarray: `num_perm` minimum hashes, or None if the text is shorter than a shingle.
+        """
+        shingles = self._shingles(text) if isinstance(text, str) else np.empty(0, dtype=np.uint64)
+        if len(shingles) == 0:
+            return None
+        return ((np.outer(shingles, self._a) + self._b) >> np.uint64(32)).min(axis=0)
+
+    def _bands(self, signature: np.ndarray) -> list[bytes]:
+        """Returns the keys of the LSH bands of a signature."""
+        return [signature[band * self._rows:(band + 1) * self._rows].tobytes() for band in range(self.bands)]
+
+    def add(self, link: str, text: str) -> bool:
+        """
+        Records an article and tells whether it is new.
+
+        Args:
+            link (str): The URL of the article.
+            text (str): The text of the article.
+
+        Returns:
+            bool: False if the article duplicates one already recorded (and it is then not recorded), True otherwise.
+        """
+        key = canonical_url(link) if isinstance(link, str) and link else None
+        signature = self.signature(text)
+        with self._lock:
+            self.seen += 1
+            if key is not None and key in self._urls:
+                self.url_duplicates += 1
+                return False
+
+            bands = self._bands(signature) if signature is not None else []
+            candidates = set()
+            for band, bucket_key in enumerate(bands):
+                candidates.update(self._buckets[band].get(bucket_key, ()))
+            for candidate in candidates:
+                if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                    self.near_duplicates += 1
+                    return False
+
+            if key is not None:
+                self._urls.add(key)
+            if signature is not None:
+                index = len(self._signatures)
+                self._signatures.append(signature)
+                for band, bucket_key in enumerate(bands):
+                    self._buckets[band].setdefault(bucket_key, []).append(index)
+        return True
+
+    def keep_mask(self, links, texts) -> np.ndarray:
+        """
+        Records the articles in order and returns the mask of those to keep.
+
+        Args:
+            links: The URLs of the articles.
+            texts: The texts of the articles, in the same order.
+
+        Returns:
+            np.ndarray: A boolean mask, True for the articles that are not duplicates.
+        """
+        return np.fromiter((self.add(link, text) for link, text in zip(links, texts)), dtype=bool, count=len(links))
+
+    def deduplicate(self, dataframe: pd.DataFrame, link_column: str = 'links', text_column: str = 'texts') -> pd.DataFrame:
+        """
+        Returns the rows of a DataFrame that are not duplicates, e.g. the news of several recipes merged
+        before translation.
+
+        Args:
+            dataframe (pd.DataFrame): The articles.
+            link_column (str): Name of the column holding the URLs. Defaults to 'links'.
+            text_column (str): Name of the column holding the texts. Defaults to 'texts'.
+
+        Returns:
+            pd.DataFrame: The articles that are not duplicates, in their original order.
+        """
+        mask = self.keep_mask(dataframe[link_column].to_numpy(), dataframe[text_column].to_numpy())
+        return dataframe[mask]
+
+    def report(self) -> dict:
+        """
+        Returns the counters of the deduplicator.
+
+        Returns:
+            dict: The number of articles seen, dropped for their URL and dropped for their text.
+        """
+        return {'seen': self.seen, 'url_duplicates': self.url_duplicates, 'near_duplicates': self.near_duplicates}
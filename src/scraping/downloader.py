@@ -0,0 +1,324 @@
+import sys
+sys.path.append("../src/utils")
+
+import re
+import time
+import codecs
+import random
+import asyncio
+import threading
+from collections import deque
+from urllib.parse import urlparse
+
+import aiohttp
+
+from utils import create_logger
+from httptape import HttpTape, ReplayServer
+
+logger = create_logger(__name__, 'downloader.log')
+
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+def html_charset(content: bytes, declared: str = None) -> str:
+    """
+    Returns the charset of an HTML body: its byte order mark, else the charset declared by the response, else the
+    one of its <meta> tags (in its first 2 KiB), else 'utf-8'. Unknown charset names are skipped.
+
+    Args:
+        content (bytes): The body.
+        declared (str, optional): The charset of the Content-Type header of the response.
+
+    Returns:
+        str: The name of the charset.
+    """
+    candidates = []
+    for bom, name in ((codecs.BOM_UTF8, 'utf-8'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')):
+        if content.startswith(bom):
+            candidates.append(name)
+    candidates.append(declared)
+    match = META_CHARSET.search(content[:2048])
+    if match is not None:
+        candidates.append(match.group(1).decode('ascii', errors='ignore'))
+    for name in candidates:
+        if name:
+            try:
+                return codecs.lookup(name).name
+            except LookupError:
+                pass
+    return 'utf-8'
+
+
+class AsyncDownloader:
+    """
+    Downloads article pages concurrently with asyncio, politely and with a bounded tail latency.
+
+    At most `max_concurrency` requests are in flight overall and `per_host` per publisher. Every request has
+    strict connect and read timeouts. A request answered with 429 or 5xx, or failing on the network, is retried
+    with exponential backoff (honouring Retry-After), and the host is put on hold for that time so the other
+    requests to it wait as well. With `hedge = True`, once enough latencies have been observed, a request still
+    running after the observed p95 latency gets a second attempt; the first answer wins and the other is cancelled.
+    The latency of a request is counted from the moment it holds its global and per-host slots, not while it is
+    queued behind the other requests, and it is only hedged when a global and a per-host slot are free, so hedging
+    never adds load to a saturated downloader or publisher.
+
+    Bodies are streamed and reading stops after `max_bytes` bytes, so an oversized page only costs its
+    first bytes ('truncated' is then set in its result). Responses whose Content-Type is not HTML are
+    abandoned as soon as their headers arrive, with an empty content ('skipped' is set).
+
+    Attributes
+    ----------
+        max_concurrency (int) : Maximum number of requests in flight.
+        per_host (int) : Maximum number of requests in flight per host.
+        connect_timeout (float) : Timeout to establish a connection.
+        read_timeout (float) : Timeout between two reads of the response.
+        retries (int) : Number of retries of a failing request.
+        backoff (float) : Initial backoff delay, doubled at each retry.
+        hedge (bool) : Whether to send hedged requests.
+        hedge_quantile (float) : Latency quantile after which a request is hedged.
+        min_samples (int) : Number of latencies to observe before hedging.
+        tape (HttpTape, optional) : Records the downloads, or replays them from a stand-in server.
+        max_bytes (int) : Number of bytes of a body read at most.
+
+    Methods
+    -------
+        download(urls: list[str], on_result: callable = None) -> list[dict]:
+            Downloads the pages and returns, for each URL, its result or None.
+        latency_quantile(q: float) -> float:
+            Returns a quantile of the observed latencies.
+        report() -> dict:
+            Returns the request, retry, hedge, failure, truncation and skip counters and the latency quantiles.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    HEADERS = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36'}
+
+    def __init__(self, max_concurrency: int = 32, per_host: int = 4, connect_timeout: float = 5,
+                 read_timeout: float = 15, retries: int = 2, backoff: float = 0.5, hedge: bool = True,
+                 hedge_quantile: float = 0.95, min_samples: int = 20, tape: HttpTape = None,
+                 max_bytes: int = 2 * 1024 ** 2):
+        """
+        Initializes the downloader.
+
+        Args:
+            max_concurrency (int): Maximum number of requests in flight. Defaults to 32.
+            per_host (int): Maximum number of requests in flight per host. Defaults to 4.
+            connect_timeout (float): Timeout to establish a connection. Defaults to 5.
+            read_timeout (float): Timeout between two reads of the response. Defaults to 15.
+            retries (int): Number of retries of a failing request. Defaults to 2.
+            backoff (float): Initial backoff delay in seconds. Defaults to 0.5.
+            hedge (bool): Whether to send hedged requests. Defaults to True.
+            hedge_quantile (float): Latency quantile after which a request is hedged. Defaults to 0.95.
+            min_samples (int): Number of latencies to observe before hedging. Defaults to 20.
+            tape (HttpTape, optional): Records the downloads, or replays them from a stand-in server.
+            max_bytes (int): Number of bytes of a body read at most. Defaults to 2 MiB.
+        """
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.tape = tape
+        self.max_bytes = max_bytes
+        self._latencies = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failures = 0
+        self.truncated = 0
+        self.skipped = 0
+
+    def latency_quantile(self, q: float) -> float:
+        """
+        Returns a quantile of the latencies of the last successful requests.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The latency in seconds, or None if no request succeeded yet.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    async def _fetch(self, session, url: str, state: dict, started: asyncio.Event = None) -> dict:
+        """
+        Sends one request to an URL, within the global and per-host limits, retrying with backoff. `started` is set
+        once the request holds its slots.
+        """
+        host = urlparse(url).netloc
+        request_url = self.tape.url_for(url) if self.tape is not None else url
+        for attempt in range(self.retries + 1):
+            wait = state['hold'].get(host, 0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            semaphore = state['hosts'].setdefault(host, asyncio.Semaphore(self.per_host))
+            async with state['global'], semaphore:
+                if started is not None:
+                    started.set()
+                start = time.monotonic()
+                self.requests += 1
+                try:
+                    async with session.get(request_url, allow_redirects=True) as response:
+                        if response.status in self.RETRY_STATUSES and attempt < self.retries:
+                            retry_after = response.headers.get('Retry-After', '')
+                            delay = float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt
+                        else:
+                            content, truncated, skipped = await self._read(response)
+                            elapsed = time.monotonic() - start
+                            if response.status == 200:
+                                with self._lock:
+                                    self._latencies.append(elapsed)
+                            final_url = response.headers.get(ReplayServer.URL_HEADER, str(response.url))
+                            if self.tape is not None:
+                                self.tape.record('GET', url, None, response.status, response.headers, content, final_url)
+                            return {'url': url, 'final_url': final_url, 'status': response.status,
+                                    'content': content, 'encoding': html_charset(content, response.charset) if content else None,
+                                    'content_type': response.headers.get('Content-Type', ''), 'elapsed': elapsed,
+                                    'truncated': truncated, 'skipped': skipped}
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == self.retries:
+                        raise
+                    delay = self.backoff * 2 ** attempt
+                    logger.info(f"Retrying {url} in {delay:.1f}s after {type(e).__name__}")
+            self.retried += 1
+            delay *= 1 + random.random() * 0.2
+            state['hold'][host] = max(state['hold'].get(host, 0), time.monotonic() + delay)
+        return None
+
+    async def _read(self, response) -> tuple[bytes, bool, bool]:
+        """Streams a body up to `max_bytes`, skipping non-HTML ones. Returns it and the truncated and skipped flags."""
+        content_type = response.headers.get('Content-Type', '').lower()
+        if content_type and 'html' not in content_type:
+            self.skipped += 1
+            response.close()
+            return b'', False, True
+
+        chunks, size = [], 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_bytes:
+                self.truncated += 1
+                # Closing instead of draining: the rest of the body is never transferred
+                response.close()
+                return b''.join(chunks)[:self.max_bytes], True, False
+        return b''.join(chunks), False, False
+
+    def _has_capacity(self, url: str, state: dict) -> bool:
+        """Tells whether a request to an URL would get a global and a per-host slot right away."""
+        semaphore = state['hosts'].get(urlparse(url).netloc)
+        return not state['global'].locked() and (semaphore is None or not semaphore.locked())
+
+    async def _download(self, session, url: str, state: dict) -> dict:
+        """
+        Downloads an URL, hedging the request once it has run longer than the observed quantile since it got its
+        slots, if there is free capacity for a second request.
+        """
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(self._fetch(session, url, state, started if self.hedge else None))
+        tasks = {primary}
+        try:
+            if self.hedge:
+                waiter = asyncio.ensure_future(started.wait())
+                await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                # The quantile is read once the request runs, so the requests queued behind the first ones use
+                # the latencies observed meanwhile
+                threshold = self.latency_quantile(self.hedge_quantile) if len(self._latencies) >= self.min_samples else None
+                if not primary.done() and threshold is not None:
+                    done, _ = await asyncio.wait(tasks, timeout=threshold)
+                    if not done and self._has_capacity(url, state):
+                        self.hedged += 1
+                        tasks.add(asyncio.ensure_future(self._fetch(session, url, state)))
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result() is not None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    if not tasks:
+                        # Every attempt failed: report the last error
+                        if task.exception() is not None:
+                            raise task.exception()
+                        return None
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _download_all(self, urls: list[str], on_result) -> list[dict]:
+        """Downloads all the URLs within one session."""
+        timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+        # When replaying, every host is the stand-in server: only the per-host semaphores limit them
+        replaying = self.tape is not None and self.tape.mode == 'replay'
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=0 if replaying else self.per_host * 2)
+        state = {'global': asyncio.Semaphore(self.max_concurrency), 'hosts': {}, 'hold': {}}
+        loop = asyncio.get_running_loop()
+
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector, headers=self.HEADERS) as session:
+            async def run(index, url):
+                try:
+                    result = await self._download(session, url, state)
+                except Exception as e:
+                    logger.warning(f"Failed to download {url}: {type(e).__name__} {e}")
+                    result = None
+                if result is None:
+                    self.failures += 1
+                if on_result is not None:
+                    # The callback may block (e.g. a bounded parse queue), keep it off the event loop
+                    await loop.run_in_executor(None, on_result, index, result)
+                return result
+
+            return await asyncio.gather(*(run(index, url) for index, url in enumerate(urls)))
+
+    def download(self, urls: list[str], on_result: callable = None) -> list[dict]:
+        """
+        Downloads the pages of the given URLs.
+
+        Args:
+            urls (list[str]): The URLs to download.
+            on_result (callable, optional): Called as `on_result(index, result)` as soon as each download ends,
+                e.g. to start parsing the page while the others are still downloading.
+
+        Returns:
+            list[dict]: For each URL, in order, None if it failed, otherwise a dict with its 'url', 'final_url',
+            'status', 'content' (bytes, at most `max_bytes`, empty for non-HTML content), 'encoding' (the charset
+            of the body, see `html_charset`, or None when it is empty), 'content_type', 'elapsed' time and the 'truncated' and 'skipped' flags.
+        """
+        if len(urls) == 0:
+            return []
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self._download_all(urls, on_result))
+
+        # Already inside an event loop (e.g. a notebook): run in a thread with its own loop
+        results = []
+        thread = threading.Thread(target=lambda: results.append(asyncio.run(self._download_all(urls, on_result))))
+        thread.start()
+        thread.join()
+        return results[0]
+
+    def report(self) -> dict:
+        """
+        Returns the counters of the downloader.
+
+        Returns:
+            dict: The number of requests, retries, hedged requests, hedges that answered first, failures,
+            truncated and skipped bodies, with the p50 and p95 latencies.
+        """
+        return {'requests': self.requests, 'retried': self.retried, 'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins, 'failures': self.failures,
+                'truncated': self.truncated, 'skipped': self.skipped,
+                'p50': self.latency_quantile(0.5), 'p95': self.latency_quantile(0.95)}
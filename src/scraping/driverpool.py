@@ -0,0 +1,262 @@
+import sys
+sys.path.append("../src/utils")
+
+import threading
+from contextlib import contextmanager
+from queue import Queue, Empty
+
+import selenium
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException, TimeoutException, NoSuchElementException
+
+from utils import create_logger
+
+logger = create_logger(__name__, 'driver_pool.log')
+
+
+class DriverPool:
+    """
+    A bounded pool of Selenium WebDrivers shared by the scrapers of a collection run.
+
+    Browsers are only started when a driver is first requested, so creating a scraper costs nothing
+    until something is actually scraped. A driver that crashed is quit and replaced on the next request,
+    and a driver that served `max_pages` pages is recycled to contain browser memory leaks.
+
+    Attributes
+    ----------
+        size (int) : Maximum number of browsers running at the same time.
+        options (selenium.webdriver.chrome.options.Options | selenium.webdriver.firefox.options.Options, optional) :
+            Options used to start the browsers. Defaults to a headless Chrome.
+        timeout (float) : Page load timeout applied to every browser.
+        max_pages (int) : Number of pages a browser serves before being recycled.
+
+    Methods
+    -------
+        acquire() -> WebDriver:
+            Returns an idle driver, starting a new browser if the pool is not full, or waits for one.
+        release(driver, broken: bool = False) -> None:
+            Gives a driver back to the pool, quitting it if it is broken or worn out.
+        driver() -> contextmanager:
+            Acquires a driver for the duration of a `with` block and releases it, flagging it as broken on a crash.
+        close() -> None:
+            Quits every browser of the pool. The pool can still be used afterwards and restarts lazily.
+    """
+
+    def __init__(self, size: int = 1, options=None, timeout: float = 7, max_pages: int = 200):
+        """
+        Initializes the pool without starting any browser.
+
+        Args:
+            size (int): Maximum number of browsers running at the same time. Defaults to 1.
+            options (optional): WebDriver options used to start the browsers. Defaults to a headless Chrome.
+            timeout (float): Page load timeout of the browsers. Defaults to 7.
+            max_pages (int): Number of pages a browser serves before being recycled. Defaults to 200.
+
+        Raises:
+            ValueError: If `size` or `max_pages` is not a positive integer.
+        """
+        if not isinstance(size, int) or size < 1:
+            raise ValueError("size must be a positive integer")
+        if not isinstance(max_pages, int) or max_pages < 1:
+            raise ValueError("max_pages must be a positive integer")
+        self.size = size
+        self.options = options
+        self._timeout = timeout
+        self.max_pages = max_pages
+        self._idle = Queue()
+        self._drivers = {}  # id(driver) -> {'driver', 'pages', 'consent'}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.recycled = 0
+
+    @property
+    def timeout(self) -> float:
+        """
+        Gets the page load timeout of the browsers.
+
+        Returns:
+            float: The timeout value.
+        """
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, timeout: float):
+        """
+        Sets the page load timeout and applies it to the running browsers.
+
+        Args:
+            timeout (float): The new timeout value.
+        """
+        self._timeout = timeout
+        with self._lock:
+            drivers = [slot['driver'] for slot in self._drivers.values() if slot['driver'] is not None]
+        for driver in drivers:
+            try:
+                driver.set_page_load_timeout(timeout)
+            except WebDriverException:
+                pass
+
+    def __len__(self) -> int:
+        """Returns the number of running browsers."""
+        return len(self._drivers)
+
+    def _new_driver(self):
+        """Starts a new browser with the pool options."""
+        options = self.options
+        if isinstance(options, selenium.webdriver.firefox.options.Options):
+            driver = webdriver.Firefox(options=options)
+        else:
+            if options is None:
+                options = webdriver.ChromeOptions()
+                options.add_argument('--headless')
+                options.add_argument('disable-infobars')
+                options.add_argument('--no-sandbox')
+            driver = webdriver.Chrome(options=options)
+        driver.set_page_load_timeout(self._timeout)
+        self.started += 1
+        logger.info(f"Browser started ({len(self._drivers) + 1}/{self.size} running)")
+        return driver
+
+    def add(self, driver) -> None:
+        """
+        Adds an already started driver to the pool.
+
+        Args:
+            driver: The WebDriver to adopt.
+        """
+        with self._lock:
+            self._drivers[id(driver)] = {'driver': driver, 'pages': 0, 'consent': False}
+        self._idle.put(driver)
+
+    def acquire(self):
+        """
+        Returns an idle driver, starting a new browser if the pool is not full, or waits for one.
+
+        Returns:
+            WebDriver: A driver reserved for the caller until it is released.
+        """
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except Empty:
+                pass
+
+            with self._lock:
+                can_start = len(self._drivers) < self.size
+                if can_start:
+                    placeholder = object()
+                    self._drivers[id(placeholder)] = {'driver': None, 'pages': 0, 'consent': False}
+
+            if can_start:
+                break
+            # A busy browser may be recycled instead of released, so keep checking whether one can be started
+            try:
+                return self._idle.get(timeout=0.5)
+            except Empty:
+                continue
+
+        try:
+            driver = self._new_driver()
+        finally:
+            with self._lock:
+                del self._drivers[id(placeholder)]
+        with self._lock:
+            self._drivers[id(driver)] = {'driver': driver, 'pages': 0, 'consent': False}
+        return driver
+
+    def release(self, driver, broken: bool = False) -> None:
+        """
+        Gives a driver back to the pool.
+
+        The browser is quit instead of being reused if it is broken or has served `max_pages` pages;
+        a fresh one will be started on a later `acquire`.
+
+        Args:
+            driver: The WebDriver to release.
+            broken (bool): Whether the browser crashed. Defaults to False.
+        """
+        with self._lock:
+            slot = self._drivers.get(id(driver))
+            if slot is None:
+                return
+            slot['pages'] += 1
+            recycle = broken or slot['pages'] >= self.max_pages
+            if recycle:
+                del self._drivers[id(driver)]
+        if not recycle:
+            self._idle.put(driver)
+            return
+
+        self.recycled += 1
+        logger.info(f"Recycling browser after {slot['pages']} pages (broken = {broken})")
+        self._quit(driver)
+
+    def needs_consent(self, driver) -> bool:
+        """
+        Tells whether the Google consent form has not been accepted yet on this browser.
+
+        Args:
+            driver: A WebDriver of the pool.
+
+        Returns:
+            bool: True if the consent form still has to be handled.
+        """
+        slot = self._drivers.get(id(driver))
+        return slot is not None and not slot['consent']
+
+    def consent_handled(self, driver) -> None:
+        """
+        Records that the Google consent form has been handled on this browser.
+
+        Args:
+            driver: A WebDriver of the pool.
+        """
+        slot = self._drivers.get(id(driver))
+        if slot is not None:
+            slot['consent'] = True
+
+    @contextmanager
+    def driver(self):
+        """
+        Acquires a driver for the duration of a `with` block.
+
+        A WebDriverException other than a page timeout or a missing element is considered as a browser crash:
+        the driver is then recycled and the exception propagated.
+
+        Yields:
+            WebDriver: The acquired driver.
+        """
+        driver = self.acquire()
+        broken = False
+        try:
+            yield driver
+        except (TimeoutException, NoSuchElementException):
+            raise
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.release(driver, broken=broken)
+
+    @staticmethod
+    def _quit(driver) -> None:
+        """Quits a browser, ignoring the errors of an already dead one."""
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Failed to quit browser properly: {e}")
+
+    def close(self) -> None:
+        """Quits every browser of the pool."""
+        with self._lock:
+            drivers = [slot['driver'] for slot in self._drivers.values() if slot['driver'] is not None]
+            self._drivers = {}
+        while True:
+            try:
+                self._idle.get_nowait()
+            except Empty:
+                break
+        for driver in drivers:
+            self._quit(driver)
+        if drivers:
+            logger.info(f"{len(drivers)} browser(s) closed")
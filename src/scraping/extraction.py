@@ -0,0 +1,382 @@
+import sys
+sys.path.append("../src/utils")
+
+import os
+import re
+import threading
+import multiprocessing
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit
+
+import lxml.html
+from lxml import etree
+from newspaper import Article
+
+from utils import create_logger
+
+logger = create_logger(__name__, 'extraction.log')
+
+
+class Extractor(ABC):
+    """
+    An engine extracting the text of an article from its HTML.
+
+    Engines are registered by name in `EXTRACTORS`, so that worker processes only receive the name of the
+    engine to use with each page. Given a `max_chars`, an engine returns at most that many characters, cut at
+    the end of a sentence.
+
+    Attributes
+    ----------
+        name (str) : Name of the engine in `EXTRACTORS`.
+
+    Methods
+    -------
+        extract(html, max_chars: int = None) -> str:
+            Returns the text of the article.
+        truncate(text: str, max_chars: int) -> str:
+            Cuts a text at the last end of sentence before `max_chars`.
+    """
+
+    name : str = None
+    SENTENCE_END = re.compile(r'[.!?。！？](?:["»”’)\]]*)(?=\s|$)|\n')
+
+    @abstractmethod
+    def extract(self, html, max_chars: int = None) -> str:
+        pass
+
+    @classmethod
+    def truncate(cls, text: str, max_chars: int) -> str:
+        """
+        Cuts a text at the last end of sentence (or line) before `max_chars`.
+
+        Args:
+            text (str): The text.
+            max_chars (int, optional): Maximum number of characters. The text is returned as is when None.
+
+        Returns:
+            str: The text, at most `max_chars` long. It is cut at the last space if no sentence ends in its last
+            fifth, and hard cut if it has no space.
+        """
+        if max_chars is None or len(text) <= max_chars:
+            return text
+        head = text[:max_chars]
+        ends = [match.end() for match in cls.SENTENCE_END.finditer(head)]
+        if ends and ends[-1] >= 0.8 * max_chars:
+            return head[:ends[-1]].rstrip()
+        space = head.rfind(' ')
+        return head[:space].rstrip() if space > 0 else head
+
+
+class NewspaperExtractor(Extractor):
+    """Extracts the text of an article with newspaper3k."""
+
+    name = 'newspaper'
+
+    def extract(self, html, max_chars: int = None) -> str:
+        """
+        Parses an article page with newspaper3k and returns its text.
+
+        Args:
+            html (str or bytes): The HTML of the article page.
+            max_chars (int, optional): Maximum number of characters of the text.
+
+        Returns:
+            str: The text of the article.
+        """
+        article = Article("//")
+        article.download(input_html=html)
+        article.parse()
+        return self.truncate(article.text, max_chars)
+
+
+class LxmlExtractor(Extractor):
+    """
+    A fast readability-style extractor working directly on the lxml tree.
+
+    Scripts, styles, navigation, forms and the elements whose class or id looks like boilerplate (sidebar,
+    comments, share buttons...) are removed. Every paragraph long enough scores its parent (and half of it
+    its grandparent) by its length and number of commas; the best scored block, penalised by its share
+    of link text, holds the article, whose paragraphs are joined like newspaper3k does. Pages where no
+    block stands out fall back to all their paragraphs. Paragraphs stop being collected once `max_chars` is
+    reached.
+
+    Attributes
+    ----------
+        min_paragraph (int) : Number of characters under which a paragraph does not score.
+        min_text (int) : Number of characters under which the best block is not trusted.
+    """
+
+    name = 'lxml'
+
+    DROPPED_TAGS = ('script', 'style', 'noscript', 'nav', 'header', 'footer', 'aside', 'form', 'iframe', 'svg',
+                    'button', 'select', 'template', 'figcaption')
+    TEXT_TAGS = {'p', 'h2', 'h3', 'h4', 'li', 'blockquote', 'pre'}
+    NEGATIVE = re.compile(r'comment|sidebar|share|social|related|promo|advert|\bads?\b|cookie|consent|newsletter|'
+                          r'subscri|breadcrumb|menu|\bnav|footer|header|banner|popup|modal|outbrain|taboola|recommend',
+                          re.IGNORECASE)
+    POSITIVE = re.compile(r'article|content|body|story|text|post|entry|main|prose', re.IGNORECASE)
+
+    def __init__(self, min_paragraph: int = 25, min_text: int = 250):
+        """
+        Initializes the extractor.
+
+        Args:
+            min_paragraph (int): Number of characters under which a paragraph does not score. Defaults to 25.
+            min_text (int): Number of characters under which the best block is not trusted. Defaults to 250.
+        """
+        self.min_paragraph = min_paragraph
+        self.min_text = min_text
+
+    @staticmethod
+    def _text(element) -> str:
+        """Returns the text of an element with its whitespace collapsed."""
+        return ' '.join(element.text_content().split())
+
+    def _class_weight(self, element) -> int:
+        """Returns the weight of an element from its class and id."""
+        names = (element.get('class') or '') + ' ' + (element.get('id') or '')
+        if not names.strip():
+            return 0
+        return (25 if self.POSITIVE.search(names) else 0) - (25 if self.NEGATIVE.search(names) else 0)
+
+    def _link_density(self, element, length: int) -> float:
+        """Returns the share of the text of an element that is inside links."""
+        if length == 0:
+            return 1.0
+        return sum(len(self._text(link)) for link in element.iter('a')) / length
+
+    def _clean(self, root) -> None:
+        """Removes the boilerplate elements from the tree."""
+        etree.strip_elements(root, *self.DROPPED_TAGS, etree.Comment, with_tail=False)
+        boilerplate = [element for element in root.iter(etree.Element)
+                       if element.tag not in ('html', 'body') and self._class_weight(element) < 0]
+        for element in boilerplate:
+            if element.getparent() is not None:
+                element.drop_tree()
+
+    def _paragraphs(self, block, max_chars: int = None) -> list[str]:
+        """Returns the text paragraphs of a block, without the ones made of links, up to `max_chars`."""
+        paragraphs, length = [], 0
+        for element in block.iter(*self.TEXT_TAGS):
+            if max_chars is not None and length > max_chars:
+                break
+            # A list item or quote holding paragraphs is read through them
+            if element.tag in ('li', 'blockquote') and element.find('.//p') is not None:
+                continue
+            text = self._text(element)
+            if text and self._link_density(element, len(text)) < 0.5:
+                paragraphs.append(text)
+                length += len(text) + 2
+        if not paragraphs:
+            text = self._text(block)
+            paragraphs = [text] if text else []
+        return paragraphs
+
+    def extract(self, html, max_chars: int = None) -> str:
+        """
+        Extracts the text of an article page.
+
+        Args:
+            html (str or bytes): The HTML of the article page.
+            max_chars (int, optional): Maximum number of characters of the text.
+
+        Returns:
+            str: The paragraphs of the article separated by blank lines, or '' if the page has no text.
+        """
+        if isinstance(html, str):
+            # lxml refuses str input carrying an encoding declaration
+            html = html.encode('utf-8')
+        try:
+            root = lxml.html.document_fromstring(html, parser=lxml.html.HTMLParser(encoding=None, remove_comments=True))
+        except (etree.ParserError, ValueError):
+            return ''
+        self._clean(root)
+
+        scores = {}
+        for paragraph in root.iter('p', 'pre', 'td'):
+            text = self._text(paragraph)
+            if len(text) < self.min_paragraph:
+                continue
+            score = 1 + text.count(',') + text.count('、') + text.count('，') + min(len(text) // 100, 3)
+            parent = paragraph.getparent()
+            if parent is None:
+                continue
+            scores[parent] = scores.get(parent, 0) + score
+            grandparent = parent.getparent()
+            if grandparent is not None:
+                scores[grandparent] = scores.get(grandparent, 0) + score / 2
+
+        best, best_score = None, 0
+        for block, score in scores.items():
+            text_length = len(self._text(block))
+            score = (score + self._class_weight(block)) * (1 - self._link_density(block, text_length))
+            if score > best_score:
+                best, best_score = block, score
+
+        paragraphs = self._paragraphs(best, max_chars) if best is not None else []
+        if sum(map(len, paragraphs)) < self.min_text:
+            paragraphs = [text for text in (self._text(p) for p in root.iter('p')) if len(text) >= self.min_paragraph]
+        return self.truncate('\n\n'.join(paragraphs), max_chars)
+
+
+EXTRACTORS = {extractor.name: extractor for extractor in (NewspaperExtractor(), LxmlExtractor())}
+
+
+def extract_text(html: str, engine: str = 'newspaper', max_chars: int = None) -> str:
+    """
+    Extracts the text of an article page with one of the registered engines.
+
+    This is a module-level function so that it can be sent to the worker processes of a `ParsePool`.
+
+    Args:
+        html (str): The HTML of the article page.
+        engine (str): Name of the engine in `EXTRACTORS`. Defaults to 'newspaper'.
+        max_chars (int, optional): Maximum number of characters of the text, cut at the end of a sentence.
+
+    Returns:
+        str: The text of the article.
+    """
+    return EXTRACTORS[engine].extract(html, max_chars)
+
+
+class ParsePool:
+    """
+    A process pool parsing article pages in parallel with their download.
+
+    Downloading threads hand the HTML they fetched to `submit` and move on to the next page, while the
+    CPU-bound lxml parsing runs in worker processes on every core. The number of pages waiting to be parsed
+    is bounded: `submit` blocks once `max_pending` pages are queued, so downloads cannot outrun the parsers
+    and pile pages up in memory. With `processes = 0` pages are parsed inline, in the calling thread.
+
+    Pages are parsed with the `engine` extractor, unless their domain (or one of its parent domains) is
+    mapped to another engine in `domain_engines`, e.g. to use the fast lxml engine on the publishers where
+    it was checked to extract the same text as newspaper3k.
+
+    Oversized pages are cheap: only the first `max_html` characters (or bytes) of a page are sent to the
+    parsers, and the texts are cut at the end of a sentence once they reach `max_chars`.
+
+    The workers are started lazily, from the downloading threads, while browser, aiohttp, SQLite and logging
+    threads may hold locks: they are started by a fork server rather than forked from the scraper process, so
+    that no worker inherits a lock in the locked state.
+
+    Attributes
+    ----------
+        processes (int) : Number of worker processes. Defaults to the number of cores.
+        max_pending (int) : Maximum number of pages submitted and not parsed yet.
+        engine (str) : Name of the default extraction engine.
+        domain_engines (dict[str, str]) : Extraction engine of some domains.
+        max_html (int) : Number of characters (or bytes) of a page that are parsed.
+        max_chars (int, optional) : Maximum number of characters of a text.
+
+    Methods
+    -------
+        engine_for(url: str) -> str:
+            Returns the name of the engine parsing the pages of an URL.
+        submit(html: str, url: str = None) -> Future:
+            Queues a page and returns a future of its text.
+        close() -> None:
+            Stops the worker processes. The pool restarts them on the next `submit`.
+    """
+
+    def __init__(self, processes: int = None, max_pending: int = None, engine: str = 'newspaper',
+                 domain_engines: dict = None, max_html: int = 2 * 1024 ** 2, max_chars: int = None):
+        """
+        Initializes the pool without starting any process.
+
+        Args:
+            processes (int, optional): Number of worker processes, 0 to parse inline. Defaults to the number of cores.
+            max_pending (int, optional): Maximum number of pages waiting to be parsed. Defaults to 4 per process.
+            engine (str): Name of the default extraction engine. Defaults to 'newspaper'.
+            domain_engines (dict[str, str], optional): Extraction engine of some domains, e.g. {'lemonde.fr': 'lxml'}.
+            max_html (int): Number of characters (or bytes) of a page that are parsed. Defaults to 2 Mi.
+            max_chars (int, optional): Maximum number of characters of a text. Texts are not cut when None.
+
+        Raises:
+            ValueError: If an engine is not registered in `EXTRACTORS`.
+        """
+        self.domain_engines = {domain.lower().removeprefix('www.'): name for domain, name in (domain_engines or {}).items()}
+        unknown = ({engine} | set(self.domain_engines.values())) - set(EXTRACTORS)
+        if unknown:
+            raise ValueError(f"Unknown extraction engines: {', '.join(sorted(unknown))}")
+        self.engine = engine
+        self.max_html = max_html
+        self.max_chars = max_chars
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.max_pending = max_pending if max_pending is not None else 4 * max(1, self.processes)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor : ProcessPoolExecutor = None
+        self._lock = threading.Lock()
+
+    def engine_for(self, url: str) -> str:
+        """
+        Returns the name of the engine parsing the pages of an URL.
+
+        Args:
+            url (str, optional): The URL of the page.
+
+        Returns:
+            str: The engine of its domain (or closest parent domain), `engine` otherwise.
+        """
+        if not url or not self.domain_engines:
+            return self.engine
+        labels = urlsplit(url).netloc.lower().split(':')[0].split('.')
+        for i in range(len(labels) - 1):
+            engine = self.domain_engines.get('.'.join(labels[i:]))
+            if engine is not None:
+                return engine
+        return self.engine
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Returns the executor, starting it on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.processes,
+                                                     mp_context=multiprocessing.get_context('forkserver'))
+                logger.info(f"Parse pool started with {self.processes} processes")
+            return self._executor
+
+    def submit(self, html: str, url: str = None) -> Future:
+        """
+        Queues a page to be parsed, waiting if `max_pending` pages are already queued.
+
+        Args:
+            html (str): The HTML of the article page.
+            url (str, optional): The URL of the page, selecting the extraction engine of its domain.
+
+        Returns:
+            Future: The future text of the article.
+        """
+        engine = self.engine_for(url)
+        if html is not None and len(html) > self.max_html:
+            html = html[:self.max_html]
+        if self.processes == 0:
+            future = Future()
+            try:
+                future.set_result(extract_text(html, engine, self.max_chars))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        self._slots.acquire()
+        try:
+            future = self._get_executor().submit(extract_text, html, engine, self.max_chars)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory): drop the pool, the next page starts a new one
+            self._slots.release()
+            with self._lock:
+                self._executor = None
+            raise
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def close(self) -> None:
+        """Stops the worker processes, once the queued pages are parsed."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
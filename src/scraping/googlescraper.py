@@ -10,6 +10,7 @@ import re
 import math
 import time 
 from time import sleep
+from concurrent.futures import ThreadPoolExecutor
 
 from newspaper import  Article, Config
 
@@ -24,6 +25,10 @@ from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import TimeoutException
 
 from utils import create_logger
+from driverpool import DriverPool
+from pagewait import PageWaiter
+from linkresolver import GoogleNewsResolver
+from admission import AdmissionFilter
 
 logger = create_logger(__name__, 'google_scrapper.log')
 
@@ -51,24 +56,54 @@ class GoogleScraper(Scraper) :
         true_link (bool): Flag to indicate whether to follow redirects to the final article URL.
         timeout (float): Timeout duration for HTTP requests.
         user_agent (str): User agent string for HTTP requests.
+        driver_pool (DriverPool): The pool of browsers used to resolve and download the articles. Browsers are
+            only started when the first article is scraped. A pool can be shared by several scrapers.
+        nb_drivers (int): Size of the pool created when no `driver_pool` is given, i.e. the number of articles
+            downloaded concurrently.
+        page_waiter (PageWaiter): Waits for the pages to be ready, with a timeout budget learned per publisher domain.
+        link_resolver (GoogleNewsResolver, optional): Resolves Google News links to publisher URLs over HTTP, with a
+            cache, so that the browser goes straight to the publisher. The browser redirect is only used for the
+            links it cannot resolve. None when `resolve_links` is False.
+        link_cache_path (str): SQLite file of the cache of the resolver created when no `link_resolver` is given.
+            ':memory:' (the default) keeps the resolved links for the process only.
+        admission (AdmissionFilter): Decides from the feed entries which articles are downloaded (date window,
+            blocked domains, title score).
+        or_query_length (int): Maximum length of an OR-combined query. Google News applies the date operators
+            to the whole OR expression.
+        feed_cap (int): Number of entries at which a search feed is considered truncated by Google News.
+        max_slices (int): Maximum number of date windows a saturated search is split into. 1 disables the split.
+        slice_workers (int): Number of date windows searched concurrently.
     """
+    or_query_length : int = 400
+    feed_cap : int = 100
+
     def __init__(self, 
                 country :str ='US',lang : str='en',query:str = None,topic :str = None,geo_loc : str = None,
                 save_path : str = None,start_date :str= None, 
                 end_date :date = date.today().strftime('%Y-%m-%d'), when = '1d', ecart : int =1, true_link :bool= False,timeout :float = 7,
+                driver_pool : DriverPool = None, nb_drivers : int = 1, page_waiter : PageWaiter = None,
+                link_resolver : GoogleNewsResolver = None, resolve_links : bool = True,
+                link_cache_path : str = ':memory:',
+                admission : AdmissionFilter = None, max_slices : int = 16, slice_workers : int = 4,
                 ) -> None:
         """
         """
         super(GoogleScraper, self).__init__(
                           save_path = save_path,end_date = end_date,ecart = ecart,start_date = start_date,
-                         country = country, lang= lang, timeout = timeout, query = query)
+                         country = country, lang= lang, timeout = timeout, query = query, admission = admission)
         self.topic = topic
         self.geo_loc = geo_loc
+        self.max_slices = max_slices
+        self.slice_workers = slice_workers
+        self.driver_pool = driver_pool if driver_pool is not None else DriverPool(size=nb_drivers, timeout=timeout)
+        self.page_waiter = page_waiter if page_waiter is not None else PageWaiter()
+        if link_resolver is None and resolve_links :
+            link_resolver = GoogleNewsResolver(path=link_cache_path, timeout=timeout)
+        self.link_resolver = link_resolver
         self.engine_init()
         self.when = when
         self._true_link = true_link
         self.selector =".VtwTSb > form:nth-child(1) > div:nth-child(1) > div:nth-child(1) > button:nth-child(1) > span:nth-child(4)"
-        self.__first_scraping = True # Allow to know if GoogleScraper object is being used for the first time
 
     @Scraper.country.setter
     def country(self, country):
@@ -102,63 +137,117 @@ class GoogleScraper(Scraper) :
         Args:
             timeout (float): The new timeout duration for HTTP requests.
         """
-        self._timemout = timeout
-        if hasattr(self, 'driver') :
-            self.driver.set_page_load_timeout(self._timeout)
+        self._timeout = timeout
+        if hasattr(self, 'driver_pool') :
+            self.driver_pool.timeout = timeout
     
+    def clone(self) -> "GoogleScraper":
+        """
+        Creates a new GoogleScraper with the same search parameters, sharing this scraper's pool of browsers,
+        page waiter and link resolver.
+
+        Returns:
+            GoogleScraper: The cloned scraper.
+        """
+        return GoogleScraper(country=self._country, lang=self._lang, query=self._query, topic=self.topic,
+                             geo_loc=self.geo_loc, start_date=self.start_date, end_date=self.end_date,
+                             when=self.when, ecart=self.ecart, true_link=self._true_link, timeout=self._timeout,
+                             driver_pool=self.driver_pool, page_waiter=self.page_waiter,
+                             link_resolver=self.link_resolver, resolve_links=self.link_resolver is not None,
+                             admission=self.admission, max_slices=self.max_slices, slice_workers=self.slice_workers)
+
     def kill_driver(self) :
         """
-        Closes and quits the WebDriver instance if it exists.
+        Closes and quits every WebDriver of the pool. The pool restarts lazily if the scraper is used again.
         """
-        if hasattr(self,'driver') :
-            self.driver.close()
-            self.driver.quit()
+        self.driver_pool.close()
             
     def init_driver(self, options = None, driver = None) :
         """
-        Initializes the WebDriver instance.
+        Configures the WebDriver pool.
 
         Args:
-            options (optional): WebDriver options to be used.
-            driver (optional): An existing WebDriver instance to use.
+            options (optional): WebDriver options used to start the browsers of the pool.
+            driver (optional): An existing WebDriver instance to add to the pool.
         """
         if driver is not None :
-            self.driver = driver
-        else :
-            
-            if options is not None :
-                if isinstance(options, selenium.webdriver.chrome.options.Options):
-                    self.driver = webdriver.Chrome(options=options)
-                elif isinstance(options, selenium.webdriver.firefox.options.Options):
-                    self.driver = webdriver.Firefox(options=options)
-            else :
-                options = webdriver.ChromeOptions()
-                options.add_argument('--headless')
-                options.add_argument('disable-infobars')
-                options.add_argument('--no-sandbox')
-                self.driver = webdriver.Chrome(options=options)
-                self.driver.set_page_load_timeout(self._timeout)
+            self.driver_pool.add(driver)
+        elif options is not None :
+            self.driver_pool.close()
+            self.driver_pool.options = options
                 
     
     def engine_init(self) -> None:
         """
-        Initializes the Google News engine and WebDriver.
+        Initializes the Google News engine.
 
         If the Google News engine (`gn`) does not exist, it is created and initialized with
-        the current language and country settings. The WebDriver is also initialized.
+        the current language and country settings. No browser is started here: the WebDriver
+        pool starts them on demand when articles are scraped.
         """
         if not hasattr(self, 'gn'):
             self.gn = GoogleNews(lang=self._lang, country=self._country)
         else:
             self.gn.lang = self._lang
             self.gn.country = self._country
-        self.init_driver()
             
     
+    def _search_windows(self, start_date : str, end_date : str) -> dict :
+        """
+        Searches the query over a date window, splitting the window while its feed is saturated.
+
+        Google News returns at most `feed_cap` entries per search, so a full feed means that entries were left out.
+        Such a window is split in two halves, searched again, until the feeds are not full, the windows are
+        single days (the finest granularity of the after:/before: operators) or `max_slices` windows are used.
+        The windows of a round are searched concurrently, and their entries are merged in chronological order of
+        the windows, without the links found in several windows.
+
+        Args:
+            start_date (str): The start of the window (format 'YYYY-MM-DD').
+            end_date (str): The end of the window.
+
+        Returns:
+            dict: The search results, with the 'feed' of the first window and the merged 'entries'.
+        """
+        def search(window):
+            return self.gn.search(self.query, from_=window[0], to_=window[1])
+
+        pending, done = [(start_date, end_date)], []
+        with ThreadPoolExecutor(max_workers=self.slice_workers) as executor:
+            while pending:
+                splits = []
+                for i, (window, feed) in enumerate(zip(pending, executor.map(search, pending))):
+                    start, end = (datetime.strptime(day, '%Y-%m-%d') for day in window)
+                    days = (end - start).days
+                    if len(feed['entries']) < self.feed_cap:
+                        done.append((window, feed))
+                    # Splitting adds one window to those done, split and left in this round
+                    elif days < 2 or len(done) + len(splits) + len(pending) - i + 1 > self.max_slices:
+                        logger.warning(f"Google News feed of '{self.query}' saturated from {window[0]} to {window[1]}, "
+                                       f"some articles are missing")
+                        done.append((window, feed))
+                    else:
+                        middle = (start + timedelta(days=days // 2)).strftime('%Y-%m-%d')
+                        splits += [(window[0], middle), (middle, window[1])]
+                pending = splits
+
+        done.sort(key=lambda item: item[0])
+        if len(done) > 1:
+            logger.info(f"Search of '{self.query}' split into {len(done)} date windows")
+        entries, links = [], set()
+        for _, feed in done:
+            for entry in feed['entries']:
+                if entry['link'] not in links:
+                    links.add(entry['link'])
+                    entries.append(entry)
+        return {'feed': done[0][1]['feed'], 'entries': entries}
+
     def search(self) -> dict :
         """
         Performs a search query on Google News based on the provided parameters.
 
+        A search over a date window whose feed is saturated is split into smaller windows (see `_search_windows`).
+
         Returns:
             dict: A dictionary containing the search results from Google News.
 
@@ -167,7 +256,7 @@ class GoogleScraper(Scraper) :
         """
         if self.query is not None : #ser=arch by query
             if self.start_date is not None and self.end_date is not None:
-                return self.gn.search(self.query, from_=self.start_date, to_=self.end_date)
+                return self._search_windows(self.start_date, self.end_date)
             elif self.when is not None :
                 return self.gn.search(self.query, when=self.when)
             else :
@@ -187,141 +276,249 @@ class GoogleScraper(Scraper) :
             return self.gn.top_news()
     
     
-    def process_article(self,article, **kwargs):
+    def process_article(self,article, batch : ArticleBatch):
         """
-        Processes an individual article and appends relevant information to the lists contained
-        in the kwargs dictionary. Raises a ValueError if one or more required lists are missing.
+        Processes an individual article and appends its link, title and publication date to the batch,
+        unless it is rejected by `self.admission` (checked on the publisher given by the feed, since the link
+        is a Google News one) or its link was already collected.
 
         Args:
-            article (dict): The article data obtained from the API.
-            **kwargs: A dictionary containing lists to store article information:
-                - 'links' (list): List to store article URLs.
-                - 'dates' (list): List to store article publication dates.
-                - 'titles' (list): List to store article titles.
+            article (dict): The article data obtained from the Google News feed.
+            batch (ArticleBatch): The batch collecting the articles, with 'links', 'dates' and 'titles' columns.
                 
         Raises:
-            ValueError: If one or more required lists are missing from kwargs.
+            ValueError: If one or more required columns are missing from the batch.
         """
         expected_keys = {'links', 'dates', 'titles'}
-        if not expected_keys.issubset(kwargs.keys()):
-            logger.error("Missing one or more required lists in kwargs.")
-            raise ValueError("Missing one or more required lists in kwargs")
+        if not expected_keys.issubset(batch.columns):
+            logger.error("Missing one or more required columns in the batch.")
+            raise ValueError("Missing one or more required columns in the batch")
         
-        if article['link'] not in kwargs['links'] and article['link'] not in self.URLS:
-            self.URLS.append(article['link'])
-            kwargs['links'].append(article['link'])
-            kwargs['titles'].append(article['title'])
-            kwargs['dates'].append(time.strftime('%Y-%m-%dT%H:%M:%SZ', article['published_parsed']))
+        published = time.strftime('%Y-%m-%dT%H:%M:%SZ', article['published_parsed']) if article.get('published_parsed') else None
+        publisher = (article.get('source') or {}).get('href') or article['link']
+        if self._admit(publisher, article['title'], published) and self.seen_urls.add_if_new(article['link']):
+            batch.append(links=article['link'], titles=article['title'], dates=published)
             
     
     def fetch_articles(self) -> None:
         """
-        Fetches and processes articles by updating the lists
-        of links, dates and titles with the processed data.
+        Fetches and processes articles by appending their links, dates and titles to a new batch.
 
         Returns:
             None
         """
         
         sources = set()
-        kwargs = {
-            "dates" : [],
-            "titles" : [],
-            "links" : []
-        }
+        batch = ArticleBatch(columns=('dates', 'titles', 'links'))
 
         json_data = self.search()
 
         for article in json_data['entries'] :
-            sources.add(article['source'])
-            self.process_article(article=article, **kwargs)
+            if article.get('source'):
+                sources.add(article['source']['title'])
+            self.process_article(article=article, batch=batch)
             
-            if len(article['sub_articles']) != 0:
+            if article['sub_articles']:
+                # Sub-articles only have an url, a title and a publisher name: they get the date of their entry
                 for sub_article in article['sub_articles']:
-                    self.process_article(article=sub_article, **kwargs)
+                    self.process_article(article={'link': sub_article['url'], 'title': sub_article['title'],
+                                                  'published_parsed': article['published_parsed']}, batch=batch)
 
-        self.articles = kwargs
+        self.articles = batch
         self.sources = list(sources)
         print("search ended !")
     
-    def __handle_article_extraction(self, article: Article, texts: list[str], true_links: list[str])-> None:
-        """Helper method to handle downloading, parsing, and storing article content."""
-        sleep(2)
-        article.download(input_html=self.driver.page_source)
-        article.parse()
+    def __handle_article_extraction(self, driver) -> tuple[str, str]:
+        """Helper method to handle downloading the article loaded in the driver. Returns its HTML and URL."""
+        self.page_waiter.wait(driver)
+        return driver.page_source, driver.current_url
 
-        texts.append(article.text)
-        true_links.append(self.driver.current_url)
+    def _scrap_link(self, link: str, driver_pool: DriverPool = None):
+        """
+        Loads a single link in a browser of the pool and extracts its content.
+
+        The page is replayed from `self.html_cache` when it was downloaded recently. Otherwise the browser
+        goes straight to the publisher URL when the link resolver knows it, or follows the Google News
+        redirect and the URL it lands on is given back to the resolver.
+
+        The publisher URL is claimed in `self.seen_urls` (before the download when the resolver knows it, after
+        it otherwise), so an article already collected by another source or query is neither downloaded again
+        nor parsed.
+
+        Args:
+            link (str): The Google News link of the article.
+            driver_pool (DriverPool, optional): The pool of browsers to use. Defaults to `self.driver_pool`.
 
-    def scrapping(self, **kwargs):
+        Returns:
+            tuple[Future, str]: The future text of the article, parsed by `self.parse_pool`, and its publisher URL,
+            or None if the article was already collected.
+
+        Raises:
+            TimeoutException: If the page did not load in time.
+            Exception: If the article could not be downloaded.
+        """
+        driver_pool = driver_pool if driver_pool is not None else self.driver_pool
+        url = self.link_resolver.resolve(link) if self.link_resolver is not None else None
+        if url is not None and not self._claim(url):
+            return None
+        if self.html_cache is not None :
+            cached = self.html_cache.get(url if url is not None else link)
+            if cached is not None :
+                html, true_link = cached
+                if url is None and not self._claim(true_link):
+                    return None
+                return self.parse_pool.submit(html, true_link), true_link
+
+        try :
+            with driver_pool.driver() as driver :
+                driver.get(url if url is not None else link)
+
+                if url is None and driver_pool.needs_consent(driver):
+                    driver_pool.consent_handled(driver)
+                    try :
+                        self.page_waiter.wait_for_consent(driver, self.selector) # accept cookies
+                    except NoSuchElementException as nse:
+                        print("NoSuchElementException")
+
+                html, true_link = self.__handle_article_extraction(driver)
+        except Exception :
+            if url is not None :
+                self._release(url)
+            raise
+
+        if url is None and self.link_resolver is not None :
+            self.link_resolver.remember(link, true_link)
+        if self.html_cache is not None :
+            self.html_cache.put(url if url is not None else link, html, true_link)
+            self.html_cache.put(true_link, html, true_link)
+        if url is None and not self._claim(true_link):
+            return None
+        return self.parse_pool.submit(html, true_link), true_link
+
+    def _try_scrap_link(self, link: str, driver_pool: DriverPool = None) -> tuple:
+        """
+        Calls `_scrap_link`, turning its failure into a (kind, error) record.
+
+        Returns:
+            tuple: The result of `_scrap_link` and None, or None and the ('timeout' or 'download', error) failure.
+            Both are None when the article was already collected.
+        """
+        try :
+            return self._scrap_link(link, driver_pool), None
+        except TimeoutException as to:
+            logger.warning(f"Timeout while scraping {link}")
+            return None, ('timeout', to)
+        except Exception as e : # The article is dropped from this batch, and queued for a retry if there is a queue
+            logger.warning(f"Failed to scrap {link}: {e}")
+            return None, ('download', e)
+
+    def scrapping(self, batch : ArticleBatch, driver_pool : DriverPool = None) -> list[str]:
         """
         Downloads and extracts text content from the article links.
 
+        The links are dispatched to the browsers of the pool, so up to its size articles are downloaded
+        concurrently, while the downloaded pages are parsed by the processes of `self.parse_pool`. Articles
+        that could not be downloaded or parsed are dropped from the batch, whose 'texts' column is set and
+        'links' column replaced by the publisher URLs. The articles already collected by another source or
+        query are dropped too. The pages that could not be downloaded (timeouts, network or browser errors) are
+        recorded in `self.retry_queue`, which retries them later. The other failed links, and all of them without
+        a queue, are forgotten by `self.seen_urls` so that a later query or run can collect them again: a page
+        that could not be parsed would fail the same way if it were downloaded again.
+
         Args:
-            **kwargs: A dictionary containing lists to store article information:
-                -links (list): List of article URLs.
-                -dates (list): List of article publication dates.
-                -times (list): List of article publication times.
-                -titles (list): List of article titles.
+            batch (ArticleBatch): The articles returned by `fetch_articles`.
+            driver_pool (DriverPool, optional): The pool of browsers to use. Defaults to `self.driver_pool`.
 
         Returns:
-            dict: A dictionary containing the articles with their extracted text.
+            list[str]: The links that failed.
         """
-        
-        article = Article("//")
-        texts = []
-        true_links = []
-        fails_index = []
-        for i, link in enumerate(tqdm(kwargs["links"])):
-            
-            try :
-                self.driver.get(link)
-
-                if self.__first_scraping:
-                    sleep(1)
-                    
-                    self.driver.find_element(By.CSS_SELECTOR, self.selector).click() # accept cookies
-                    self.__first_scraping = False
-                
-                # sleep(2)
+        driver_pool = driver_pool if driver_pool is not None else self.driver_pool
+        links = batch['links']
+        with ThreadPoolExecutor(max_workers=driver_pool.size) as executor:
+            downloads = list(tqdm(executor.map(lambda link: self._try_scrap_link(link, driver_pool), links),
+                                  total=len(links)))
+
+        results, failures = [], {}
+        for i, (link, (download, failure)) in enumerate(zip(links, downloads)):
+            result = None
+            if download is not None:
+                future, true_link = download
+                try:
+                    result = future.result(), true_link
+                except Exception as e:
+                    logger.warning(f"Failed to parse {link}: {e}")
+                    self._release(true_link)
+                    failure = ('parse', e)
+            if result is None and failure is not None:
+                failures[i] = failure
+            results.append(result)
+
+        kept = [i for i, result in enumerate(results) if result is not None]
+        if len(failures) != 0:
+            logger.info(f"{len(failures)} articles out of {len(results)} could not be scraped")
+        if len(results) - len(kept) > len(failures):
+            logger.info(f"{len(results) - len(kept) - len(failures)} articles were already collected by another source")
+        titles, dates = batch['titles'], batch['dates']
+        for i, (kind, error) in failures.items():
+            if self.retry_queue is not None and kind != 'parse':
+                self._defer(links[i], titles[i], dates[i], kind, error)
+            else:
+                if self.retry_queue is not None:
+                    # A queued article whose page is now downloaded but cannot be parsed is not retried again
+                    self.retry_queue.abandon(links[i], kind, error)
+                self.seen_urls.discard(links[i])
+        failed = [links[i] for i in failures]
+
+        batch.take(kept)
+        batch.set_column('texts', [results[i][0] for i in kept])
+        batch.set_column('links', [results[i][1] for i in kept])
+        return failed
+
+    def retry_failures(self, limit : int = None) -> ArticleBatch:
+        """
+        Retries the articles of `self.retry_queue` that failed with a GoogleScraper and are due.
 
-                # article.download(input_html = self.driver.page_source )
-                # article.parse()
-                
-                # texts.append(article.text)
-                # true_links.append(self.driver.current_url)
-                self.__handle_article_extraction(article, texts, true_links)
-            
-            except NoSuchElementException as nse:
-                print("NoSuchElementException")
-                self.__first_scraping = False
-                # sleep(2)
+        The retries run in a new pool of browsers, with twice the page load timeout, so that a browser in a bad
+        state or a timeout too short for a slow publisher does not fail them again. The articles failing again
+        are rescheduled by the queue with a longer delay.
 
-                # article.download(input_html = self.driver.page_source )
-                # article.parse()
-                
-                # texts.append(article.text)
-                # true_links.append(self.driver.current_url)
-                self.__handle_article_extraction(article, texts, true_links)
-
-            except TimeoutException as to:
-                print("TimeoutException")
-                fails_index.append(i)
-            except Exception as e : # If exception it means that we do not get the text correctly the index will be kept so that some processing will be made on them
-                fails_index.append(i)
-                print("Exception")
-        
-        # print(f"title :{len(self.articles['titles'])}")
-        # print(f"dates :{len(self.articles['dates'])}")
-        # # print(f"texts :{len(self.articles['texts'])}")
-        # print(f"links :{len(self.articles['links'])}")
-        # # print(f"fails_index = {fails_index}")
-        for index in fails_index : # Deleting the failing index titles and dates so that 'texts' will match them (texts, articles["dates"], articles["titles"] must have the same length
-            self.articles['dates'].pop(index)
-            self.articles['titles'].pop(index)
-        
-        self.articles['texts']  = texts
-        self.articles['links'] = true_links
+        Args:
+            limit (int, optional): Maximum number of articles retried.
+
+        Returns:
+            ArticleBatch: The recovered articles, with the 'lang' and 'cat' of the work units they failed in, or
+            None if none was recovered.
+        """
+        if self.retry_queue is None:
+            return None
+        records = self.retry_queue.due(scraper=type(self).__name__, limit=limit)
+        if len(records) == 0:
+            return None
+        logger.info(f"Retrying {len(records)} articles that failed")
+
+        # 'queued' keeps the queued link of each row, since scrapping replaces the links by the publisher URLs
+        batch = ArticleBatch(columns=('dates', 'titles', 'links', 'queued'))
+        for record in records:
+            batch.append(links=record['link'], titles=record['title'], dates=record['published'], queued=record['link'])
+        driver_pool = DriverPool(size=min(self.driver_pool.size, len(records)), options=self.driver_pool.options,
+                                 timeout=2 * self._timeout)
+        try:
+            failed = set(self.scrapping(batch, driver_pool=driver_pool))
+        finally:
+            driver_pool.close()
+
+        # The articles collected by another source in the meantime are recovered too, but not returned
+        for record in records:
+            if record['link'] not in failed:
+                self.retry_queue.record_success(record['link'])
+        logger.info(f"{len(batch)} articles out of {len(records)} recovered")
+        if len(batch) == 0:
+            return None
+        by_link = {record['link']: record for record in records}
+        batch.set_column('lang', [by_link[link]['lang'] for link in batch['queued']])
+        batch.set_column('cat', [by_link[link]['query'] for link in batch['queued']])
+        batch.drop_column('queued')
+        return batch
     
     def news_collection(self):
         """
@@ -334,6 +531,6 @@ class GoogleScraper(Scraper) :
             None
         """
         self.fetch_articles()
-        self.scrapping(**self.articles)
+        self.scrapping(self.articles)
         super(GoogleScraper, self).news_collection(self.articles)
         logger.info("News collection completed.")
@@ -0,0 +1,211 @@
+import sys
+sys.path.append("../src/utils")
+
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from typing import Iterator
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from utils import create_logger
+
+logger = create_logger(__name__, 'html_cache.log')
+
+
+class HtmlCache:
+    """
+    A compressed, content-addressed on-disk cache of downloaded article pages.
+
+    Pages are stored once per content (zlib-compressed files named after the SHA-256 of the HTML) and an
+    SQLite index maps canonical URLs to them, with the URL the page was finally served from. Entries older
+    than `ttl_days` are ignored, and the least recently used ones are evicted when the pages take more than
+    `max_bytes` on disk. Scrapers look pages up here before touching the network or a browser, so a rerun
+    or an overlapping query replays them from disk.
+
+    Attributes
+    ----------
+        directory (str) : Directory holding the index and the pages.
+        max_bytes (int) : Maximum size of the compressed pages on disk.
+        ttl_days (float) : Age after which a page is downloaded again.
+        hits (int) : Number of pages served from the cache.
+        misses (int) : Number of pages not found in the cache.
+
+    Methods
+    -------
+        canonical_url(url: str) -> str:
+            Returns the URL used as cache key.
+        get(url: str) -> tuple[str, str]:
+            Returns the cached page of an URL and the URL it was served from, or None.
+        put(url: str, html: str, final_url: str = None) -> None:
+            Stores the page of an URL.
+        pages() -> Iterator[tuple[str, str]]:
+            Yields the URL each stored page was served from and its HTML.
+        report() -> dict:
+            Returns the hits, misses and size of the cache.
+        close() -> None:
+            Closes the index.
+    """
+
+    TRACKING_PREFIXES = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid')
+
+    def __init__(self, directory: str = 'html_cache', max_bytes: int = 512 * 1024 ** 2, ttl_days: float = 2):
+        """
+        Opens (or creates) the cache in `directory`.
+
+        Args:
+            directory (str): Directory holding the index and the pages. Defaults to 'html_cache'.
+            max_bytes (int): Maximum size of the compressed pages on disk. Defaults to 512 MiB.
+            ttl_days (float): Age after which a page is downloaded again. Defaults to 2.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_days = ttl_days
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, digest TEXT NOT NULL, final_url TEXT, "
+                         "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS objects (digest TEXT PRIMARY KEY, size INTEGER NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)")
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def canonical_url(cls, url: str) -> str:
+        """
+        Returns the URL used as cache key: lower-case scheme and host, no fragment, no tracking
+        parameters and sorted query parameters.
+
+        Args:
+            url (str): The URL of a page.
+
+        Returns:
+            str: The canonical URL.
+        """
+        parts = urlsplit(url.strip())
+        query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                       if not key.lower().startswith(cls.TRACKING_PREFIXES))
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ''))
+
+    def _object_path(self, digest: str) -> str:
+        """Returns the path of the file holding a page."""
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def get(self, url: str) -> tuple[str, str]:
+        """
+        Returns the cached page of an URL.
+
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            tuple[str, str]: The HTML and the URL it was finally served from, or None if the page is not
+            cached or is older than `ttl_days`.
+        """
+        key = self.canonical_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT digest, final_url, stored_at FROM pages WHERE url = ?", (key,)).fetchone()
+            if row is None or now - row[2] > self.ttl_days * 86400:
+                self.misses += 1
+                return None
+            digest, final_url, _ = row
+            try:
+                with open(self._object_path(digest), 'rb') as file:
+                    html = zlib.decompress(file.read()).decode('utf-8')
+            except (OSError, zlib.error) as e:
+                logger.warning(f"Corrupted cache entry for {url}: {e}")
+                self._db.execute("DELETE FROM pages WHERE url = ?", (key,))
+                self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+        return html, final_url if final_url is not None else url
+
+    def put(self, url: str, html: str, final_url: str = None) -> None:
+        """
+        Stores the page of an URL, then evicts the least recently used pages if the cache is too big.
+
+        Args:
+            url (str): The URL the page was requested with.
+            html (str): The HTML of the page.
+            final_url (str, optional): The URL the page was finally served from, after redirects.
+        """
+        if not html:
+            return
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        key = self.canonical_url(url)
+        now = time.time()
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM objects WHERE digest = ?", (digest,)).fetchone() is None:
+                path = self._object_path(digest)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                compressed = zlib.compress(data, 6)
+                with open(path, 'wb') as file:
+                    file.write(compressed)
+                self._db.execute("INSERT INTO objects VALUES (?, ?)", (digest, len(compressed)))
+            self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)", (key, digest, final_url, now, now))
+            self._evict()
+            self._db.commit()
+
+    def pages(self) -> Iterator[tuple[str, str]]:
+        """
+        Yields every stored page once, e.g. to benchmark the extractors on the pages of past runs.
+
+        Yields:
+            tuple[str, str]: The URL the page was served from and its HTML.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT digest, MAX(COALESCE(final_url, url)) FROM pages GROUP BY digest").fetchall()
+        for digest, url in rows:
+            try:
+                with open(self._object_path(digest), 'rb') as file:
+                    yield url, zlib.decompress(file.read()).decode('utf-8')
+            except (OSError, zlib.error) as e:
+                logger.warning(f"Corrupted cache entry for {url}: {e}")
+
+    def _evict(self) -> None:
+        """Removes the least recently used pages until the cache fits in `max_bytes`. The caller holds the lock."""
+        size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+        if size <= self.max_bytes:
+            return
+        evicted = 0
+        for url, digest in self._db.execute("SELECT url, digest FROM pages ORDER BY accessed_at").fetchall():
+            if size <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            evicted += 1
+            # The content may still be referenced by another URL
+            if self._db.execute("SELECT 1 FROM pages WHERE digest = ?", (digest,)).fetchone() is None:
+                object_size = self._db.execute("SELECT size FROM objects WHERE digest = ?", (digest,)).fetchone()[0]
+                self._db.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+                try:
+                    os.remove(self._object_path(digest))
+                except OSError:
+                    pass
+                size -= object_size
+        logger.info(f"{evicted} pages evicted from the cache")
+
+    def report(self) -> dict:
+        """
+        Returns the state of the cache.
+
+        Returns:
+            dict: The number of hits and misses, of cached pages and the size of the pages on disk.
+        """
+        with self._lock:
+            pages = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'pages': pages, 'bytes': size}
+
+    def close(self) -> None:
+        """Closes the index."""
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,518 @@
+import sys
+sys.path.append("../src/utils")
+
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from typing import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, urlunsplit, urljoin, parse_qsl, urlencode, quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils import create_logger
+
+logger = create_logger(__name__, 'http_tape.log')
+
+
+class HttpCassette:
+    """
+    HTTP interactions recorded to disk, to be replayed later without touching the network.
+
+    Every interaction is keyed on its method, URL and request body. Secret query parameters (API keys) are
+    removed from the URL before it is hashed or stored, so cassettes can be shared, and the other parameters
+    are ordered by name so that building an URL differently does not change its key. The bodies are stored
+    in one file each; the metadata (status, headers, final URL) in a JSON index written by `save`.
+
+    Attributes
+    ----------
+        directory (str) : Directory holding the index and the bodies.
+
+    Methods
+    -------
+        key(method: str, url: str, body=None) -> str:
+            Returns the key of a request.
+        record(method: str, url: str, body, status: int, headers: dict, content: bytes, final_url: str = None) -> None:
+            Records an interaction, replacing a previous one with the same key.
+        lookup(method: str, url: str, body=None) -> dict:
+            Returns a recorded interaction, or None.
+        interactions() -> Iterator[dict]:
+            Yields every recorded interaction.
+        save() -> None:
+            Writes the index to disk.
+    """
+
+    INDEX = 'index.json'
+    SECRET_PARAMS = {'apikey', 'api_key', 'key', 'token', 'access_token'}
+    KEPT_HEADERS = {'content-type', 'etag', 'last-modified', 'location', 'retry-after', 'cache-control'}
+
+    def __init__(self, directory: str):
+        """
+        Opens (or creates) the cassette of `directory`.
+
+        Args:
+            directory (str): Directory holding the index and the bodies.
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'bodies'), exist_ok=True)
+        self._index = {}
+        path = os.path.join(directory, self.INDEX)
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                self._index = json.load(file)
+        logger.info(f"Cassette opened from {directory} with {len(self._index)} interactions")
+
+    def __len__(self) -> int:
+        """Returns the number of recorded interactions."""
+        return len(self._index)
+
+    @classmethod
+    def sanitize(cls, url: str) -> str:
+        """
+        Removes the secret query parameters of an URL and orders the others by name.
+
+        Args:
+            url (str): The URL.
+
+        Returns:
+            str: The URL stored in the cassette.
+        """
+        parts = urlsplit(url)
+        # Stable sort: repeated parameters (e.g. the texts of a translation request) keep their order
+        params = sorted(((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                         if name.lower() not in cls.SECRET_PARAMS), key=lambda param: param[0])
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(params), ''))
+
+    @classmethod
+    def key(cls, method: str, url: str, body=None) -> str:
+        """
+        Returns the key of a request.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL.
+            body (bytes or str, optional): The request body.
+
+        Returns:
+            str: The SHA-1 of the method, sanitized URL and body.
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        digest = hashlib.sha1(f"{method.upper()} {cls.sanitize(url)}\n".encode('utf-8'))
+        digest.update(body or b'')
+        return digest.hexdigest()
+
+    def record(self, method: str, url: str, body, status: int, headers: dict, content: bytes,
+               final_url: str = None) -> None:
+        """
+        Records an interaction, replacing a previous one with the same key.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The requested URL.
+            body (bytes or str): The request body, or None.
+            status (int): The status code of the response.
+            headers (dict): The response headers. Only those that matter for replay are kept.
+            content (bytes): The (decompressed) response body.
+            final_url (str, optional): The URL the response was served from, after redirects. Defaults to `url`.
+        """
+        key = self.key(method, url, body)
+        with open(os.path.join(self.directory, 'bodies', key), 'wb') as file:
+            file.write(content or b'')
+        entry = {'method': method.upper(), 'url': self.sanitize(url), 'status': status,
+                 'headers': {name: value for name, value in headers.items() if name.lower() in self.KEPT_HEADERS},
+                 'final_url': self.sanitize(final_url) if final_url is not None else self.sanitize(url)}
+        with self._lock:
+            self._index[key] = entry
+
+    def lookup(self, method: str, url: str, body=None) -> dict:
+        """
+        Returns a recorded interaction.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The requested URL.
+            body (bytes or str, optional): The request body.
+
+        Returns:
+            dict: The 'status', 'headers', 'final_url' and 'content' (bytes) of the response, or None if the
+            request was not recorded.
+        """
+        key = self.key(method, url, body)
+        with self._lock:
+            entry = self._index.get(key)
+        if entry is None:
+            return None
+        with open(os.path.join(self.directory, 'bodies', key), 'rb') as file:
+            return dict(entry, content=file.read())
+
+    def interactions(self) -> Iterator[dict]:
+        """
+        Yields every recorded interaction, e.g. to build a corpus of article pages.
+
+        Yields:
+            dict: The 'method', 'url', 'status', 'headers', 'final_url' and 'content' (bytes) of an interaction.
+        """
+        with self._lock:
+            entries = list(self._index.items())
+        for key, entry in entries:
+            with open(os.path.join(self.directory, 'bodies', key), 'rb') as file:
+                yield dict(entry, content=file.read())
+
+    def save(self) -> None:
+        """Atomically writes the index to disk."""
+        path = os.path.join(self.directory, self.INDEX)
+        with self._lock:
+            with open(path + '.tmp', 'w') as file:
+                json.dump(self._index, file)
+            os.replace(path + '.tmp', path)
+
+
+class ReplayServer:
+    """
+    A local stand-in for the real servers, answering every request from a cassette.
+
+    Clients send their requests to `url_for(url)` instead of `url`. Each answer is delayed by `latency`
+    seconds plus a uniform random jitter, and a `failure_rate` share of the requests (to `failure_hosts`, or
+    to any host) fail, either with `failure_status` or, if it is None, by closing the connection without
+    answering. Redirects are rewritten
+    to point back to the server, and the URL a response was served from is sent in the X-Replay-Url header.
+    Requests missing from the cassette are answered with 404.
+
+    Attributes
+    ----------
+        cassette (HttpCassette) : The recorded interactions.
+        latency (float) : Minimum delay of an answer, in seconds.
+        jitter (float) : Maximum random delay added to `latency`, in seconds.
+        failure_rate (float) : Share of the requests that fail.
+        failure_status (int, optional) : Status of a failed request, None to close the connection instead.
+        failure_hosts (set[str], optional) : Hosts whose requests may fail, None for every host.
+        served (int) : Number of requests answered from the cassette.
+        missing (int) : Number of requests missing from the cassette.
+        failed (int) : Number of failures injected.
+
+    Methods
+    -------
+        start() -> ReplayServer:
+            Starts serving in a background thread.
+        url_for(url: str) -> str:
+            Returns the URL of the server answering for `url`.
+        report() -> dict:
+            Returns the served, missing and failed counters.
+        stop() -> None:
+            Stops the server.
+    """
+
+    URL_HEADER = 'X-Replay-Url'
+
+    def __init__(self, cassette: HttpCassette, latency: float = 0, jitter: float = 0, failure_rate: float = 0,
+                 failure_status: int = 503, failure_hosts: set = None, seed: int = None, host: str = '127.0.0.1',
+                 port: int = 0):
+        """
+        Initializes the server without starting it.
+
+        Args:
+            cassette (HttpCassette): The recorded interactions.
+            latency (float): Minimum delay of an answer, in seconds. Defaults to 0.
+            jitter (float): Maximum random delay added to `latency`, in seconds. Defaults to 0.
+            failure_rate (float): Share of the requests that fail, between 0 and 1. Defaults to 0.
+            failure_status (int, optional): Status of a failed request, None to close the connection. Defaults to 503.
+            failure_hosts (set[str], optional): Hosts whose requests may fail. Defaults to every host.
+            seed (int, optional): Seed of the random generator, for reproducible runs.
+            host (str): Address to listen on. Defaults to '127.0.0.1'.
+            port (int): Port to listen on, 0 for any free port. Defaults to 0.
+
+        Raises:
+            ValueError: If `failure_rate` is not between 0 and 1 or a delay is negative.
+        """
+        if not 0 <= failure_rate <= 1:
+            raise ValueError("failure_rate must be between 0 and 1")
+        if latency < 0 or jitter < 0:
+            raise ValueError("latency and jitter must be positive")
+        self.cassette = cassette
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.failure_hosts = failure_hosts
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._address = (host, port)
+        self._server : ThreadingHTTPServer = None
+        self._thread : threading.Thread = None
+        self.served = 0
+        self.missing = 0
+        self.failed = 0
+
+    @property
+    def base_url(self) -> str:
+        """
+        Gets the root URL of the running server.
+
+        Returns:
+            str: The URL, e.g. 'http://127.0.0.1:8000'.
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url_for(self, url: str) -> str:
+        """
+        Returns the URL of the server answering for `url`.
+
+        Args:
+            url (str): The real URL.
+
+        Returns:
+            str: The URL to request instead. An URL of the server is returned unchanged.
+        """
+        if url.startswith(self.base_url + '/'):
+            return url
+        return f"{self.base_url}/replay?url={quote(url, safe='')}"
+
+    def _draw(self, url: str) -> tuple[float, bool]:
+        """Draws the delay of the answer to an URL and whether it fails."""
+        exposed = self.failure_hosts is None or urlsplit(url).netloc in self.failure_hosts
+        with self._lock:
+            delay = self.latency + self._random.random() * self.jitter
+            return delay, exposed and self._random.random() < self.failure_rate
+
+    def _handler(self):
+        """Returns the request handler class bound to this server."""
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _serve(self):
+                url = dict(parse_qsl(urlsplit(self.path).query)).get('url', '')
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else None
+                delay, fail = replay._draw(url)
+                time.sleep(delay)
+
+                if fail:
+                    with replay._lock:
+                        replay.failed += 1
+                    if replay.failure_status is None:
+                        self.close_connection = True
+                        return
+                    self.send_response(replay.failure_status)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                entry = replay.cassette.lookup(self.command, url, body)
+                if entry is None:
+                    with replay._lock:
+                        replay.missing += 1
+                    logger.warning(f"Not in the cassette: {self.command} {HttpCassette.sanitize(url)}")
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                with replay._lock:
+                    replay.served += 1
+                self.send_response(entry['status'])
+                for name, value in entry['headers'].items():
+                    if name.lower() == 'location':
+                        value = replay.url_for(urljoin(entry['final_url'], value))
+                    self.send_header(name, value)
+                self.send_header(ReplayServer.URL_HEADER, entry['final_url'])
+                self.send_header('Content-Length', str(len(entry['content'])))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(entry['content'])
+
+            do_GET = do_POST = do_HEAD = _serve
+
+        return Handler
+
+    def start(self) -> "ReplayServer":
+        """
+        Starts serving in a background thread.
+
+        Returns:
+            ReplayServer: The server itself.
+        """
+        self._server = ThreadingHTTPServer(self._address, self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Replay server listening on {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        """Stops the server."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "ReplayServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def report(self) -> dict:
+        """
+        Returns the counters of the server.
+
+        Returns:
+            dict: The number of requests served from the cassette, missing from it and failed on purpose.
+        """
+        return {'served': self.served, 'missing': self.missing, 'failed': self.failed}
+
+
+class TapeAdapter(HTTPAdapter):
+    """A requests transport adapter recording the interactions of a session, or replaying them."""
+
+    def __init__(self, tape: "HttpTape", **kwargs):
+        self.tape = tape
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        url = request.url
+        if self.tape.mode == 'replay':
+            request.url = self.tape.url_for(url)
+        response = super().send(request, **kwargs)
+        if self.tape.mode == 'record':
+            self.tape.cassette.record(request.method, url, request.body, response.status_code, response.headers,
+                                      response.content, url)
+        else:
+            response.url = response.headers.get(ReplayServer.URL_HEADER, url)
+        return response
+
+
+class HttpTape:
+    """
+    Records the HTTP sessions of the pipeline to a cassette, or replays them from a `ReplayServer`.
+
+    `attach` plugs the tape into the components doing HTTP: a requests session (or any object with a
+    `session`, such as the pygooglenews `FeedClient`, the `GoogleNewsResolver`, `NewsApiScraper` and the
+    REST translator) gets a `TapeAdapter`, and an `AsyncDownloader` routes its requests through the tape.
+    In 'record' mode the requests go to the real servers and every answer is written to the cassette; in
+    'replay' mode they all go to the stand-in server.
+
+    Attributes
+    ----------
+        cassette (HttpCassette) : The recorded interactions.
+        mode (str) : 'record' or 'replay'.
+        server (ReplayServer, optional) : The stand-in server, in 'replay' mode.
+
+    Methods
+    -------
+        attach(*targets) -> HttpTape:
+            Plugs the tape into sessions, objects with a session and downloaders.
+        url_for(url: str) -> str:
+            Returns the URL to request for `url`.
+        record(method: str, url: str, body, status: int, headers: dict, content: bytes, final_url: str) -> None:
+            Records an interaction, in 'record' mode.
+        close() -> None:
+            Saves the cassette.
+    """
+
+    MODES = ('record', 'replay')
+
+    def __init__(self, cassette: HttpCassette, mode: str = 'record', server: ReplayServer = None):
+        """
+        Initializes the tape.
+
+        Args:
+            cassette (HttpCassette): The cassette to record to or replay from.
+            mode (str): 'record' or 'replay'. Defaults to 'record'.
+            server (ReplayServer, optional): The stand-in server, started if needed. Defaults to a server with
+                no latency nor failure, in 'replay' mode.
+
+        Raises:
+            ValueError: If the mode is unknown.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode {mode}, expected one of {', '.join(self.MODES)}")
+        self.cassette = cassette
+        self.mode = mode
+        self.server = server
+        if mode == 'replay':
+            if self.server is None:
+                self.server = ReplayServer(cassette)
+            if self.server._server is None:
+                self.server.start()
+
+    def attach(self, *targets) -> "HttpTape":
+        """
+        Plugs the tape into HTTP components.
+
+        Args:
+            *targets: requests sessions, objects (or classes) with a `session` attribute, and downloaders
+                with a `tape` attribute.
+
+        Returns:
+            HttpTape: The tape itself.
+
+        Raises:
+            ValueError: If a target has no session and is not a downloader.
+        """
+        for target in targets:
+            if hasattr(target, 'tape'):
+                target.tape = self
+                continue
+            session = target if isinstance(target, requests.Session) else getattr(target, 'session', None)
+            if not isinstance(session, requests.Session):
+                raise ValueError(f"Cannot attach the tape to {type(target).__name__}")
+            adapter = TapeAdapter(self, pool_connections=10, pool_maxsize=32)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        return self
+
+    def url_for(self, url: str) -> str:
+        """
+        Returns the URL to request for `url`.
+
+        Args:
+            url (str): The real URL.
+
+        Returns:
+            str: The URL of the stand-in server in 'replay' mode, `url` itself otherwise.
+        """
+        return self.server.url_for(url) if self.mode == 'replay' else url
+
+    def record(self, method: str, url: str, body, status: int, headers: dict, content: bytes,
+               final_url: str = None) -> None:
+        """
+        Records an interaction in 'record' mode. Does nothing in 'replay' mode.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The requested URL.
+            body (bytes or str): The request body, or None.
+            status (int): The status code of the response.
+            headers (dict): The response headers.
+            content (bytes): The response body.
+            final_url (str, optional): The URL the response was served from, after redirects.
+        """
+        if self.mode == 'record':
+            self.cassette.record(method, url, body, status, headers, content, final_url)
+
+    def close(self) -> None:
+        """Saves the cassette (in 'record' mode) and stops the server started by the tape."""
+        if self.mode == 'record':
+            self.cassette.save()
+            logger.info(f"{len(self.cassette)} interactions recorded to {self.cassette.directory}")
+        elif self.server is not None:
+            logger.info(f"Replay server: {self.server.report()}")
+            self.server.stop()
+
+    def __enter__(self) -> "HttpTape":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
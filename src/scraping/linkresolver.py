@@ -0,0 +1,236 @@
+import sys
+sys.path.append("../src/utils")
+
+import re
+import json
+import time
+import base64
+import sqlite3
+import threading
+from urllib.parse import urlparse, quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils import create_logger
+
+logger = create_logger(__name__, 'link_resolver.log')
+
+
+class GoogleNewsResolver:
+    """
+    Resolves Google News article links (`news.google.com/rss/articles/...`) to publisher URLs without a browser.
+
+    The article identifier of a link is first decoded offline (older identifiers embed the publisher URL).
+    Newer identifiers are resolved with two HTTP requests on a pooled keep-alive session, the same ones the
+    Google News page performs. Every resolved mapping is stored in an SQLite cache keyed by the article
+    identifier, so a link showing up again in another query or language is never resolved twice. The cache
+    only lives in memory by default; give a file as `path` to keep the mappings across runs.
+    When nothing works, `resolve` returns None and the caller falls back to Selenium, whose result can be
+    given back with `remember`.
+
+    Attributes
+    ----------
+        path (str) : SQLite file of the cache. ':memory:' keeps the cache for the process only.
+        timeout (float) : Timeout of the HTTP requests.
+        session (requests.Session) : Pooled session used for the HTTP requests.
+        hits (int) : Number of links found in the cache.
+        resolved (int) : Number of links resolved by decoding or HTTP requests.
+        misses (int) : Number of links that could not be resolved.
+
+    Methods
+    -------
+        article_id(link: str) -> str:
+            Returns the Google News article identifier of a link, or None for any other URL.
+        resolve(link: str) -> str:
+            Returns the publisher URL of a link, or None if it could not be resolved without a browser.
+        remember(link: str, url: str) -> None:
+            Stores a mapping learned elsewhere, typically from the browser fallback.
+        report() -> dict:
+            Returns the hits, resolutions and misses counters.
+        close() -> None:
+            Closes the HTTP session and the cache.
+    """
+
+    BATCH_URL = "https://news.google.com/_/DotsSplashUi/data/batchexecute"
+    ARTICLE_URL = "https://news.google.com/articles/{}"
+    HEADERS = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36'}
+
+    def __init__(self, path: str = ':memory:', timeout: float = 5, pool_size: int = 10):
+        """
+        Initializes the resolver and opens (or creates) its cache.
+
+        Args:
+            path (str): SQLite file of the cache. Defaults to ':memory:'.
+            timeout (float): Timeout of the HTTP requests. Defaults to 5.
+            pool_size (int): Number of keep-alive connections kept by the session. Defaults to 10.
+        """
+        self.path = path
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(self.HEADERS)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS links (article_id TEXT PRIMARY KEY, url TEXT NOT NULL, resolved_at REAL)")
+        self._db.commit()
+        self.hits = 0
+        self.resolved = 0
+        self.misses = 0
+
+    @staticmethod
+    def article_id(link: str) -> str:
+        """
+        Returns the Google News article identifier of a link.
+
+        Args:
+            link (str): A link returned by the Google News RSS feed.
+
+        Returns:
+            str: The article identifier, or None if the link is not a Google News article link.
+        """
+        parsed = urlparse(link)
+        if parsed.netloc != 'news.google.com':
+            return None
+        parts = parsed.path.strip('/').split('/')
+        if 'articles' not in parts or parts.index('articles') == len(parts) - 1:
+            return None
+        return parts[parts.index('articles') + 1]
+
+    @staticmethod
+    def _decode(article_id: str) -> str:
+        """
+        Decodes the publisher URL embedded in an article identifier.
+
+        Older identifiers are a base64 protobuf message whose string field holds the URL. Newer ones hold
+        an opaque token starting with 'AU_yqL' instead and cannot be decoded offline.
+
+        Returns:
+            str: The publisher URL, or None.
+        """
+        try:
+            data = base64.urlsafe_b64decode(article_id + '=' * (-len(article_id) % 4))
+        except (ValueError, TypeError):
+            return None
+        prefix = b'\x08\x13\x22'
+        if not data.startswith(prefix):
+            return None
+        data = data[len(prefix):]
+
+        # Length of the string field, as a protobuf varint
+        length, shift, pos = 0, 0, 0
+        while pos < len(data):
+            byte = data[pos]
+            length |= (byte & 0x7F) << shift
+            pos += 1
+            if not byte & 0x80:
+                break
+            shift += 7
+        url = data[pos:pos + length].decode('utf-8', errors='ignore')
+        if url.startswith('AU_yqL') or not url.startswith('http'):
+            return None
+        return url
+
+    def _fetch(self, article_id: str) -> str:
+        """
+        Resolves an article identifier with the Google News batchexecute endpoint.
+
+        Returns:
+            str: The publisher URL, or None.
+        """
+        response = self.session.get(self.ARTICLE_URL.format(article_id), timeout=self.timeout)
+        if response.status_code != 200:
+            return None
+        signature = re.search(r'data-n-a-sg="([^"]+)"', response.text)
+        timestamp = re.search(r'data-n-a-ts="([^"]+)"', response.text)
+        if signature is None or timestamp is None:
+            return None
+
+        request = ('["garturlreq",[["X","X",["X","X"],null,null,1,1,"US:en",null,1,null,null,null,null,null,0,1],'
+                   f'"X","X",1,[1,1,1],1,1,null,0,0,null,0],"{article_id}",{timestamp.group(1)},"{signature.group(1)}"]')
+        payload = 'f.req=' + quote(json.dumps([[["Fbv4je", request]]]))
+        response = self.session.post(self.BATCH_URL, data=payload, timeout=self.timeout,
+                                     headers={'Content-Type': 'application/x-www-form-urlencoded;charset=UTF-8'})
+        if response.status_code != 200:
+            return None
+        try:
+            body = json.loads(response.text.split('\n\n', 1)[1])
+            return json.loads(body[0][2])[1]
+        except (IndexError, ValueError, TypeError):
+            return None
+
+    def _lookup(self, article_id: str) -> str:
+        """Returns the cached publisher URL of an article identifier, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT url FROM links WHERE article_id = ?", (article_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _store(self, article_id: str, url: str) -> None:
+        """Stores the publisher URL of an article identifier."""
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO links VALUES (?, ?, ?)", (article_id, url, time.time()))
+            self._db.commit()
+
+    def resolve(self, link: str) -> str:
+        """
+        Returns the publisher URL of a Google News link without using a browser.
+
+        Args:
+            link (str): A link returned by the Google News RSS feed.
+
+        Returns:
+            str: The publisher URL. Links that are not Google News article links are returned unchanged.
+            None if the link could not be resolved, in which case a browser is needed.
+        """
+        article_id = self.article_id(link)
+        if article_id is None:
+            return link
+
+        url = self._lookup(article_id)
+        if url is not None:
+            self.hits += 1
+            return url
+
+        url = self._decode(article_id)
+        if url is None:
+            try:
+                url = self._fetch(article_id)
+            except requests.RequestException as e:
+                logger.warning(f"Failed to resolve {link}: {e}")
+
+        if url is None:
+            self.misses += 1
+            return None
+        self.resolved += 1
+        self._store(article_id, url)
+        return url
+
+    def remember(self, link: str, url: str) -> None:
+        """
+        Stores a mapping learned elsewhere, typically from the browser fallback.
+
+        Args:
+            link (str): The Google News link.
+            url (str): The publisher URL the link redirects to.
+        """
+        article_id = self.article_id(link)
+        if article_id is None or url is None or urlparse(url).netloc in ('', 'news.google.com'):
+            return
+        self._store(article_id, url)
+
+    def report(self) -> dict:
+        """
+        Returns the counters of the resolver.
+
+        Returns:
+            dict: The number of cache hits, of links resolved without a browser and of links left to the browser.
+        """
+        return {'hits': self.hits, 'resolved': self.resolved, 'misses': self.misses}
+
+    def close(self) -> None:
+        """Closes the HTTP session and the cache."""
+        self.session.close()
+        with self._lock:
+            self._db.close()
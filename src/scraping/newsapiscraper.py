@@ -3,18 +3,103 @@ from scraper import *
 
 import requests
 import re
+import os
 import math
-from newspaper import  Article
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from tqdm import tqdm
 
 import sys
 sys.path.append("../src/utils")
 
 from utils import create_logger
+from downloader import AsyncDownloader
+from admission import AdmissionFilter
 
 logger = create_logger(__name__, 'news_api_scrapper.log')
 
+
+class RequestQuota :
+    """
+    Tracks the number of NewsAPI requests made during the current (UTC) day against the daily quota of the plan.
+
+    Attributes
+    ----------
+        daily_limit (int) : Number of requests allowed per day.
+        path (str, optional) : JSON file where the counter is persisted, so that it survives between recipes.
+        day (str) : The day the counter refers to (format 'YYYY-MM-DD').
+        used (int) : Number of requests made during `day`.
+    """
+
+    def __init__(self, daily_limit : int = 100, path : str = None) -> None:
+        """
+        Initializes the quota, loading the counter from `path` if it refers to the current day.
+
+        Args:
+            daily_limit (int): Number of requests allowed per day. Defaults to 100, the developer plan quota.
+            path (str, optional): JSON file where the counter is persisted.
+        """
+        self.daily_limit = daily_limit
+        self.path = path
+        self._lock = threading.Lock()
+        self.day = datetime.utcnow().strftime('%Y-%m-%d')
+        self.used = 0
+        if path is not None and os.path.exists(path):
+            with open(path, 'r') as file:
+                data = json.load(file)
+            if data.get('day') == self.day:
+                self.used = data.get('used', 0)
+
+    def _roll(self) -> None:
+        """Resets the counter when the day changed. The caller holds the lock."""
+        today = datetime.utcnow().strftime('%Y-%m-%d')
+        if today != self.day:
+            self.day, self.used = today, 0
+
+    @property
+    def remaining(self) -> int:
+        """
+        Gets the number of requests left for the current day.
+
+        Returns:
+            int: The remaining requests.
+        """
+        with self._lock:
+            self._roll()
+            return max(0, self.daily_limit - self.used)
+
+    def consume(self) -> bool :
+        """
+        Reserves one request.
+
+        Returns:
+            bool: True if the request is allowed, False if the quota is exhausted.
+        """
+        with self._lock:
+            self._roll()
+            if self.used >= self.daily_limit:
+                return False
+            self.used += 1
+        self.save()
+        return True
+
+    def exhaust(self) -> None:
+        """Marks the quota as exhausted, e.g. when the API answers that the rate limit is reached."""
+        with self._lock:
+            self._roll()
+            self.used = self.daily_limit
+        self.save()
+
+    def save(self) -> None:
+        """Persists the counter to `path`, if any."""
+        if self.path is None:
+            return
+        with self._lock:
+            data = {'day': self.day, 'used': self.used}
+        with open(self.path, 'w') as file:
+            json.dump(data, file)
+
+
 class NewsApiScraper(Scraper) :
     """
     A scraper for fetching news articles from the NewsAPI.
@@ -40,6 +125,14 @@ class NewsApiScraper(Scraper) :
         total_results (int) : The total number of results returned by the API.
         articles (dict) : Dictionary containing lists of collected article data.
         sources (list) : List of source names from which articles were collected.
+        page_size (int) : Number of articles requested per page, 100 being the maximum allowed by the API.
+        max_concurrent_pages (int) : Number of pages requested at the same time.
+        quota (RequestQuota) : Daily request quota, shared by every NewsApiScraper.
+        downloader (AsyncDownloader) : Downloads the article pages concurrently.
+        admission (AdmissionFilter) : Decides from the API results which articles are downloaded (date window,
+            blocked domains, title score).
+        or_query_length (int) : Maximum length of an OR-combined query, the API accepting queries of up to 500
+            characters.
 
     Methods
     -------
@@ -49,6 +142,9 @@ class NewsApiScraper(Scraper) :
                  timeout: float = 5) -> None:
             Initializes the NewsApiScraper with the provided parameters.
 
+        search_url() -> str:
+            Constructs the URL for querying the NewsAPI based on the query, topic, and date range.
+
         search() -> dict:
             Performs a search query on the NewsAPI based on the provided parameters.
             Constructs the URL for querying the NewsAPI based on the query, topic, and date range.
@@ -56,39 +152,38 @@ class NewsApiScraper(Scraper) :
 
         set_params() -> None:
             Sets the parameters for pagination and total results based on the search response.
-            Calls the `search` method to obtain the total number of results and calculates
+            Calls the `search` method to obtain the first page and the total number of results, and calculates
             the number of pages required for fetching all the articles.
 
-        process_article(article: dict, **kwargs) -> None:
-            Processes an individual article and appends relevant information to the lists contained
-            in the kwargs dictionary. Raises a ValueError if one or more required lists are missing.
+        process_article(article: dict, batch: ArticleBatch) -> None:
+            Processes an individual article and appends relevant information to the batch.
+            Raises a ValueError if one or more required columns are missing.
 
         fetch_articles() -> None:
             Fetches and processes articles from the API across multiple pages.
-            Uses pagination to collect all articles matching the search parameters.
+            Reuses the first page and requests the other ones concurrently, stopping early when the daily
+            quota is exhausted or the articles get older than `start_date`.
 
-        scrapping(**kwargs) -> dict:
+        scrapping(batch: ArticleBatch) -> None:
             Downloads and extracts text content from the article links.
-            Args:
-                links (list): List of article URLs.
-                dates (list): List of article publication dates.
-                times (list): List of article publication times.
-                descriptions (list): List of article descriptions.
-                titles (list): List of article titles.
-                verbose (bool, optional): If True, prints progress information. Default is False.
-            Returns:
-                dict: A dictionary containing the articles with their extracted text.
+            Sets the 'texts' column of the batch, falling back on the description of the articles
+            that could not be downloaded, and removes the 'descriptions' column.
 
         news_collection() -> None:
             Collects news articles, processes them, and optionally saves them.
             Fetches articles, extracts relevant information, and uses the parent class's
             `news_collection` method to save the articles if a save path is provided.
         """
+    quota : RequestQuota = RequestQuota()
+    session : requests.Session = requests.Session()
+    or_query_length : int = 250
+
     
     def __init__(self, api_key :str,country :str ="US",lang : str="en",query :str = None,
                  topic :str = None,save_path : str = None,start_date :str= None, #year-moonth-day (i.e '2024-05-18')
                  end_date :date = date.today().strftime('%Y-%m-%d'),ecart : int =1,
-                 timeout : float = 5
+                 timeout : float = 5, page_size : int = 100, max_concurrent_pages : int = 4,
+                 downloader : AsyncDownloader = None, admission : AdmissionFilter = None
                 ) -> None:
         """
         Initializes the NewsApiScraper with the provided parameters.
@@ -104,180 +199,232 @@ class NewsApiScraper(Scraper) :
             end_date (str, optional): End date for the news articles (format 'YYYY-MM-DD').
             ecart (int): Number of days to subtract from the end date to determine the start date if not provided.
             timeout (float): Timeout duration for HTTP requests.
+            page_size (int): Number of articles requested per page (at most 100). Defaults to 100.
+            max_concurrent_pages (int): Number of pages requested at the same time. Defaults to 4.
+            downloader (AsyncDownloader, optional): Downloader of the article pages. Defaults to a new one whose
+                read timeout is `timeout`.
+            admission (AdmissionFilter, optional): Filter of the articles to download. Defaults to one rejecting
+                the articles outside the date window.
         """
         super(NewsApiScraper, self).__init__(save_path = save_path, end_date = end_date, ecart = ecart,
                         start_date = start_date, query = query, timeout = timeout,
-                         country = country,lang = lang)
+                         country = country,lang = lang, admission = admission)
         self._api_key = api_key
+        self.topic = topic
         self._url = None
+        self.page_size = min(page_size, 100)
+        self.max_concurrent_pages = max_concurrent_pages
+        self.first_page : dict = None
+        self.downloader = downloader if downloader is not None else AsyncDownloader(read_timeout=timeout)
 
-    def search(self) -> dict :
+    def clone(self) -> "NewsApiScraper":
         """
-        Performs a search query on the NewsAPI based on the provided parameters.
+        Creates a new NewsApiScraper with the same API key and search parameters.
+
+        Returns:
+            NewsApiScraper: The cloned scraper.
+        """
+        return NewsApiScraper(api_key=self._api_key, country=self._country, lang=self._lang, query=self._query,
+                              topic=self.topic, start_date=self.start_date, end_date=self.end_date,
+                              ecart=self.ecart, timeout=self._timeout, page_size=self.page_size,
+                              max_concurrent_pages=self.max_concurrent_pages, downloader=self.downloader,
+                              admission=self.admission)
+
+    def _get(self, url : str) -> dict :
+        """
+        Sends a request to the NewsAPI through the shared session, within the daily quota.
+
+        Args:
+            url (str): The request URL.
 
+        Returns:
+            dict: The JSON response, or None if the quota is exhausted.
+        """
+        if not self.quota.consume():
+            logger.warning(f'Daily quota of {self.quota.daily_limit} requests exhausted, {url} not requested')
+            return None
+        response = self.session.get(url, timeout=self._timeout).json()
+        if response.get('status') == 'error':
+            logger.error(f"NewsAPI error {response.get('code')}: {response.get('message')}")
+            if response.get('code') == 'rateLimited':
+                self.quota.exhaust()
+        return response
+
+    def search_url(self) -> str :
+        """
         Constructs the URL for querying the NewsAPI based on the query, topic, and date range.
-        Returns the JSON response from the API.
 
         Returns:
-            dict: A dictionary containing the search results from the NewsAPI.
-        
-        Raises:
-            ValueError: If an invalid topic is provided or if neither query nor topic is provided.
+            str: The URL of the search, without its page number.
         """
         if self.query is not None : #ser=arch by query
             query = self.query.split()
             query = "+".join(query)
             url = ('https://newsapi.org/v2/everything?'
                        f'q={query}&'
-                       f'apiKey={self._api_key}')
+                       f'apiKey={self._api_key}&'
+                       'sortBy=publishedAt')
             if self._lang is not None :
                 url = url + f'&language={self._lang}'
             if self.start_date is not None and self.end_date is not None:
                 url = url + (f'&from={self.start_date}&'
                        f'to={self.end_date}')
-            self._url = url
             logger.info(f'Searching with query: {url}')
-            return requests.get(url).json()
 
         elif self.topic is not None : # Search by topic
-            try:
-                url = ('https://newsapi.org/v2/top-headlines?'
+            url = ('https://newsapi.org/v2/top-headlines?'
                        f'country={self._country}&'
                        f'apiKey={self._api_key}&'
                        f'category={self.topic}')
-                self._url= url
-                logger.info(f'Searching with topic: {url}')
-                return requests.get(url).json()
-            except Exception as e:
-                logger.error(f"Invalid topic provided. Accepted topics are : {'business,entertainment,general,health,science,sports,technology'}. more info about the error : {e}")
+            logger.info(f'Searching with topic: {url}')
                 
         else :
             url = ('https://newsapi.org/v2/top-headlines?'
                        f'country={self._country}&'
                        f'apiKey={self._api_key}')
-            self._url = url
             logger.warning('No query or topic provided. Fetching top headlines.')
-            return requests.get(url).json()
+
+        return url + f'&pageSize={self.page_size}'
+
+    def search(self) -> dict :
+        """
+        Performs a search query on the NewsAPI based on the provided parameters.
+
+        Constructs the URL for querying the NewsAPI based on the query, topic, and date range.
+        Returns the JSON response from the API, which is the first page of results.
+
+        Returns:
+            dict: A dictionary containing the search results from the NewsAPI, or None if the daily quota is exhausted.
+        
+        Raises:
+            ValueError: If an invalid topic is provided or if neither query nor topic is provided.
+        """
+        self._url = self.search_url()
+        try:
+            return self._get(self._url + '&page=1')
+        except Exception as e:
+            logger.error(f"Search failed, if searching by topic, accepted topics are : {'business,entertainment,general,health,science,sports,technology'}. more info about the error : {e}")
     
 
     def set_params(self) -> None :
         """
         Sets the parameters for pagination and total results based on the search response.
 
-        Calls the `search` method to obtain the total number of results and calculates
-        the number of pages required for fetching all the articles.
+        Calls the `search` method to obtain the first page and the total number of results, and calculates
+        the number of pages required for fetching all the articles. The first page is kept in `self.first_page`
+        so that it is not requested again.
 
         Returns:
             None
         """
         response = self.search()
-        self.pages = math.ceil(response['totalResults']/100) if 'totalResults' in response.keys() else 0
+        self.first_page = response if response is not None and response.get('status') == 'ok' else None
+        response = self.first_page if self.first_page is not None else {}
         self.total_results = response['totalResults'] if 'totalResults' in response.keys() else 0
+        self.pages = math.ceil(self.total_results/self.page_size)
         logger.info(f'Pagination set: {self.pages} pages, Total results: {self.total_results}')
     
-    def process_article(self,article, **kwargs):
+    def process_article(self,article, batch : ArticleBatch):
         """
-        Processes an individual article and appends relevant information to the lists contained
-        in the kwargs dictionary. Raises a ValueError if one or more required lists are missing.
+        Processes an individual article and appends its link, description, title and publication date to
+        the batch, unless it is rejected by `self.admission` or it was already collected (by any source).
 
         Args:
             article (dict): The article data obtained from the API.
-            **kwargs: A dictionary containing lists to store article information:
-                - 'links' (list): List to store article URLs.
-                - 'dates' (list): List to store article publication dates.
-                - 'titles' (list): List to store article titles.
-                - 'descriptions' (list): List to store article descriptions.
+            batch (ArticleBatch): The batch collecting the articles, with 'links', 'dates', 'titles' and
+                'descriptions' columns.
                 
         Raises:
-            ValueError: If one or more required lists are missing from kwargs.
+            ValueError: If one or more required columns are missing from the batch.
         """
         expected_keys = {'links', 'dates', 'titles', 'descriptions'}
-        if not expected_keys.issubset(kwargs.keys()):
-            logger.error("Missing one or more required lists in kwargs.")
-            raise ValueError("Missing one or more required lists in kwargs")
+        if not expected_keys.issubset(batch.columns):
+            logger.error("Missing one or more required columns in the batch.")
+            raise ValueError("Missing one or more required columns in the batch")
         
-        if article['url'] not in kwargs['links'] and article['url'] not in self.URLS:
-            self.URLS.append(article['url'])
-            kwargs['links'].append(article['url'])
-            kwargs['descriptions'].append(article['description'])
-            kwargs['titles'].append(article['title'])
-            published_date = datetime.strptime(article['publishedAt'], '%Y-%m-%dT%H:%M:%SZ')
-            kwargs['dates'].append(published_date.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        published_date = datetime.strptime(article['publishedAt'], '%Y-%m-%dT%H:%M:%SZ').strftime('%Y-%m-%dT%H:%M:%SZ')
+        if self._admit(article['url'], article['title'], published_date) and self._claim(article['url']):
+            batch.append(links=article['url'], descriptions=article['description'], titles=article['title'],
+                         dates=published_date)
+
+    def _fetch_page(self, page : int) -> dict :
+        """Requests a page of results, returning None when it could not be obtained."""
+        try:
+            response = self._get(self._url + f'&page={page}')
+        except Exception as e:
+            logger.warning(f'Failed to fetch page {page}: {e}')
+            return None
+        return response if response is not None and response.get('status') == 'ok' else None
+
+    def _is_past_window(self, json_data : dict) -> bool :
+        """Tells whether a page (sorted by publication date) reaches articles older than `start_date`."""
+        if self.start_date is None or len(json_data['articles']) == 0:
+            return False
+        oldest = min(article['publishedAt'] for article in json_data['articles'])
+        return oldest[:10] < self.start_date
 
     def fetch_articles(self) -> None:
         """
-        Fetches and processes articles from the API across multiple pages.
+        Fetches and processes articles from the API across multiple pages, into a new batch.
 
-        Uses pagination to collect all articles matching the search parameters. Updates the lists
-        of links, dates, titles, and descriptions with the processed data.
+        The first page comes from `set_params`. The other ones are requested concurrently, by batches of
+        `max_concurrent_pages`, and no more than the daily quota allows. Pagination stops as soon as a page
+        fails, the quota is exhausted or the articles get older than `start_date`. The links, dates, titles
+        and descriptions of the articles are appended to the batch in page order.
 
         Returns:
             None
         """
         
         sources = set()
-        kwargs = {
-            "dates" : [],
-            "titles" : [],
-            "descriptions" : [],
-            "links" : []
-        }
+        batch = ArticleBatch(columns=('dates', 'titles', 'descriptions', 'links'))
 
         self.set_params()
+        pages = [self.first_page] if self.first_page is not None else []
+
+        next_page = 2
+        last_page = min(self.pages, 1 + self.quota.remaining)
+        stop = len(pages) == 0 or self._is_past_window(pages[0])
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_pages) as executor:
+            while not stop and next_page <= last_page:
+                page_batch = range(next_page, min(next_page + self.max_concurrent_pages, last_page + 1))
+                for json_data in executor.map(self._fetch_page, page_batch):
+                    if json_data is None:
+                        stop = True
+                        break
+                    pages.append(json_data)
+                    if self._is_past_window(json_data):
+                        stop = True
+                next_page = page_batch.stop
+        if self.pages > len(pages):
+            logger.info(f'{len(pages)} pages fetched out of {self.pages}, {self.quota.remaining} requests left today')
         
-        for page in range(self.pages):
-            url = self._url + f"page={page +1}"
-            json_data = requests.get(url).json()
-            
+        for json_data in pages:
             for article in json_data['articles'] :
                 sources.add(article['source']['name'])
-                self.process_article(article=article, **kwargs)
+                self.process_article(article=article, batch=batch)
                 
-        self.articles = kwargs
+        self.articles = batch
         self.sources = list(sources)
         print("search ended !")
             
-    def scrapping(self, **kwargs):
+    def scrapping(self, batch : ArticleBatch):
         """
         Downloads and extracts text content from the article links.
 
+        Pages found in `self.html_cache` are not downloaded again. The other ones are downloaded concurrently
+        by `self.downloader`, with per-host limits, timeouts and hedged requests, and parsed by the processes
+        of `self.parse_pool` as soon as they arrive. The description of an article is used as its
+        text when the page could not be downloaded or parsed.
+
         Args:
-            **kwargs: A dictionary containing lists to store article information:
-                -links (list): List of article URLs.
-                -dates (list): List of article publication dates.
-                -times (list): List of article publication times.
-                -descriptions (list): List of article descriptions.
-                -titles (list): List of article titles.
+            batch (ArticleBatch): The articles returned by `fetch_articles`. Its 'texts' column is set and
+                its 'descriptions' column removed.
 
         Returns:
-            dict: A dictionary containing the articles with their extracted text.
+            None
         """
-        
-        article = Article("//")
-        texts = []
-        for i, link in enumerate(tqdm(kwargs["links"])):
-
-            text =''
-            try :
-                response = requests.get(link)
-
-                if response.status_code ==200 :
-
-                    article.download(input_html=response.content)
-                    article.parse()
-                    text = article.text
-
-            except Exception as e :
-                text = kwargs["descriptions"][i]
-                logger.warning(f'Failed to download article from {link}')
-                
-            if text == '' :
-                text = kwargs["descriptions"][i]
-                
-            texts.append(text)
-        
-        self.articles['texts']  = texts
-        del self.articles["descriptions"]
+        self._download_texts(batch)
 
     def news_collection(self):
         """
@@ -290,7 +437,7 @@ class NewsApiScraper(Scraper) :
             None
         """
         self.fetch_articles()
-        self.scrapping(**self.articles)
+        self.scrapping(self.articles)
         super(NewsApiScraper, self).news_collection(self.articles)
         logger.info("News collection completed.")
         
\ No newline at end of file
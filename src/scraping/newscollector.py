@@ -1,55 +1,342 @@
 from newsapiscraper import *
 from googlescraper import *
+from publisherscraper import *
 from typing import Union
 
+import os
+import time
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import create_logger
+from checkpoint import CollectionCheckpoint
+from dedup import ArticleDeduplicator
+from queryplan import QueryPlanner
+from boilerplate import BoilerplateLearner
+
+logger = create_logger(__name__, 'news_collector.log')
+
+
 class NewsCollector:
     """
     A class to collect news articles using specified scrapers.
+
+    Several scrapers (e.g. a `GoogleScraper`, a `NewsApiScraper` and a `PublisherScraper`) can be given to fuse
+    their sources in a single run: each of them collects the work units of the configuration, the sources running
+    concurrently, and their results are merged in the order of the scrapers. Since the scrapers share
+    `Scraper.seen_urls`, keyed by the canonical URL of the publisher articles, an article surfaced by several
+    sources is downloaded and parsed once, by the first source claiming it, instead of being deduplicated after
+    all of them were fetched.
+
+    Each (country, lang, query) combination of the configuration is a work unit. Units are either
+    processed serially with the given scraper (`max_workers = 1`) or sharded across a bounded pool of
+    worker threads, each worker owning its own clone of the scraper. `GoogleScraper` clones share the
+    browser pool of the original scraper, so the number of running browsers stays bounded by its size.
+    In both modes the results are merged in configuration order, so the output does not depend on the
+    order in which units finish.
+
+    With a `checkpoint_dir`, every completed unit is written to disk as soon as it is done. If the run fails,
+    running the collector again with the same scraper and date window skips the completed units and only
+    collects the remaining ones. The checkpoint is removed once a run completes.
+
+    Before they are returned, the merged articles go through an `ArticleDeduplicator` in configuration order:
+    the tracking, mobile and AMP variants of an URL and the near duplicate texts (syndicated copies) are dropped,
+    so they are not translated, embedded and sent to the RAG. Sharing one deduplicator between the collectors
+    of a recipe also drops the duplicates across scrapers.
+
+    With `combine_queries`, the queries of a (country, lang) are searched at once, combined with OR (see
+    `QueryPlanner`), when the search engine of the scraper supports it: a language costs one feed request (or
+    one paginated API search) instead of one per query, and the overlapping results are fetched once. The
+    'cat' of each article is then the query it matches, found in its title or text.
+
+    When `Scraper.retry_queue` is set, the articles that failed to download and are due for a retry (from this
+    run or a previous one) are retried once every work unit is done, and the recovered ones are merged too.
+
+    With a `boilerplate` learner, the lines and sentences a domain repeats across its articles (cookie banners,
+    newsletter prompts, "read also" blocks) are stripped from the texts of the deduplicated articles, and the
+    characters saved per domain are logged.
+
+    Attributes
+    ----------
+        scrapers (list[Union[GoogleScraper, NewsApiScraper, PublisherScraper]]) : The scrapers used (and cloned by
+            the workers) to collect the news, one per source.
+        scraper (Union[GoogleScraper, NewsApiScraper, PublisherScraper]) : The first of `scrapers`.
+        news_config (dict) : The `country_lang` part of the final configuration.
+        path_to_save (str, optional) : Path of the CSV file where the collected news are saved.
+        limit (int) : Articles whose text is longer than this number of characters are discarded.
+        max_workers (int) : Number of workers collecting the work units of a source concurrently.
+        timings (list[dict]) : Per work unit report (source, country, lang, query, seconds, articles) of the last run.
+        checkpoint_dir (str, optional) : Directory where completed work units are saved to resume a failed run. With
+            several scrapers, each of them has its own subdirectory.
+        deduplicator (ArticleDeduplicator, optional) : Drops the duplicate articles. A new one is used by each
+            run when it is None.
+        planners (list[QueryPlanner]) : For each scraper, the planner combining the queries of a language into OR
+            searches, or None when its queries are searched one by one.
+        boilerplate (BoilerplateLearner, optional) : Strips the boilerplate of every domain from the texts.
     """
 
-    def __init__(self, scraper: Union[GoogleScraper, NewsApiScraper], config :dict, path_to_save = None):
-        """Initialises the NewsCollector."""
-        self.scraper = scraper
+    def __init__(self, scraper: Union[GoogleScraper, NewsApiScraper, PublisherScraper, list], config :dict, path_to_save = None, max_workers : int = 1,
+                 checkpoint_dir : str = None, deduplicator : ArticleDeduplicator = None, combine_queries : bool = False,
+                 boilerplate : BoilerplateLearner = None):
+        """Initialises the NewsCollector. `scraper` is a scraper or a list of scrapers, one per source."""
+        if not isinstance(max_workers, int) or max_workers < 1:
+            raise ValueError("max_workers must be a positive integer")
+        self.scrapers = list(scraper) if isinstance(scraper, (list, tuple)) else [scraper]
+        if len(self.scrapers) == 0:
+            raise ValueError("At least one scraper is required")
+        self.scraper = self.scrapers[0]
         self.news_config = config
         self.path_to_save = path_to_save
         self.limit : int =30720
+        self.max_workers = max_workers
+        self.timings : list[dict] = []
+        self.checkpoint_dir = checkpoint_dir
+        self.deduplicator = deduplicator
+        self._checkpoints : list[CollectionCheckpoint] = [None] * len(self.scrapers)
+        self.boilerplate = boilerplate
+        self.planners : list[QueryPlanner] = []
+        for item in self.scrapers:
+            planner = None
+            if combine_queries and item.or_query_length is not None:
+                planner = QueryPlanner(max_length=item.or_query_length)
+            elif combine_queries:
+                logger.warning(f"{type(item).__name__} does not support OR queries, the queries are searched one by one")
+            self.planners.append(planner)
+
+    def work_units(self, source : int = 0) -> list[tuple[str, str, str]]:
+        """
+        Lists the (country, lang, query) work units of the configuration, in configuration order. With a
+        planner, the query of a unit is an OR-combined query.
+
+        Args:
+            source (int): Index of the scraper in `scrapers`, whose planner combines the queries. Defaults to 0.
+
+        Returns:
+            list[tuple[str, str, str]]: The work units.
+        """
+        planner = self.planners[source]
+        if planner is not None:
+            return [(item['country'], item['lang'], query)
+                    for item in self.news_config for query in planner.plan(item['queries'])]
+        return [(item['country'], item['lang'], query) for item in self.news_config for query in item['queries']]
+
+    def _filter(self, data_: ArticleBatch) -> ArticleBatch:
+        """Drops the articles without a title or a text, or whose text is over the limit, in place."""
+        if data_ is not None and len(data_) != 0:
+            texts = data_['texts']
+            # Missing texts (None) get a length over the limit so that they are dropped
+            lengths = np.fromiter((len(text) if isinstance(text, str) else self.limit for text in texts),
+                                  dtype=np.int64, count=len(texts))
+            data_.take((data_['titles'] != '') & (texts != '') & (lengths < self.limit))
+        return data_
+
+    def _collect_unit(self, source: int, scraper: Union[GoogleScraper, NewsApiScraper, PublisherScraper], country: str, lang: str, query: str):
+        """
+        Collects and cleans the news of a single work unit of a source with the given scraper (the scraper of
+        the source or one of its clones).
+
+        Returns:
+            ArticleBatch: The collected news, or None if nothing usable was collected.
+        """
+        start = time.perf_counter()
+        scraper.country = country
+        scraper.lang = lang
+        scraper.query = query
+        scraper.news_collection()
+        print(scraper.country, scraper.lang, scraper.query)
+        data_ = scraper.articles
+
+        if data_ is not None and len(data_) != 0:
+            self._filter(data_)
+            if self.planners[source] is not None:
+                data_.set_column('cat', self.planners[source].attribute(query, data_['titles'], data_['texts']))
+            print(f" data_.shape :{ (len(data_), len(data_.columns))}")
 
+        elapsed = time.perf_counter() - start
+        nb_articles = 0 if data_ is None else len(data_)
+        name = type(scraper).__name__
+        self.timings.append({'source': name, 'country': country, 'lang': lang, 'query': query,
+                             'seconds': round(elapsed, 3), 'articles': nb_articles})
+        logger.info(f"Work unit ({name}, {country}, {lang}, {query}) collected {nb_articles} articles in {elapsed:.2f}s")
+
+        if data_ is None or len(data_) == 0:
+            data_ = None
+        if self._checkpoints[source] is not None:
+            self._checkpoints[source].save((country, lang, query), data_.to_dataframe() if data_ is not None else None)
+        return data_
+
+    def _collect_serial(self, source: int, units: list[tuple[str, str, str]]) -> list:
+        """Collects the work units of a source one after the other with its scraper."""
+        return [self._collect_unit(source, self.scrapers[source], *unit) for unit in tqdm(units)]
+
+    def _collect_parallel(self, source: int, units: list[tuple[str, str, str]]) -> list:
+        """
+        Collects the work units of a source with a pool of `self.max_workers` threads.
+
+        Every thread lazily clones the scraper of the source the first time it runs a unit and keeps that
+        clone for the rest of the run. The clones are released once all the units are done.
+        """
+        local = threading.local()
+        workers = []
+        workers_lock = threading.Lock()
+
+        def run(unit):
+            if not hasattr(local, 'scraper'):
+                local.scraper = self.scrapers[source].clone()
+                with workers_lock:
+                    workers.append(local.scraper)
+            return self._collect_unit(source, local.scraper, *unit)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = list(tqdm(executor.map(run, units), total=len(units)))
+        finally:
+            for scraper in workers:
+                if isinstance(scraper, GoogleScraper):
+                    scraper.kill_driver()
+        return results
+
+    def timings_report(self) -> pd.DataFrame:
+        """
+        Returns the per work unit timings of the last run, slowest first.
+
+        Returns:
+            pd.DataFrame: One row per work unit with its source (scraper class), country, lang, query, duration in
+            seconds and number of articles.
+        """
+        report = pd.DataFrame(self.timings, columns=['source', 'country', 'lang', 'query', 'seconds', 'articles'])
+        return report.sort_values('seconds', ascending=False, ignore_index=True)
+
+    def _collect_source(self, source: int) -> list:
+        """
+        Collects the work units of a source, resuming them from its checkpoint.
+
+        Returns:
+            list: The ArticleBatch (or None) of every work unit of the source, in configuration order.
+        """
+        scraper = self.scrapers[source]
+        units = self.work_units(source)
+        if self.checkpoint_dir is not None:
+            directory = self.checkpoint_dir
+            if len(self.scrapers) > 1:
+                directory = os.path.join(directory, f"{source}_{type(scraper).__name__}")
+            run_id = f"{type(scraper).__name__}:{scraper.start_date}:{scraper.end_date}"
+            self._checkpoints[source] = CollectionCheckpoint(directory, run_id)
+        checkpoint = self._checkpoints[source]
+        pending = [unit for unit in units if checkpoint is None or not checkpoint.is_done(unit)]
+        if len(pending) != len(units):
+            logger.info(f"{type(scraper).__name__}: {len(units) - len(pending)} work units restored from the checkpoint, "
+                        f"{len(pending)} left")
+
+        if self.max_workers > 1 and len(pending) > 1:
+            collected = self._collect_parallel(source, pending)
+        else:
+            collected = self._collect_serial(source, pending)
+
+        collected = dict(zip(pending, collected))
+        results = []
+        for unit in units:
+            if unit in collected:
+                results.append(collected[unit])
+            else:
+                restored = checkpoint.load(unit)
+                results.append(ArticleBatch.from_dataframe(restored) if restored is not None else None)
+        return results
+
+    def _retry_failures(self) -> list:
+        """Retries the due failures of `Scraper.retry_queue` with every kind of scraper, once each."""
+        retried_batches = []
+        retried_types = set()
+        for source, scraper in enumerate(self.scrapers):
+            if type(scraper) in retried_types:
+                continue
+            retried_types.add(type(scraper))
+            retried = self._filter(scraper.retry_failures())
+            if retried is not None and len(retried) != 0:
+                planner = self.planners[source]
+                if planner is not None:
+                    retried.set_column('cat', [planner.attribute(query, [title], [text])[0] for query, title, text
+                                               in zip(retried['cat'], retried['titles'], retried['texts'])])
+                retried_batches.append(retried)
+        return retried_batches
+
+    def _log_reports(self) -> None:
+        """Logs the reports of the scrapers and of the resources they share, and releases their browsers."""
+        if Scraper.html_cache is not None:
+            logger.info(f"HTML cache: {Scraper.html_cache.report()}")
+        # Clones share the admission filter of their scraper, and scrapers may share one too
+        for admission in {id(scraper.admission): scraper.admission for scraper in self.scrapers}.values():
+            logger.info(f"Admission: {admission.report()}")
+        for scraper in self.scrapers:
+            name = type(scraper).__name__
+            if isinstance(scraper, (NewsApiScraper, PublisherScraper)):
+                logger.info(f"{name} article downloads: {scraper.downloader.report()}")
+            if isinstance(scraper, PublisherScraper):
+                logger.info(f"Publisher feeds: {scraper.feed_client.report()}")
+            if isinstance(scraper, GoogleScraper):
+                scraper.kill_driver()
+                logger.info(f"Page waits: {scraper.page_waiter.report()}")
+                logger.info(f"Google News feeds: {scraper.gn.feed_client.report()}")
+                scraper.page_waiter.save()
+                if scraper.link_resolver is not None:
+                    logger.info(f"Google News links: {scraper.link_resolver.report()}")
 
     def collect_news(self):
-        """Collects news articles based on the provided configuration."""
-        
+        """Collects news articles based on the provided configuration, with every scraper."""
+
+        self.timings = []
+        start = time.perf_counter()
+        for scraper in self.scrapers:
+            if isinstance(scraper, GoogleScraper):
+                scraper.page_waiter.reset()
+        # Texts are cut at a sentence end while they are extracted, instead of being dropped for their length
+        max_chars = Scraper.parse_pool.max_chars
+        Scraper.parse_pool.max_chars = self.limit - 1 if max_chars is None else min(max_chars, self.limit - 1)
+
+        try:
+            if len(self.scrapers) == 1:
+                per_source = [self._collect_source(0)]
+            else:
+                # The sources run concurrently; the first one reaching an article claims it in Scraper.seen_urls
+                with ThreadPoolExecutor(max_workers=len(self.scrapers)) as executor:
+                    per_source = list(executor.map(self._collect_source, range(len(self.scrapers))))
+            results = [data_ for source_results in per_source for data_ in source_results]
+            if Scraper.retry_queue is not None:
+                # The failures of this run and of the previous ones that are due by now, once every unit is done
+                results.extend(self._retry_failures())
+                logger.info(f"Retry queue: {Scraper.retry_queue.report()}")
+        finally:
+            # The pool is shared by every scraper of the process: the next collectors get their own limit
+            Scraper.parse_pool.max_chars = max_chars
+        results = [data_ for data_ in results if data_ is not None]
+
         dataframe = None
-       
-        for item in tqdm(self.news_config):
-            # print(item)
-            self.scraper.country = item['country']
-            self.scraper.lang = item['lang']
-            for query in item['queries']:
-                
-                self.scraper.query =  query
-                self.scraper.news_collection()
-                print(self.scraper.country, self.scraper.lang, self.scraper.query)
-                data_ = self.scraper.articles_dataframe
-
-                data_ = data_.loc[data_['titles'] !='',:] if data_ is not None and len(data_) !=0  else None
-
-                data_ = data_.loc[data_['texts'] !='',:] if data_ is not None and  len(data_) !=0 else None
-                data_ = data_.loc[data_['texts'].str.len() < self.limit, :] if data_ is not None and  len(data_) !=0 else None
-                if data_ is not None :
-                    print(f" data_.shape :{ data_.shape}")
-
-                if data_ is None or len(data_) == 0:
-                    continue
-                    
-                dataframe = pd.concat([dataframe, data_], axis=0)
-          
-        if dataframe is not None :
-            dataframe.reset_index(inplace=True, drop=True)
+        if len(results) != 0:
+            # The batches are merged and turned into a DataFrame only once, at the end of the run
+            batch = ArticleBatch.concat(results)
+            # Distinct Google News links can lead to the same publisher article, and publishers syndicate articles
+            deduplicator = self.deduplicator if self.deduplicator is not None else ArticleDeduplicator()
+            batch.take(deduplicator.keep_mask(batch['links'], batch['texts']))
+            logger.info(f"Duplicates: {deduplicator.report()}")
+            if self.boilerplate is not None:
+                batch.set_column('texts', self.boilerplate.clean(batch['links'], batch['texts']))
+                self.boilerplate.save()
+                logger.info(f"Boilerplate: {self.boilerplate.report()}")
+                logger.info(f"Boilerplate savings per domain:\n{self.boilerplate.savings_report().head(20).to_string()}")
+            dataframe = batch.to_dataframe()
         self.data = dataframe
-        
-        if isinstance(self.scraper, GoogleScraper):
-            self.scraper.kill_driver()
-            
+        logger.info(f"{sum(len(source_results) for source_results in per_source)} work units of {len(self.scrapers)} source(s) collected with "
+                    f"{self.max_workers} worker(s) each in {time.perf_counter() - start:.2f}s")
+
+        Scraper.seen_urls.flush()
+        Scraper.parse_pool.close()
+        self._log_reports()
+
         if self.path_to_save :
             dataframe.to_csv(self.path_to_save, index= False)
-        return self.data
\ No newline at end of file
+        for source, checkpoint in enumerate(self._checkpoints):
+            if checkpoint is not None:
+                checkpoint.clear()
+                self._checkpoints[source] = None
+        return self.data
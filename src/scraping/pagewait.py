@@ -0,0 +1,232 @@
+import sys
+sys.path.append("../src/utils")
+
+import os
+import json
+import threading
+import time
+from urllib.parse import urlparse
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, NoSuchElementException
+
+from utils import create_logger
+
+logger = create_logger(__name__, 'page_wait.log')
+
+
+class PageWaiter:
+    """
+    Waits for a page loaded in a WebDriver to be ready instead of sleeping for a fixed time.
+
+    A page is considered ready once the Google News redirect has landed on the publisher site, the document
+    is loaded and the length of the body text is stable between two polls. Each publisher domain gets its
+    own timeout budget, starting at the fixed sleep it replaces and learned from the waits on that domain:
+    a wait running out of budget raises it by `margin`, up to `max_budget`, and every wait that finished in
+    time lowers it by `decay` towards `margin` times that wait, down to `min_budget`. A slow page thus does
+    not keep its domain slow, and the budget never goes much beyond the old fixed sleep.
+
+    Attributes
+    ----------
+        baseline (float) : The fixed sleep (in seconds) this waiter replaces, used to report the time saved.
+        poll_interval (float) : Time between two checks of the page state.
+        min_budget (float) : Lowest timeout budget a domain can get.
+        max_budget (float) : Highest timeout budget a domain can get.
+        margin (float) : Factor applied to a wait of a domain to get its budget, and to the budget of a domain
+            when a wait runs out of it.
+        decay (float) : Factor applied to the budget of a domain after a wait that finished in time.
+        path (str, optional) : JSON file where the learned budgets are loaded from and saved to.
+
+    Methods
+    -------
+        budget(domain: str) -> float:
+            Returns the current timeout budget of a domain.
+        wait(driver) -> float:
+            Waits for the page loaded in the driver to be ready and returns the time waited.
+        wait_for_consent(driver, selector: str, timeout: float = 1) -> None:
+            Waits for the consent button to be clickable and clicks it.
+        report() -> dict:
+            Returns the number of pages, time waited, time saved and timeouts since the last reset.
+        reset() -> None:
+            Resets the counters of the report, keeping the learned budgets.
+        save() -> None:
+            Saves the learned budgets to `path`.
+    """
+
+    GOOGLE_NEWS_HOST = 'news.google.com'
+
+    def __init__(self, baseline: float = 2, poll_interval: float = 0.1, min_budget: float = 0.5,
+                 max_budget: float = 3, margin: float = 1.5, decay: float = 0.8, path: str = None):
+        """
+        Initializes the PageWaiter, loading the learned budgets from `path` if it exists.
+
+        Args:
+            baseline (float): The fixed sleep this waiter replaces. Defaults to 2.
+            poll_interval (float): Time between two checks of the page state. Defaults to 0.1.
+            min_budget (float): Lowest timeout budget of a domain. Defaults to 0.5.
+            max_budget (float): Highest timeout budget of a domain. Defaults to 3.
+            margin (float): Factor applied to a wait, or to the budget after a timeout. Defaults to 1.5.
+            decay (float): Factor applied to the budget after a wait that finished in time. Defaults to 0.8.
+            path (str, optional): JSON file used to persist the learned budgets across runs.
+
+        Raises:
+            ValueError: If the budgets are not ordered or `decay` is not between 0 and 1.
+        """
+        if min_budget <= 0 or max_budget < min_budget:
+            raise ValueError("Budgets must satisfy 0 < min_budget <= max_budget")
+        if not 0 < decay < 1:
+            raise ValueError("decay must be between 0 and 1")
+        self.baseline = baseline
+        self.poll_interval = poll_interval
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+        self.margin = margin
+        self.decay = decay
+        self.path = path
+        self._budgets = {}
+        self._lock = threading.Lock()
+        self.reset()
+        if path is not None and os.path.exists(path):
+            with open(path, 'r') as file:
+                for domain, budget in json.load(file).items():
+                    if isinstance(budget, (int, float)):
+                        self._budgets[domain] = self._clamp(budget)
+
+    def reset(self) -> None:
+        """Resets the counters of the report, keeping the learned budgets."""
+        with self._lock:
+            self.__pages = 0
+            self.__waited = 0.0
+            self.__saved = 0.0
+            self.__timeouts = 0
+
+    def _clamp(self, budget: float) -> float:
+        """Returns a budget bounded by `min_budget` and `max_budget`."""
+        return min(self.max_budget, max(self.min_budget, budget))
+
+    def budget(self, domain: str) -> float:
+        """
+        Returns the current timeout budget of a domain.
+
+        Args:
+            domain (str): The publisher domain.
+
+        Returns:
+            float: The budget in seconds, `baseline` for a domain never seen before.
+        """
+        with self._lock:
+            return self._budgets.get(domain, self._clamp(self.baseline))
+
+    def _record(self, domain: str, elapsed: float, timed_out: bool, baseline: float) -> None:
+        """Updates the budget of the domain after a wait and records the wait in the report counters."""
+        with self._lock:
+            budget = self._budgets.get(domain, self._clamp(self.baseline))
+            if timed_out:
+                budget = budget * self.margin
+            else:
+                # Fast waits bring the budget down step by step, a slower one raises it at once
+                budget = max(budget * self.decay, elapsed * self.margin)
+            self._budgets[domain] = self._clamp(budget)
+            self.__pages += 1
+            self.__waited += elapsed
+            self.__saved += baseline - elapsed
+            self.__timeouts += int(timed_out)
+
+    def _poll(self, condition, deadline: float) -> bool:
+        """Polls a condition until it holds or the deadline is reached."""
+        while True:
+            if condition():
+                return True
+            if time.perf_counter() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+
+    @staticmethod
+    def _domain(url: str) -> str:
+        """Returns the host of an URL without its 'www.' prefix."""
+        host = urlparse(url).netloc.lower()
+        return host[4:] if host.startswith('www.') else host
+
+    def wait(self, driver) -> float:
+        """
+        Waits for the page loaded in the driver to be ready.
+
+        The page is ready when the driver has left news.google.com, `document.readyState` is 'complete'
+        and the length of the body text did not change between two consecutive polls. The wait gives up
+        once the budget of the publisher domain is spent, the page is then extracted as it is.
+
+        Args:
+            driver: The WebDriver in which the article was requested.
+
+        Returns:
+            float: The time waited in seconds.
+        """
+        start = time.perf_counter()
+
+        redirected = self._poll(lambda: self._domain(driver.current_url) != self.GOOGLE_NEWS_HOST,
+                                start + self.max_budget)
+        domain = self._domain(driver.current_url)
+        deadline = start + self.budget(domain)
+
+        loaded = redirected and self._poll(
+            lambda: driver.execute_script("return document.readyState") == 'complete', deadline)
+
+        last_length = [-1]
+        def body_is_stable():
+            length = driver.execute_script("return document.body ? document.body.innerText.length : 0")
+            stable = length > 0 and length == last_length[0]
+            last_length[0] = length
+            return stable
+
+        stable = loaded and self._poll(body_is_stable, deadline)
+
+        elapsed = time.perf_counter() - start
+        self._record(domain, elapsed, timed_out=not stable, baseline=self.baseline)
+        return elapsed
+
+    def wait_for_consent(self, driver, selector: str, timeout: float = 1) -> None:
+        """
+        Waits for the consent button to be clickable and clicks it.
+
+        Args:
+            driver: The WebDriver showing the consent form.
+            selector (str): CSS selector of the button accepting the cookies.
+            timeout (float): Maximum time to wait for the button. Defaults to 1, the fixed sleep it replaces.
+
+        Raises:
+            NoSuchElementException: If the button did not show up before the timeout.
+        """
+        start = time.perf_counter()
+        try:
+            button = WebDriverWait(driver, timeout, poll_frequency=self.poll_interval).until(
+                EC.element_to_be_clickable((By.CSS_SELECTOR, selector)))
+        except TimeoutException:
+            raise NoSuchElementException(f"No consent button matching {selector}")
+        finally:
+            with self._lock:
+                self.__saved += timeout - (time.perf_counter() - start)
+        button.click()
+
+    def report(self) -> dict:
+        """
+        Returns the state of the waits since the last reset.
+
+        Returns:
+            dict: The number of pages waited for, the total time waited, the time saved compared to
+            the fixed sleeps and the number of waits that ran out of budget.
+        """
+        with self._lock:
+            return {'pages': self.__pages, 'waited_seconds': round(self.__waited, 2),
+                    'saved_seconds': round(self.__saved, 2), 'timeouts': self.__timeouts}
+
+    def save(self) -> None:
+        """Saves the learned budgets to `path`, if any."""
+        if self.path is None:
+            return
+        with self._lock:
+            data = dict(self._budgets)
+        with open(self.path, 'w') as file:
+            json.dump(data, file)
+        logger.info(f"Learned wait budgets of {len(data)} domains saved to {self.path}")
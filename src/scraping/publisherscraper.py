@@ -0,0 +1,366 @@
+import sys
+sys.path.append("../src/pygooglenews")
+sys.path.append("../src/utils")
+
+from scraper import *
+
+import io
+import re
+import time
+import html
+from datetime import timezone
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+from lxml import etree
+
+from pygooglenews import FeedClient, parse_feed
+from utils import create_logger
+from downloader import AsyncDownloader
+from admission import AdmissionFilter, TitleScorer
+from queryplan import phrase_pattern
+
+logger = create_logger(__name__, 'publisher_scrapper.log')
+
+TAG = re.compile(r'<[^>]+>')
+
+
+def parse_sitemap(content) -> dict:
+    """
+    Parses a sitemap, or a sitemap index, in a single streaming pass.
+
+    Args:
+        content (str or bytes): The XML of the sitemap.
+
+    Returns:
+        dict: The 'entries' of a (news) sitemap, each with its 'link', 'title', 'published' date and 'keywords'
+        (empty when the sitemap is not a news sitemap), and the 'sitemaps' listed by a sitemap index, each
+        with its 'link' and 'lastmod' date.
+    """
+    encoding = None
+    if isinstance(content, str):
+        # A decoded sitemap is re-encoded in utf-8; raw bytes are decoded by lxml from their XML declaration
+        content, encoding = content.encode('utf-8'), 'utf-8'
+    entries, sitemaps = [], []
+    for _, element in etree.iterparse(io.BytesIO(content), events=('end',), encoding=encoding, recover=True,
+                                      remove_comments=True, resolve_entities=False):
+        if not isinstance(element.tag, str):
+            continue
+        name = etree.QName(element).localname
+        if name not in ('url', 'sitemap'):
+            continue
+        fields = {}
+        for child in element.iter():
+            if child is not element and isinstance(child.tag, str):
+                fields.setdefault(etree.QName(child).localname, (child.text or '').strip())
+        if name == 'url' and fields.get('loc'):
+            entries.append({'link': fields['loc'], 'title': fields.get('title', ''),
+                            'published': fields.get('publication_date') or fields.get('lastmod'),
+                            'keywords': fields.get('keywords', '')})
+        elif name == 'sitemap' and fields.get('loc'):
+            sitemaps.append({'link': fields['loc'], 'lastmod': fields.get('lastmod')})
+        element.clear()
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
+    return {'entries': entries, 'sitemaps': sitemaps}
+
+
+def utc_date(value: str) -> str:
+    """
+    Converts a W3C date of a sitemap ('2024-05-01', '2024-05-01T10:00:00+02:00', ...) to UTC.
+
+    Args:
+        value (str): The date.
+
+    Returns:
+        str: The date in format 'YYYY-MM-DDTHH:MM:SSZ', or None if it cannot be parsed.
+    """
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class PublisherScraper(Scraper) :
+    """
+    A scraper ingesting the RSS feeds and news sitemaps of publishers directly, without Google News nor a browser.
+
+    The sources of the current (country, lang) are fetched concurrently through a `FeedClient`: a pooled
+    keep-alive session, conditional GETs (If-None-Match / If-Modified-Since) and a cache of `ttl` seconds, so
+    the sources are fetched once for all the queries of a language. Feeds and sitemaps are told apart by their
+    content, and the recent child sitemaps of a sitemap index are followed. The entries are then filtered
+    locally: an entry is kept when the query (or one of the terms of an OR-combined query) is found in its title,
+    description or news keywords, ignoring case and accents, and when `admission` admits it. The article pages
+    are downloaded by an `AsyncDownloader` and parsed by the shared `parse_pool`; the description of an article
+    is its text when its page could not be downloaded.
+
+    Attributes
+    ----------
+        publishers (list[dict]) : The sources, each with its 'country', 'lang' and the 'urls' of its feeds and sitemaps.
+        sources (list[str]) : Domains of the entries found by the last search.
+        query (str, optional) : The query the entries must match. Every entry of the sources is kept when None.
+        start_date (str, optional) : The start date for the news articles (format 'YYYY-MM-DD').
+        end_date (str, optional) : The end date for the news articles (format 'YYYY-MM-DD').
+        feed_client (FeedClient) : Fetches the feeds and sitemaps with conditional GETs over a pooled session.
+        max_sitemaps (int) : Number of child sitemaps followed per sitemap index, the most recent first.
+        max_concurrent_feeds (int) : Number of sources fetched at the same time.
+        downloader (AsyncDownloader) : Downloads the article pages concurrently.
+        admission (AdmissionFilter) : Decides which entries are downloaded (date window, blocked domains, title score).
+        or_query_length (int) : Maximum length of an OR-combined query. The terms are matched locally, so it
+            only bounds the size of the work units.
+        max_sitemap_depth (int) : Number of levels of sitemap indexes followed below a source.
+
+    Methods
+    -------
+        source_urls() -> list[str]:
+            Returns the feeds and sitemaps of the current country and language.
+        search() -> list[dict]:
+            Fetches the sources and returns their entries.
+        matches(title: str, description: str) -> bool:
+            Tells whether an entry matches the query.
+        fetch_articles() -> None:
+            Keeps the entries matching the query in a new batch.
+        scrapping(batch: ArticleBatch) -> None:
+            Downloads and extracts the text of the articles.
+        news_collection() -> None:
+            Collects, processes and optionally saves the news articles.
+    """
+    or_query_length : int = 2000
+    max_sitemap_depth : int = 2
+
+    def __init__(self, publishers : list[dict], country : str = 'FR', lang : str = 'fr', query : str = None,
+                 save_path : str = None, start_date : str = None,
+                 end_date : str = date.today().strftime('%Y-%m-%d'), ecart : int = 1, timeout : float = 10,
+                 feed_client : FeedClient = None, max_sitemaps : int = 3, max_concurrent_feeds : int = 8,
+                 downloader : AsyncDownloader = None, admission : AdmissionFilter = None) -> None:
+        """
+        Initializes the PublisherScraper.
+
+        Args:
+            publishers (list[dict]): The sources, e.g. [{'country': 'FR', 'lang': 'fr', 'urls':
+                ['https://www.lemonde.fr/rss/une.xml', 'https://www.lemonde.fr/sitemap_news.xml']}].
+            country (str): Country code of the sources searched. Defaults to 'FR'.
+            lang (str): Language code of the sources searched. Defaults to 'fr'.
+            query (str, optional): The query the entries must match.
+            save_path (str, optional): Path to save collected news articles.
+            start_date (str, optional): Start date for the news articles (format 'YYYY-MM-DD').
+            end_date (str, optional): End date for the news articles (format 'YYYY-MM-DD').
+            ecart (int): Number of days to subtract from the end date to determine the start date if not provided.
+            timeout (float): Timeout duration for HTTP requests. Defaults to 10.
+            feed_client (FeedClient, optional): Fetches the sources. Defaults to a new one, whose cached sources
+                are revalidated after 15 minutes.
+            max_sitemaps (int): Number of child sitemaps followed per sitemap index. Defaults to 3.
+            max_concurrent_feeds (int): Number of sources fetched at the same time. Defaults to 8.
+            downloader (AsyncDownloader, optional): Downloader of the article pages. Defaults to a new one whose
+                read timeout is `timeout`.
+            admission (AdmissionFilter, optional): Filter of the articles to download. Defaults to one rejecting
+                the articles outside the date window.
+
+        Raises:
+            ValueError: If a source has no 'country', 'lang' or 'urls'.
+        """
+        super(PublisherScraper, self).__init__(save_path = save_path, end_date = end_date, ecart = ecart,
+                        start_date = start_date, query = query, timeout = timeout,
+                        country = country, lang = lang, admission = admission)
+        for source in publishers:
+            if not {'country', 'lang', 'urls'}.issubset(source):
+                raise ValueError("Every source must have a 'country', a 'lang' and 'urls'")
+        self.publishers = publishers
+        self._patterns : tuple = (None, [])
+        self.feed_client = feed_client if feed_client is not None else FeedClient(timeout=timeout, pool_size=max_concurrent_feeds)
+        self.max_sitemaps = max_sitemaps
+        self.max_concurrent_feeds = max_concurrent_feeds
+        self.downloader = downloader if downloader is not None else AsyncDownloader(read_timeout=timeout)
+
+    def clone(self) -> "PublisherScraper":
+        """
+        Creates a new PublisherScraper with the same sources and search parameters, sharing this scraper's feed
+        client, downloader and admission filter.
+
+        Returns:
+            PublisherScraper: The cloned scraper.
+        """
+        return PublisherScraper(publishers=self.publishers, country=self._country, lang=self._lang, query=self._query,
+                                start_date=self.start_date, end_date=self.end_date, ecart=self.ecart,
+                                timeout=self._timeout, feed_client=self.feed_client, max_sitemaps=self.max_sitemaps,
+                                max_concurrent_feeds=self.max_concurrent_feeds, downloader=self.downloader,
+                                admission=self.admission)
+
+    def source_urls(self) -> list[str]:
+        """
+        Returns the feeds and sitemaps of the current country and language.
+
+        Returns:
+            list[str]: The URLs, in the order of `publishers`.
+        """
+        urls = [url for source in self.publishers
+                if source['country'].upper() == self._country and source['lang'].lower() == self._lang
+                for url in source['urls']]
+        return list(dict.fromkeys(urls))
+
+    def _fetch_source(self, url : str, visited : set = None, depth : int = 0) -> list[dict]:
+        """
+        Fetches a feed or a sitemap and returns its entries, each with its 'link', 'title', 'published' date
+        (format 'YYYY-MM-DDTHH:MM:SSZ'), 'description' and news 'keywords' (sitemaps have keywords and no
+        description, feeds a description and no keywords). The recent child sitemaps of an index are followed,
+        down to `max_sitemap_depth` levels and once each, so indexes listing each other do not loop.
+
+        The raw bytes of the source are parsed, so lxml decodes them from their XML declaration instead of
+        relying on the charset of the response, often missing for XML. Sources not served (error status) are
+        skipped.
+        """
+        visited = visited if visited is not None else set()
+        visited.add(url)
+        try:
+            content, _ = self.feed_client.get_content(url)
+        except Exception as e:
+            logger.warning(f"Failed to fetch {url}: {e}")
+            return []
+
+        head = content[:2048]
+        if b'<rss' in head or b'<channel' in head:
+            entries = []
+            for entry in parse_feed(content)['entries']:
+                published = entry.get('published_parsed')
+                summary = entry.get('summary') or ''
+                entries.append({'link': entry.get('link'), 'title': entry.get('title', ''),
+                                'published': time.strftime('%Y-%m-%dT%H:%M:%SZ', published) if published else None,
+                                'description': html.unescape(TAG.sub(' ', summary)).strip(), 'keywords': ''})
+            return entries
+
+        sitemap = parse_sitemap(content)
+        entries = [{'link': entry['link'], 'title': entry['title'], 'published': utc_date(entry['published']),
+                    'description': '', 'keywords': entry['keywords']} for entry in sitemap['entries']]
+        # Index of sitemaps: only the ones modified within the window, the most recent first
+        children = [child for child in sitemap['sitemaps']
+                    if not child['lastmod'] or self.start_date is None or child['lastmod'][:10] >= self.start_date]
+        children.sort(key=lambda child: child['lastmod'] or '', reverse=True)
+        if children and depth >= self.max_sitemap_depth:
+            logger.warning(f"{url} lists sitemaps deeper than {self.max_sitemap_depth} levels, they are not followed")
+            return entries
+        for child in children[:self.max_sitemaps]:
+            if child['link'] not in visited:
+                entries += self._fetch_source(child['link'], visited, depth + 1)
+        return entries
+
+    def search(self) -> list[dict] :
+        """
+        Fetches the feeds and sitemaps of the current country and language concurrently.
+
+        Returns:
+            list[dict]: Their entries, each with its 'link', 'title', 'published' date, 'description' and
+            'keywords'.
+        """
+        urls = self.source_urls()
+        if len(urls) == 0:
+            logger.warning(f"No publisher source for ({self._country}, {self._lang})")
+            return []
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_feeds) as executor:
+            return [entry for entries in executor.map(self._fetch_source, urls) for entry in entries]
+
+    def _query_patterns(self) -> list:
+        """Returns the patterns of the terms of the query: the query itself, or the terms of an OR-combined query."""
+        if self._patterns[0] != self._query:
+            if self._query is None:
+                terms = []
+            elif ' OR ' not in self._query:
+                terms = [self._query]
+            else:
+                terms = [quoted or word for quoted, word in re.findall(r'"([^"]+)"|(\S+)', self._query) if word != 'OR']
+            self._patterns = (self._query, [phrase_pattern(term) for term in terms])
+        return self._patterns[1]
+
+    def matches(self, title : str, description : str, keywords : str = '') -> bool :
+        """
+        Tells whether an entry matches the query.
+
+        Args:
+            title (str): The title of the entry.
+            description (str): Its description.
+            keywords (str, optional): Its news keywords. Defaults to ''.
+
+        Returns:
+            bool: True if a term of the query starts a word of the title, description or keywords, ignoring case
+            and accents, or if there is no query.
+        """
+        patterns = self._query_patterns()
+        if len(patterns) == 0:
+            return True
+        text = ' '.join(TitleScorer.normalize(f"{title or ''} {description or ''} {keywords or ''}"))
+        return any(pattern.search(text) for pattern in patterns)
+
+    def process_article(self, article : dict, batch : ArticleBatch):
+        """
+        Appends an entry to the batch if it matches the query, is admitted by `self.admission` and it was not
+        already collected (by any source).
+
+        Args:
+            article (dict): The entry, with its 'link', 'title', 'published' date, 'description' and 'keywords'.
+            batch (ArticleBatch): The batch collecting the articles, with 'links', 'dates', 'titles' and
+                'descriptions' columns.
+
+        Raises:
+            ValueError: If one or more required columns are missing from the batch.
+        """
+        expected_keys = {'links', 'dates', 'titles', 'descriptions'}
+        if not expected_keys.issubset(batch.columns):
+            logger.error("Missing one or more required columns in the batch.")
+            raise ValueError("Missing one or more required columns in the batch")
+
+        if not article['link']:
+            return
+        if not self.matches(article['title'], article['description'], article.get('keywords')):
+            return
+        if self._admit(article['link'], article['title'], article['published']) and self._claim(article['link']):
+            batch.append(links=article['link'], titles=article['title'], dates=article['published'],
+                         descriptions=article['description'])
+
+    def fetch_articles(self) -> None:
+        """
+        Keeps the entries of the sources matching the query in a new batch.
+
+        Returns:
+            None
+        """
+        batch = ArticleBatch(columns=('dates', 'titles', 'descriptions', 'links'))
+        entries = self.search()
+        for entry in entries:
+            self.process_article(article=entry, batch=batch)
+        logger.info(f"{len(batch)} entries out of {len(entries)} kept for ({self._country}, {self._lang}, {self._query})")
+        self.articles = batch
+        self.sources = sorted({urlsplit(entry['link']).netloc for entry in entries if entry['link']})
+        logger.info("search ended !")
+
+    def scrapping(self, batch : ArticleBatch):
+        """
+        Downloads and extracts text content from the article links (see `Scraper._download_texts`). Sitemap
+        entries have no description, so the articles whose page could not be downloaded or parsed get an empty
+        text.
+
+        Args:
+            batch (ArticleBatch): The articles returned by `fetch_articles`. Its 'texts' column is set and
+                its 'descriptions' column removed.
+
+        Returns:
+            None
+        """
+        self._download_texts(batch)
+
+    def news_collection(self):
+        """
+        Collects news articles, processes them, and optionally saves them.
+
+        Returns:
+            None
+        """
+        self.fetch_articles()
+        self.scrapping(self.articles)
+        super(PublisherScraper, self).news_collection(self.articles)
+        logger.info("News collection completed.")
@@ -0,0 +1,152 @@
+import sys
+sys.path.append("../src/utils")
+
+import re
+
+from utils import create_logger
+from admission import TitleScorer
+
+logger = create_logger(__name__, 'queryplan.log')
+
+
+def phrase_pattern(query: str) -> re.Pattern:
+    """
+    Returns the pattern finding a query in a text normalized by `TitleScorer.normalize`, e.g. 'piquet de grève' in
+    'un piquet de greves'.
+
+    Args:
+        query (str): The query.
+
+    Returns:
+        re.Pattern: The pattern of the normalized words of the query, at the start of a word (anywhere for the
+        scripts written without spaces).
+    """
+    words = TitleScorer.normalize(query)
+    phrase = re.escape(' '.join(words))
+    return re.compile(phrase if words and words[0][0] >= '⺀' else r'(?<!\w)' + phrase)
+
+
+class QueryPlanner:
+    """
+    Combines the translated queries of a (country, lang) into OR searches, and attributes each collected article
+    back to the query it matches.
+
+    The queries of a language ('grève', 'piquet de grève', ...) return heavily overlapping results, so searching
+    them one by one costs a feed request (or API page) per query for mostly the same articles. The planner
+    groups them into `"grève" OR "piquet de grève"` searches no longer than `max_length` characters, so a
+    language usually needs a single search.
+
+    Since the search no longer tells which query an article answers, the 'cat' of an article is found locally:
+    the most specific query (with the most words, then first in configuration order) found in its title, then in
+    its text, starting a word and ignoring case and accents ('grève' matches 'Grèves'). Engines also match
+    inflections and synonyms, so an article matching none of them goes to the query sharing the most words with
+    it, and to the first query of its search when there is no such query.
+
+    Attributes
+    ----------
+        max_length (int) : Maximum number of characters of a combined query.
+
+    Methods
+    -------
+        plan(queries: list[str]) -> list[str]:
+            Returns the combined queries covering a list of queries.
+        queries_of(query: str) -> list[str]:
+            Returns the queries a combined query was made of.
+        attribute(query: str, titles, texts) -> list[str]:
+            Returns the query each article of a combined search matches.
+    """
+
+    def __init__(self, max_length: int = 400):
+        """
+        Initializes the planner.
+
+        Args:
+            max_length (int): Maximum number of characters of a combined query. Queries longer than that are
+                searched alone. Defaults to 400.
+
+        Raises:
+            ValueError: If `max_length` is not a positive integer.
+        """
+        if not isinstance(max_length, int) or max_length < 1:
+            raise ValueError("max_length must be a positive integer")
+        self.max_length = max_length
+        self._groups = {}
+
+    @staticmethod
+    def _term(query: str) -> str:
+        """Returns a query as a term of an OR search, quoted when it has several words."""
+        query = ' '.join(query.replace('"', ' ').split())
+        return f'"{query}"' if ' ' in query else query
+
+    def plan(self, queries: list[str]) -> list[str]:
+        """
+        Returns the combined queries covering a list of queries, in order.
+
+        Args:
+            queries (list[str]): The queries of a (country, lang).
+
+        Returns:
+            list[str]: The searches to run. A group made of a single query is that query, unchanged.
+        """
+        groups, group = [], []
+        for query in dict.fromkeys(queries):
+            terms = [self._term(item) for item in group + [query]]
+            if group and len(' OR '.join(terms)) > self.max_length:
+                groups.append(group)
+                group = []
+            group.append(query)
+        if group:
+            groups.append(group)
+
+        searches = []
+        for group in groups:
+            search = group[0] if len(group) == 1 else ' OR '.join(self._term(query) for query in group)
+            self._groups[search] = group
+            searches.append(search)
+        if len(searches) < len(queries):
+            logger.info(f"{len(queries)} queries combined into {len(searches)} searches")
+        return searches
+
+    def queries_of(self, query: str) -> list[str]:
+        """
+        Returns the queries a combined query was made of.
+
+        Args:
+            query (str): A search returned by `plan`.
+
+        Returns:
+            list[str]: The queries of the search, or the search itself if it was not planned here.
+        """
+        return self._groups.get(query, [query])
+
+    def attribute(self, query: str, titles, texts) -> list[str]:
+        """
+        Returns the query each article collected by a search matches, for its 'cat' column.
+
+        Args:
+            query (str): A search returned by `plan`.
+            titles: The titles of the articles.
+            texts: The texts of the articles, in the same order.
+
+        Returns:
+            list[str]: The matched query of each article.
+        """
+        queries = self.queries_of(query)
+        if len(queries) == 1:
+            return [queries[0]] * len(titles)
+        words = [TitleScorer.normalize(item) for item in queries]
+        patterns = [phrase_pattern(item) for item in queries]
+        # The most specific queries are looked for first: 'piquet de grève' rather than 'grève'
+        order = sorted(range(len(queries)), key=lambda i: -len(words[i]))
+
+        attributed = []
+        for title, text in zip(titles, texts):
+            fields = [' '.join(TitleScorer.normalize(field)) if isinstance(field, str) else '' for field in (title, text)]
+            match = next((queries[i] for field in fields for i in order if patterns[i].search(field)), None)
+            if match is None:
+                found = set(fields[0].split()) | set(fields[1].split())
+                overlaps = [sum(word in found for word in item) / max(1, len(item)) for item in words]
+                best = max(range(len(queries)), key=lambda i: (overlaps[i], -i))
+                match = queries[best]
+            attributed.append(match)
+        return attributed
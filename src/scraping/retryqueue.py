@@ -0,0 +1,224 @@
+import sys
+sys.path.append("../src/utils")
+
+import time
+import random
+import sqlite3
+import threading
+
+import pandas as pd
+
+from utils import create_logger
+
+logger = create_logger(__name__, 'retry_queue.log')
+
+COLUMNS = ('link', 'scraper', 'country', 'lang', 'query', 'title', 'published', 'kind', 'error', 'attempts',
+           'first_failed_at', 'last_failed_at', 'next_attempt_at', 'status')
+
+
+class RetryQueue:
+    """
+    A persistent queue of the article fetches that failed, retried later with exponential backoff.
+
+    Every failure is recorded with the metadata needed to collect the article again (scraper, country, lang,
+    query, title, publication date) and its cause: its `kind` ('timeout' or 'download') and error
+    message. A failed article is due again `base_delay` seconds after its first failure, then after twice as
+    long after each new failure (with a random jitter, capped at `max_delay`), so it can be retried at the end
+    of the same run or by a later run, off the critical path of the collection. It is abandoned after
+    `max_attempts` failures. Records are kept in an SQLite file, and records older than `max_age_days` are
+    expired when the queue is opened.
+
+    Attributes
+    ----------
+        path (str) : SQLite file of the queue. ':memory:' keeps the queue for the process only.
+        max_attempts (int) : Number of failures after which an article is abandoned.
+        base_delay (float) : Delay before the first retry, in seconds.
+        max_delay (float) : Maximum delay between two attempts, in seconds.
+        max_age_days (float) : Age after which a record is forgotten.
+
+    Methods
+    -------
+        record_failure(link: str, kind: str, error: str, **metadata) -> None:
+            Records a failed fetch and schedules its retry.
+        record_success(link: str) -> None:
+            Marks a queued article as recovered.
+        abandon(link: str, kind: str, error: str) -> None:
+            Gives up on a queued article that cannot be recovered by a retry.
+        due(scraper: str = None, limit: int = None) -> list[dict]:
+            Returns the articles due for a retry.
+        failures() -> pd.DataFrame:
+            Returns every record of the queue.
+        report() -> dict:
+            Returns the number of records per status and of failures per kind.
+        expire() -> int:
+            Forgets the records older than `max_age_days`.
+        close() -> None:
+            Closes the queue.
+    """
+
+    def __init__(self, path: str = ':memory:', max_attempts: int = 4, base_delay: float = 60.0,
+                 max_delay: float = 6 * 3600, max_age_days: float = 3):
+        """
+        Opens (or creates) the queue and expires its old records.
+
+        Args:
+            path (str): SQLite file of the queue. Defaults to ':memory:'.
+            max_attempts (int): Number of failures after which an article is abandoned. Defaults to 4.
+            base_delay (float): Delay before the first retry, in seconds. Defaults to 60.
+            max_delay (float): Maximum delay between two attempts, in seconds. Defaults to 6 hours.
+            max_age_days (float): Age after which a record is forgotten. Defaults to 3.
+
+        Raises:
+            ValueError: If `max_attempts` is not a positive integer.
+        """
+        if not isinstance(max_attempts, int) or max_attempts < 1:
+            raise ValueError("max_attempts must be a positive integer")
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS failures (link TEXT PRIMARY KEY, scraper TEXT, country TEXT, "
+                         "lang TEXT, query TEXT, title TEXT, published TEXT, kind TEXT, error TEXT, "
+                         "attempts INTEGER NOT NULL, first_failed_at REAL NOT NULL, last_failed_at REAL NOT NULL, "
+                         "next_attempt_at REAL NOT NULL, status TEXT NOT NULL)")
+        self._db.commit()
+        self.expire()
+
+    def _delay(self, attempts: int) -> float:
+        """Returns the delay before the next attempt of an article that failed `attempts` times."""
+        return min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+    def record_failure(self, link: str, kind: str, error: str, scraper: str = None, country: str = None,
+                       lang: str = None, query: str = None, title: str = None, published: str = None) -> None:
+        """
+        Records a failed fetch and schedules its retry. The metadata of an article already queued is kept.
+
+        Args:
+            link (str): The link of the article, as given to the scraper.
+            kind (str): The kind of failure: 'timeout' or 'download'.
+            error (str): The error message.
+            scraper (str, optional): Name of the scraper class that failed, which retries it.
+            country (str, optional): Country of the work unit.
+            lang (str, optional): Language of the work unit.
+            query (str, optional): Query of the work unit.
+            title (str, optional): Title of the article.
+            published (str, optional): Publication date of the article (format 'YYYY-MM-DDTHH:MM:SSZ').
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT attempts FROM failures WHERE link = ?", (link,)).fetchone()
+            attempts = 1 if row is None else row[0] + 1
+            status = 'abandoned' if attempts >= self.max_attempts else 'pending'
+            next_attempt_at = now + self._delay(attempts)
+            if row is None:
+                self._db.execute("INSERT INTO failures VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (link, scraper, country, lang, query, title, published, kind, str(error)[:500],
+                                  attempts, now, now, next_attempt_at, status))
+            else:
+                self._db.execute("UPDATE failures SET kind = ?, error = ?, attempts = ?, last_failed_at = ?, "
+                                 "next_attempt_at = ?, status = ? WHERE link = ?",
+                                 (kind, str(error)[:500], attempts, now, next_attempt_at, status, link))
+            self._db.commit()
+        if status == 'abandoned':
+            logger.warning(f"{link} abandoned after {attempts} failures, the last one: {kind} {error}")
+
+    def record_success(self, link: str) -> None:
+        """
+        Marks a queued article as recovered.
+
+        Args:
+            link (str): The link of the article.
+        """
+        with self._lock:
+            self._db.execute("UPDATE failures SET status = 'recovered' WHERE link = ?", (link,))
+            self._db.commit()
+
+    def abandon(self, link: str, kind: str, error: str) -> None:
+        """
+        Gives up on a queued article that a new attempt would not recover, e.g. whose page cannot be parsed.
+        Nothing happens if the article is not queued.
+
+        Args:
+            link (str): The link of the article.
+            kind (str): The kind of failure, e.g. 'parse'.
+            error (str): The error message.
+        """
+        with self._lock:
+            self._db.execute("UPDATE failures SET status = 'abandoned', kind = ?, error = ?, last_failed_at = ? "
+                             "WHERE link = ? AND status = 'pending'", (kind, str(error)[:500], time.time(), link))
+            self._db.commit()
+
+    def due(self, scraper: str = None, limit: int = None) -> list[dict]:
+        """
+        Returns the articles due for a retry, the oldest failures first.
+
+        Args:
+            scraper (str, optional): Only the articles of this scraper class.
+            limit (int, optional): Maximum number of articles.
+
+        Returns:
+            list[dict]: The records of the articles, with the keys of `COLUMNS`.
+        """
+        sql = "SELECT * FROM failures WHERE status = 'pending' AND next_attempt_at <= ?"
+        params = [time.time()]
+        if scraper is not None:
+            sql += " AND scraper = ?"
+            params.append(scraper)
+        sql += " ORDER BY first_failed_at"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [dict(zip(COLUMNS, row)) for row in self._db.execute(sql, params)]
+
+    def failures(self) -> pd.DataFrame:
+        """
+        Returns every record of the queue.
+
+        Returns:
+            pd.DataFrame: One row per article, with the columns of `COLUMNS`.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM failures ORDER BY first_failed_at").fetchall()
+        return pd.DataFrame(rows, columns=list(COLUMNS))
+
+    def report(self) -> dict:
+        """
+        Returns the state of the queue.
+
+        Returns:
+            dict: The number of records per status ('pending', 'recovered', 'abandoned'), of pending records due
+            now, and of records per kind of failure.
+        """
+        with self._lock:
+            statuses = dict(self._db.execute("SELECT status, COUNT(*) FROM failures GROUP BY status"))
+            kinds = dict(self._db.execute("SELECT kind, COUNT(*) FROM failures GROUP BY kind"))
+            due = self._db.execute("SELECT COUNT(*) FROM failures WHERE status = 'pending' AND next_attempt_at <= ?",
+                                   (time.time(),)).fetchone()[0]
+        report = {status: statuses.get(status, 0) for status in ('pending', 'recovered', 'abandoned')}
+        report['due'] = due
+        report['kinds'] = kinds
+        return report
+
+    def expire(self) -> int:
+        """
+        Forgets the records whose first failure is older than `max_age_days`.
+
+        Returns:
+            int: The number of records removed.
+        """
+        with self._lock:
+            removed = self._db.execute("DELETE FROM failures WHERE first_failed_at < ?",
+                                       (time.time() - self.max_age_days * 86400,)).rowcount
+            self._db.commit()
+        if removed:
+            logger.info(f"{removed} failure records expired")
+        return removed
+
+    def close(self) -> None:
+        """Closes the SQLite connection."""
+        with self._lock:
+            self._db.close()
@@ -8,6 +8,15 @@ import logging
 
 import pandas as pd
 from pandas import DataFrame
+from tqdm import tqdm
+
+from seenstore import SeenUrlStore
+from htmlcache import HtmlCache
+from articlebatch import ArticleBatch
+from extraction import ParsePool
+from admission import AdmissionFilter
+from retryqueue import RetryQueue
+from dedup import canonical_url
 
 
 
@@ -16,16 +25,45 @@ from pandas import DataFrame
 class Scraper(ABC):
     """
     After the data collection, the dataframe gathering the collected data can be cleaned. But this cleaning empty some dataframe that contain chinese of japanese data.
+
+    `seen_urls` is shared by every scraper: an article whose URL is already in it is skipped before being downloaded.
+    Publisher URLs are claimed there in their canonical form (see `dedup.canonical_url`), so an article surfaced by
+    several sources, or through its AMP, mobile or tracking variants, is downloaded and parsed once.
+    It only lives in memory by default; assign a persistent store to skip the articles of previous runs too, e.g.
+    `Scraper.seen_urls = SeenUrlStore(path='seen_urls.db', max_age_days=30)`.
+
+    `html_cache` is also shared by every scraper. When set, e.g. `Scraper.html_cache = HtmlCache('html_cache')`,
+    article pages are looked up there before being downloaded, so reruns replay them from disk.
+
+    `parse_pool` is the pool of processes, shared by every scraper, parsing the downloaded pages while the next
+    ones are being downloaded. Assign `ParsePool(processes=0)` to parse the pages inline instead, or
+    `ParsePool(engine='lxml')` (or `domain_engines={...}`) to use the fast lxml extractor instead of newspaper3k.
+
+    `admission` decides from the feed or API metadata of an article whether it is worth downloading: by default
+    the articles published outside `start_date`/`end_date` are skipped; an `AdmissionFilter` can also skip
+    blocklisted domains and irrelevant titles. Clones share the filter of their scraper.
+
+    `or_query_length` is the maximum length of a query combining several queries with OR, e.g.
+    `"grève" OR "piquet de grève"`, or None when the search engine does not support OR queries. `NewsCollector`
+    uses it to search all the queries of a language at once.
+
+    `retry_queue` is shared by every scraper too. When set, e.g. `Scraper.retry_queue = RetryQueue('retries.db')`,
+    the articles whose page could not be downloaded or parsed are recorded there with the cause of the failure,
+    and retried with exponential backoff at the end of the run or by a later run (see `retry_failures`).
     """
-    URLS =[]
+    seen_urls : SeenUrlStore = SeenUrlStore()
+    html_cache : HtmlCache = None
+    parse_pool : ParsePool = ParsePool()
+    or_query_length : int = None
+    retry_queue : RetryQueue = None
     def __init__(self, country : str, lang : str, query=None, save_path: str = None,
                  end_date : str = date.today().strftime('%Y-%m-%d'),
                  ecart : int =1, start_date : str = None, timeout :float = 5,
+                 admission : AdmissionFilter = None,
                 ):
         self.save_path = save_path
         self.news_are_collected :bool = False
-        self.articles_dataframe : pd.DataFrame = None
-        self.articles_json : dict = None
+        self.articles : ArticleBatch = None
         self.end_date = end_date
         self.ecart = ecart
         self.start_date = start_date if start_date is not None else (datetime.strptime(end_date, '%Y-%m-%d').date() - timedelta(days=self.ecart)).strftime('%Y-%m-%d')
@@ -36,7 +74,93 @@ class Scraper(ABC):
         self._country = country
         self._lang = lang
         self._timeout = timeout
-        
+        self.admission = admission if admission is not None else AdmissionFilter()
+
+    def _admit(self, link : str, title : str, published : str) -> bool :
+        """Tells whether an article is worth downloading, according to `self.admission`, before recording it."""
+        return self.admission.admit(link, title, published, start_date=self.start_date, end_date=self.end_date,
+                                    lang=self._lang)
+
+    def _claim(self, url : str) -> bool :
+        """Claims a publisher article in `self.seen_urls`. Returns False if it was already claimed."""
+        return self.seen_urls.add_if_new(canonical_url(url))
+
+    def _release(self, url : str) -> None :
+        """Releases the claim on a publisher article that could not be collected, so another source can collect it."""
+        self.seen_urls.discard(canonical_url(url))
+
+    def _defer(self, link : str, title : str, published : str, kind : str, error) -> None :
+        """Records a failed article in `self.retry_queue`, with the work unit it belongs to."""
+        self.retry_queue.record_failure(link, kind, error, scraper=type(self).__name__, country=self._country,
+                                        lang=self._lang, query=self._query, title=title, published=published)
+
+    def retry_failures(self, limit : int = None) -> ArticleBatch :
+        """
+        Retries the articles of `self.retry_queue` that failed with this kind of scraper and are due.
+
+        Args:
+            limit (int, optional): Maximum number of articles retried.
+
+        Returns:
+            ArticleBatch: The recovered articles, or None. Scrapers that do not lose the articles they fail to
+            download (the API scrapers fall back on their description) have nothing to retry.
+        """
+        return None
+
+    def _download_texts(self, batch : ArticleBatch) -> None :
+        """
+        Downloads and parses the pages of the articles of a batch, falling back on their description.
+
+        Pages found in `self.html_cache` are not downloaded again. The other ones are downloaded concurrently
+        by `self.downloader` and parsed by the processes of `self.parse_pool` as soon as they arrive. The
+        description of an article is used as its text when its page could not be downloaded or parsed.
+
+        Args:
+            batch (ArticleBatch): The articles, with 'links' and 'descriptions' columns. Its 'texts' column is
+                set and its 'descriptions' column removed.
+        """
+        links = batch['links']
+        futures = [None] * len(links)
+        to_download = []
+        for i, link in enumerate(links):
+            cached = self.html_cache.get(link) if self.html_cache is not None else None
+            if cached is not None :
+                futures[i] = self.parse_pool.submit(cached[0], cached[1])
+            else :
+                to_download.append(i)
+
+        progress = tqdm(total=len(to_download))
+        def on_result(index, response):
+            # Parsed by the parse pool while the other pages are still downloading
+            i = to_download[index]
+            # Non-HTML responses come back empty and fall back on the description
+            if response is not None and response['status'] == 200 and response['content'] :
+                futures[i] = self.parse_pool.submit(response['content'], response['final_url'])
+                # A page cut at `max_bytes` is not cached, so a later run with a larger cap downloads it whole
+                if self.html_cache is not None and not response['truncated'] :
+                    html = response['content'].decode(response['encoding'] or 'utf-8', errors='replace')
+                    self.html_cache.put(links[i], html, response['final_url'])
+            else :
+                logging.warning(f'Failed to download article from {links[i]}')
+            progress.update(1)
+
+        self.downloader.download([links[i] for i in to_download], on_result=on_result)
+        progress.close()
+
+        texts = []
+        descriptions = batch['descriptions']
+        for i, future in enumerate(futures):
+            text = ''
+            if future is not None :
+                try :
+                    text = future.result()
+                except Exception as e :
+                    logging.warning(f"Failed to parse article from {links[i]}: {e}")
+            texts.append(text if text != '' else descriptions[i])
+
+        batch.set_column('texts', texts)
+        batch.drop_column('descriptions')
+
     @property
     def country(self):
         """
@@ -120,6 +244,26 @@ class Scraper(ABC):
             raise ValueError('timeout should be none negative')
         self._timemout = timeout
 
+    @property
+    def articles_dataframe(self) -> pd.DataFrame:
+        """
+        Gets the collected articles as a DataFrame, built on demand from `self.articles`.
+
+        Returns:
+            pd.DataFrame: The collected articles, or None if they are not collected yet.
+        """
+        return self.articles.to_dataframe() if self.news_are_collected else None
+
+    @property
+    def articles_json(self) -> str:
+        """
+        Gets the JSON representation (list of records) of the collected articles.
+
+        Returns:
+            str: The collected articles, or None if they are not collected yet.
+        """
+        return self.articles_dataframe.to_json(orient='records') if self.news_are_collected else None
+
     @property
     def query(self):
         """
@@ -189,6 +333,18 @@ class Scraper(ABC):
         print(json.dumps(data, indent=4, sort_keys=False))
     
     
+    def clone(self):
+        """
+        Creates a fresh scraper of the same type sharing this scraper's search parameters.
+
+        Used by `NewsCollector` so that every worker of a parallel collection owns its
+        own scraper (and, for `GoogleScraper`, its own browser).
+
+        Raises:
+            NotImplementedError: If the subclass does not support cloning.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support cloning")
+
     @abstractmethod
     def search(self):
         pass
@@ -205,26 +361,27 @@ class Scraper(ABC):
     def scrapping(self, *params):
         pass
     
-    def news_collection(self, news):
+    def news_collection(self, news : ArticleBatch):
         """
-        This method collects news articles from multiple sources.
-        If the articles have not been collected yet, it builds the news sources and then either downloads and processes the articles in parallel (if `self.multi_threading` is True) or sequentially (if `self.multi_threading` is False).
-        After the articles have been processed, they are stored in a DataFrame `self.articles` and the flag `self.news_are_collected` is set to True.
+        This method records the articles collected by a scraper.
+        The articles are kept in the `ArticleBatch` `self.articles`, completed with the 'lang' and 'cat' columns, and the
+        flag `self.news_are_collected` is set to True. No DataFrame is built here: `self.articles_dataframe`
+        materialises one on demand.
         If a save path `self.save_path` is provided, the articles are also saved to a CSV file at that location.
 
+        Args:
+            news (ArticleBatch): The collected articles.
+
         Note:
-            This method logs the start and end of the building, downloading, processing, and saving processes. Make sure to set up logging before calling this method.
+            This method logs the saving process. Make sure to set up logging before calling this method.
         """
         
-        self.articles_dataframe = pd.DataFrame(news)
+        self.articles = news
+        self.articles.fill('lang', self._lang)
+        self.articles.fill('cat', self._query)
         
         print("News collection ended ! ")
         self.news_are_collected = True 
         if self.save_path is not None :
             self.save_news(self.save_path)
             logging.info(f'Saved articles to {self.save_path}')
-        if self.articles_dataframe is not None :
-            self.articles_json = self.articles_dataframe.to_json(orient='records')
-            self.articles_dataframe['lang'] = self._lang
-            self.articles_dataframe['cat']= self._query
-            
@@ -0,0 +1,215 @@
+import sys
+sys.path.append("../src/utils")
+
+import math
+import time
+import sqlite3
+import hashlib
+import threading
+
+from utils import create_logger
+
+logger = create_logger(__name__, 'seen_store.log')
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter over 64-bit URL hashes.
+
+    Attributes
+    ----------
+        capacity (int) : Number of items the filter is sized for.
+        error_rate (float) : False positive rate expected at full capacity.
+        nb_bits (int) : Size of the bit array.
+        nb_hashes (int) : Number of bit positions set per item.
+    """
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001):
+        """
+        Initializes an empty filter sized for `capacity` items at the given false positive rate.
+
+        Args:
+            capacity (int): Number of items the filter is sized for. Defaults to 1 000 000.
+            error_rate (float): False positive rate expected at full capacity. Defaults to 0.001.
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.nb_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.nb_hashes = max(1, round(self.nb_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.nb_bits + 7) // 8)
+
+    def _positions(self, key: int):
+        """Yields the bit positions of a key, by double hashing."""
+        h1 = key & 0xFFFFFFFF
+        h2 = (key >> 32) & 0xFFFFFFFF | 1
+        for i in range(self.nb_hashes):
+            yield (h1 + i * h2) % self.nb_bits
+
+    def add(self, key: int) -> None:
+        """Adds a key to the filter."""
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: int) -> bool:
+        """Tells whether the key may have been added (False means it surely was not)."""
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class SeenUrlStore:
+    """
+    A persistent set of the URLs already collected, shared by every scraper.
+
+    URLs are stored as 64-bit hashes with the time they were first seen, in an SQLite file, so that articles
+    processed in a previous run are skipped before being downloaded again. Entries older than `max_age_days`
+    are expired when the store is opened. Lookups are O(1): by default every hash is kept in memory; with
+    `bloom = True` only a compact Bloom filter is kept in memory and the SQLite table is queried for the
+    (rare) URLs the filter cannot rule out.
+
+    Attributes
+    ----------
+        path (str) : SQLite file of the store. ':memory:' keeps the store for the process only.
+        max_age_days (float) : Age after which an URL is forgotten and can be collected again.
+        bloom (bool) : Whether to keep a Bloom filter in memory instead of the exact set.
+
+    Methods
+    -------
+        add_if_new(url: str) -> bool:
+            Atomically adds an URL and tells whether it was new.
+        discard(url: str) -> None:
+            Forgets an URL, e.g. an article that could not be downloaded and should be retried.
+        expire() -> int:
+            Forgets the URLs older than `max_age_days` and returns how many were removed.
+        flush() -> None:
+            Writes the pending additions to disk.
+        close() -> None:
+            Flushes and closes the store.
+    """
+
+    def __init__(self, path: str = ':memory:', max_age_days: float = 30, bloom: bool = False,
+                 capacity: int = 1_000_000, error_rate: float = 0.001, flush_every: int = None):
+        """
+        Opens (or creates) the store and expires its old entries.
+
+        Args:
+            path (str): SQLite file of the store. Defaults to ':memory:'.
+            max_age_days (float): Age after which an URL is forgotten. Defaults to 30.
+            bloom (bool): Keep a Bloom filter in memory instead of the exact set. Defaults to False.
+            capacity (int): Number of URLs the Bloom filter is sized for. Defaults to 1 000 000.
+            error_rate (float): False positive rate of the Bloom filter. Defaults to 0.001.
+            flush_every (int, optional): Number of additions after which they are written to disk. Defaults to None:
+                additions are only written by `flush`, at the end of a successful collection, so that a crashed
+                run does not make its rerun skip the articles it did not save.
+        """
+        self.path = path
+        self.max_age_days = max_age_days
+        self.bloom = bloom
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS seen (url_hash INTEGER PRIMARY KEY, seen_at REAL NOT NULL)")
+        self._db.commit()
+        self.expire()
+
+        rows = self._db.execute("SELECT url_hash FROM seen")
+        if bloom:
+            self._filter = BloomFilter(capacity=capacity, error_rate=error_rate)
+            for (key,) in rows:
+                self._filter.add(key)
+        else:
+            self._hashes = {key for (key,) in rows}
+        logger.info(f"Seen URL store opened from {path} with {len(self)} URLs")
+
+    @staticmethod
+    def _hash(url: str) -> int:
+        """Returns the signed 64-bit hash of an URL."""
+        return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+    def _contains(self, key: int) -> bool:
+        """Tells whether a hash is in the store. The caller holds the lock."""
+        if not self.bloom:
+            return key in self._hashes
+        if key not in self._filter:
+            return False
+        return self._db.execute("SELECT 1 FROM seen WHERE url_hash = ?", (key,)).fetchone() is not None
+
+    def __contains__(self, url: str) -> bool:
+        """Tells whether an URL has already been seen."""
+        with self._lock:
+            return self._contains(self._hash(url))
+
+    def __len__(self) -> int:
+        """Returns the number of URLs in the store."""
+        if not self.bloom:
+            return len(self._hashes)
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def add_if_new(self, url: str) -> bool:
+        """
+        Atomically adds an URL to the store and tells whether it was new.
+
+        Args:
+            url (str): The URL of an article.
+
+        Returns:
+            bool: True if the URL had never been seen (and is now recorded), False otherwise.
+        """
+        key = self._hash(url)
+        with self._lock:
+            if self._contains(key):
+                return False
+            if self.bloom:
+                self._filter.add(key)
+            else:
+                self._hashes.add(key)
+            self._db.execute("INSERT OR IGNORE INTO seen VALUES (?, ?)", (key, time.time()))
+            self._pending += 1
+            if self.flush_every is not None and self._pending >= self.flush_every:
+                self._db.commit()
+                self._pending = 0
+        return True
+
+    def discard(self, url: str) -> None:
+        """
+        Forgets an URL, e.g. an article that could not be downloaded and should be retried later.
+
+        Args:
+            url (str): The URL to forget.
+        """
+        key = self._hash(url)
+        with self._lock:
+            if not self.bloom:
+                self._hashes.discard(key)
+            # A Bloom filter cannot forget: the exact table settles the false positive
+            self._db.execute("DELETE FROM seen WHERE url_hash = ?", (key,))
+            self._pending += 1
+
+    def expire(self) -> int:
+        """
+        Forgets the URLs older than `max_age_days`.
+
+        The in-memory structures are not updated, so this is meant to be called when the store is opened.
+
+        Returns:
+            int: The number of URLs removed.
+        """
+        limit = time.time() - self.max_age_days * 86400
+        with self._lock:
+            removed = self._db.execute("DELETE FROM seen WHERE seen_at < ?", (limit,)).rowcount
+            self._db.commit()
+        if removed:
+            logger.info(f"{removed} URLs older than {self.max_age_days} days expired")
+        return removed
+
+    def flush(self) -> None:
+        """Writes the pending additions to disk."""
+        with self._lock:
+            self._db.commit()
+            self._pending = 0
+
+    def close(self) -> None:
+        """Flushes and closes the store."""
+        self.flush()
+        with self._lock:
+            self._db.close()
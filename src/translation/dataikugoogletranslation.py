@@ -8,6 +8,7 @@ import requests
 import html
 
 from media.src.utils.utils import create_logger, split_liste
+from media.src.translation.translationmemory import TranslationMemory
 
 
 logger = create_logger(__name__, 'dataikugoogletranslator.log')
@@ -27,6 +28,10 @@ class DataikuGoogleTranslate:
         The target language code for translation.
     __fails_index : list[int]
         A list to keep track of indices where translation failed.
+    session : requests.Session
+        The keep-alive session sending the requests (an `HttpTape` can record or replay it).
+    memory : TranslationMemory
+        The translation memory looked up before the API, shared with the other backends. None to always call the API.
 
     Methods
     -------
@@ -46,7 +51,8 @@ class DataikuGoogleTranslate:
         Translates the 'title' and 'text' columns of a given DataFrame from the source language to the target language.
     """
 
-    def __init__(self, api_key: str, target_language_code: str = "en", base_url: str = "https://translation.googleapis.com/language/translate/v2"):
+    def __init__(self, api_key: str, target_language_code: str = "en", base_url: str = "https://translation.googleapis.com/language/translate/v2",
+                 memory: TranslationMemory = None):
         """
         Initializes the GoogleTranslate class with the given API key, target language code, and base URL.
 
@@ -54,6 +60,7 @@ class DataikuGoogleTranslate:
             api_key (str): The API key for authenticating requests to the Google Cloud Translation API.
             target_language_code (str, optional): The target language code for translation. Defaults to "en".
             base_url (str, optional): The base URL for the Google Cloud Translation API. Defaults to "https://translation.googleapis.com/language/translate/v2".
+            memory (TranslationMemory, optional): The translation memory looked up before the API. Defaults to None.
 
         Raises:
             ValueError: If the target language code is invalid.
@@ -63,6 +70,8 @@ class DataikuGoogleTranslate:
         _ = self.__validate_target_language_code(target_language_code)
         self.__target_language_code = target_language_code
         self.__fails_index: list[int] = []
+        self.session = requests.Session()
+        self.memory = memory
 
     def __validate_target_language_code(self, language_code: str) -> bool:
         """
@@ -108,7 +117,7 @@ class DataikuGoogleTranslate:
     def translate_liste(self,list_of_text: list[str], params: dict): 
         
         params['q'] = list_of_text
-        response = requests.post(self.__base_url, params=params)
+        response = self.session.post(self.__base_url, params=params)
 
         if response.status_code == 411:
             logger.error("Texts were not translated successfully. The number of characters exceeded the translation limit. Please inspect the portion of the text you are trying to translate and specify the correct character limit. The limit may vary depending on the language code.")
@@ -162,6 +171,25 @@ class DataikuGoogleTranslate:
             logger.info("Texts successfully translated.")
         return responses
 
+    def __translate(self, texts: list[str], source_language_code: str, limit: int) -> list[str]:
+        """
+        Translates texts, in requests of at most `limit` characters. With a `memory`, only the segments of the
+        texts missing from it are sent to the API.
+
+        Args:
+            texts (list[str]): The texts to translate.
+            source_language_code (str): The source language code.
+            limit (int): The character limit of a request.
+
+        Returns:
+            list[str]: The translated texts.
+        """
+        if self.memory is None:
+            return self.__translate_text(texts=split_liste(texts, limit=limit), source_language_code=source_language_code)
+        return self.memory.translate(texts, source_language_code, self.__target_language_code,
+                                     lambda segments: self.__translate_text(texts=split_liste(segments, limit=limit),
+                                                                            source_language_code=source_language_code))
+
     def translation(self, dataframe: pd.DataFrame, language_limits: dict) -> pd.DataFrame:
         """
         Translates the 'title' and 'text' columns of a given DataFrame from the source language to the target language.
@@ -200,22 +228,22 @@ class DataikuGoogleTranslate:
             logger.info(f" language code  :{lang}")
 
             ## Translating title
-            sub1 = split_liste(list(data_['titles']), limit=limit)
             print("*"*40)
             print("*"*40)
             print(f"language_limits[lang] = {language_limits[lang]}")
             print("*"*40)
             print("*"*40)
-            titles = self.__translate_text(texts=sub1, source_language_code=lang)
+            titles = self.__translate(list(data_['titles']), source_language_code=lang, limit=limit)
 
             data_['translated_title'] = titles
 
             ## Translating text
-            sub = split_liste(list(data_['texts']), limit=limit)
-            texts = self.__translate_text(texts=sub, source_language_code=lang)
+            texts = self.__translate(list(data_['texts']), source_language_code=lang, limit=limit)
             data_['translated_text'] = texts
 
             news_dataframe = pd.concat([news_dataframe, data_], axis=0)
+        if self.memory is not None:
+            logger.info(f"Translation memory: {self.memory.report()}")
         logger.info("Translation of DataFrame completed.")
         return news_dataframe
     #---------------------------------- PROPERTIES ---------------------------------------------------------
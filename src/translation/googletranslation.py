@@ -4,6 +4,7 @@ import sys
 from google.cloud import translate
 sys.path.append("../src/utils")
 from utils import split_liste, create_logger
+from translationmemory import TranslationMemory
 
 logger = create_logger(__name__, 'googletranslator.log')
 
@@ -17,6 +18,8 @@ class GoogleTranslate :
         __parent (str): The resource name of the Google Cloud project.
         __target_language_code (str): The target language code for translation.
         __fails_index (list[int]): A list to keep track of indices where translation failed.
+        memory (TranslationMemory): The translation memory looked up before the API, shared with the other
+            backends. None to always call the API.
 
     Methods
     --------
@@ -36,7 +39,8 @@ class GoogleTranslate :
             Returns the list of indices where translation failed.
         """
     
-    def __init__(self, project_id : str, location : str = "global", target_language_code: str = "en"):
+    def __init__(self, project_id : str, location : str = "global", target_language_code: str = "en",
+                 memory : TranslationMemory = None):
         
         """
         Initializes the GoogleTranslate class with the given project ID, location, and target language code.
@@ -45,6 +49,7 @@ class GoogleTranslate :
             project_id (str): The Google Cloud project ID.
             location (str, optional): The location of the Google Cloud project. Defaults to "global".
             target_language_code (str, optional): The target language code for translation. Defaults to "en".
+            memory (TranslationMemory, optional): The translation memory looked up before the API. Defaults to None.
 
         Raises:
             ValueError: If the target language code is invalid.
@@ -55,6 +60,7 @@ class GoogleTranslate :
         _ = self.__validate_target_language_code(target_language_code)
         self.__target_language_code = target_language_code
         self.__fails_index : list[int] = []
+        self.memory = memory
         
     def __validate_target_language_code(self,language_code: str) -> bool:
         """
@@ -117,6 +123,25 @@ class GoogleTranslate :
         
         logger.info("Texts successfully translated.")
         return responses
+
+    def __translate(self, texts: list[str], source_language_code : str, limit : int) -> list[str]:
+        """
+        Translates texts, in requests of at most `limit` characters. With a `memory`, only the segments of the
+        texts missing from it are sent to the API.
+
+        Args:
+            texts (list[str]): The texts to translate.
+            source_language_code (str): The source language code.
+            limit (int): The character limit of a request.
+
+        Returns:
+            list[str]: The translated texts.
+        """
+        if self.memory is None :
+            return self.__translate_text(texts =split_liste(texts, limit=limit), source_language_code=source_language_code)
+        return self.memory.translate(texts, source_language_code, self.__target_language_code,
+                                     lambda segments: self.__translate_text(texts =split_liste(segments, limit=limit),
+                                                                            source_language_code=source_language_code))
     
     def translation(self, dataframe : pd.DataFrame, limit : int =30720):
         """
@@ -160,9 +185,8 @@ class GoogleTranslate :
             
             # Translating title
 
-            sub1 = split_liste(list(data_['titles']), limit=limit)
             try :
-                titles = self.__translate_text(texts =sub1, source_language_code=lang)
+                titles = self.__translate(list(data_['titles']), source_language_code=lang, limit=limit)
                 data_['translated_title'] = titles
             except Exception as e :
                 logger.error(e)
@@ -170,9 +194,8 @@ class GoogleTranslate :
                 continue
 
             ## Translating text
-            sub = split_liste(list(data_['texts']), limit=limit)
             try :
-                texts =self.__translate_text(texts =sub, source_language_code=lang)
+                texts =self.__translate(list(data_['texts']), source_language_code=lang, limit=limit)
                 data_['translated_text'] = texts
             except Exception as e :
                 logger.error(e)
@@ -181,6 +204,8 @@ class GoogleTranslate :
             
             news_dataframe = pd.concat([news_dataframe, data_], axis=0)
         
+        if self.memory is not None :
+            logger.info(f"Translation memory: {self.memory.report()}")
         logger.info("Translation of DataFrame completed.")
         return news_dataframe
     
@@ -0,0 +1,215 @@
+import sys
+sys.path.append("../src/utils")
+
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+from utils import create_logger
+
+logger = create_logger(__name__, 'translation_memory.log')
+
+
+class TranslationMemory:
+    """
+    A persistent translation memory shared by the translator backends, so that the titles, paragraphs and
+    syndicated articles translated by a previous call or run are not sent (and billed) again.
+
+    Texts are split into segments (their lines, i.e. paragraphs). Each segment is normalized (Unicode NFC,
+    whitespace folded) and stored with its translation under the key (source language, target language, hash of
+    the normalized segment), in an SQLite file. When a batch of texts is translated, every segment is looked up
+    first; only the distinct segments missing from the memory are sent to the backend, and the texts are rebuilt
+    from the translated segments. Entries older than `max_age_days` are expired when the memory is opened.
+
+    Attributes
+    ----------
+        path (str) : SQLite file of the memory. ':memory:' keeps it for the process only.
+        max_age_days (float) : Age after which a translation is forgotten, or None to keep them forever.
+
+    Methods
+    -------
+        lookup(source: str, target: str, segments: list[str]) -> list[str]:
+            Returns the stored translation of each segment, or None.
+        store(source: str, target: str, segments: list[str], translations: list[str]) -> None:
+            Stores the translations of segments.
+        translate(texts: list[str], source: str, target: str, translate_batch) -> list[str]:
+            Translates texts, sending only the segments missing from the memory to the backend.
+        report() -> dict:
+            Returns the hit rate and the characters saved since the memory was opened.
+        expire() -> int:
+            Forgets the translations older than `max_age_days`.
+        close() -> None:
+            Closes the memory.
+    """
+
+    def __init__(self, path: str = ':memory:', max_age_days: float = 180):
+        """
+        Opens (or creates) the memory and expires its old translations.
+
+        Args:
+            path (str): SQLite file of the memory. Defaults to ':memory:'.
+            max_age_days (float, optional): Age after which a translation is forgotten. Defaults to 180.
+
+        Raises:
+            ValueError: If `max_age_days` is not positive.
+        """
+        if max_age_days is not None and max_age_days <= 0:
+            raise ValueError("max_age_days must be positive")
+        self.path = path
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS translations (source TEXT NOT NULL, target TEXT NOT NULL, "
+                         "hash TEXT NOT NULL, translation TEXT NOT NULL, created_at REAL NOT NULL, "
+                         "PRIMARY KEY (source, target, hash))")
+        self._db.commit()
+        self._segments = 0
+        self._hits = 0
+        self._chars = 0
+        self._chars_saved = 0
+        self.expire()
+
+    @staticmethod
+    def normalize(segment: str) -> str:
+        """Returns the normalized form of a segment: Unicode NFC, whitespace folded and stripped."""
+        return ' '.join(unicodedata.normalize('NFC', segment).split())
+
+    @staticmethod
+    def _hash(segment: str) -> str:
+        """Returns the hash of a normalized segment."""
+        return hashlib.blake2b(segment.encode('utf-8'), digest_size=16).hexdigest()
+
+    def lookup(self, source: str, target: str, segments: list[str]) -> list[str]:
+        """
+        Returns the stored translation of each segment.
+
+        Args:
+            source (str): The source language code.
+            target (str): The target language code.
+            segments (list[str]): The segments.
+
+        Returns:
+            list[str]: The translation of each segment, or None when it is not in the memory.
+        """
+        hashes = [self._hash(self.normalize(segment)) for segment in segments]
+        found = {}
+        with self._lock:
+            # SQLite limits the number of parameters of a query
+            for start in range(0, len(hashes), 500):
+                chunk = list(set(hashes[start:start + 500]))
+                placeholders = ', '.join('?' * len(chunk))
+                found.update(self._db.execute(f"SELECT hash, translation FROM translations WHERE source = ? AND "
+                                              f"target = ? AND hash IN ({placeholders})", [source, target, *chunk]))
+        return [found.get(key) for key in hashes]
+
+    def store(self, source: str, target: str, segments: list[str], translations: list[str]) -> None:
+        """
+        Stores the translations of segments.
+
+        Args:
+            source (str): The source language code.
+            target (str): The target language code.
+            segments (list[str]): The segments.
+            translations (list[str]): The translation of each segment.
+        """
+        now = time.time()
+        rows = [(source, target, self._hash(self.normalize(segment)), translation, now)
+                for segment, translation in zip(segments, translations) if isinstance(translation, str)]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def translate(self, texts: list[str], source: str, target: str, translate_batch) -> list[str]:
+        """
+        Translates texts segment by segment, sending only the segments missing from the memory to the backend.
+
+        Each distinct missing segment is sent once, in a single call of `translate_batch`, and its translation is
+        stored. Empty lines are kept as they are, so the texts keep their paragraphs.
+
+        Args:
+            texts (list[str]): The texts to translate.
+            source (str): The source language code.
+            target (str): The target language code.
+            translate_batch (Callable[[list[str]], list[str]]): Translates a list of segments with the backend.
+
+        Returns:
+            list[str]: The translated texts, in the same order.
+
+        Raises:
+            ValueError: If the backend does not return one translation per segment.
+        """
+        lines = [text.split('\n') if isinstance(text, str) else [] for text in texts]
+        segments = list(dict.fromkeys(self.normalize(line) for text in lines for line in text if line.strip()))
+        translations = dict(zip(segments, self.lookup(source, target, segments)))
+        missing = [segment for segment, translation in translations.items() if translation is None]
+
+        if len(missing) != 0:
+            translated = translate_batch(missing)
+            if len(translated) != len(missing):
+                logger.error(f"{len(missing)} segments sent for translation, {len(translated)} translations received")
+                raise ValueError(f"{len(missing)} segments sent for translation, {len(translated)} translations received")
+            self.store(source, target, missing, translated)
+            translations.update(zip(missing, translated))
+
+        # Every occurrence of a segment counts, so that the segments repeated within the batch are savings too
+        sent = set(missing)
+        segments_count, hits, chars, chars_saved = 0, 0, 0, 0
+        for text in lines:
+            for line in text:
+                if line.strip():
+                    segment = self.normalize(line)
+                    segments_count += 1
+                    chars += len(segment)
+                    if segment in sent:
+                        sent.discard(segment)
+                    else:
+                        hits += 1
+                        chars_saved += len(segment)
+        with self._lock:
+            self._segments += segments_count
+            self._hits += hits
+            self._chars += chars
+            self._chars_saved += chars_saved
+        logger.info(f"{source} -> {target}: {hits} segments out of {segments_count} found in the memory, "
+                    f"{len(missing)} sent for translation")
+
+        return ['\n'.join(translations[self.normalize(line)] if line.strip() else line for line in text)
+                if isinstance(original, str) else original for text, original in zip(lines, texts)]
+
+    def report(self) -> dict:
+        """
+        Returns the use of the memory since it was opened.
+
+        Returns:
+            dict: The number of segments translated and found in the memory, the hit rate, the characters of the
+            segments, the characters saved (not sent to the backend) and their share.
+        """
+        with self._lock:
+            return {'segments': self._segments, 'hits': self._hits,
+                    'hit_rate': round(self._hits / self._segments, 4) if self._segments else 0.0,
+                    'chars': self._chars, 'chars_saved': self._chars_saved,
+                    'saved_share': round(self._chars_saved / self._chars, 4) if self._chars else 0.0}
+
+    def expire(self) -> int:
+        """
+        Forgets the translations older than `max_age_days`.
+
+        Returns:
+            int: The number of translations removed.
+        """
+        if self.max_age_days is None:
+            return 0
+        with self._lock:
+            removed = self._db.execute("DELETE FROM translations WHERE created_at < ?",
+                                       (time.time() - self.max_age_days * 86400,)).rowcount
+            self._db.commit()
+        if removed:
+            logger.info(f"{removed} translations expired")
+        return removed
+
+    def close(self) -> None:
+        """Closes the SQLite connection."""
+        with self._lock:
+            self._db.close()